@@ -0,0 +1,132 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+
+from analytics_rollups import apply_rollups
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsRecorder:
+    """Write-behind recorder for Analytics rows.
+
+    Request handlers call record(), which only enqueues. A background thread
+    bulk-inserts the queue every ``flush_interval`` seconds, or sooner once
+    ``batch_size`` events are waiting, and adds each batch to the hourly and
+    daily rollups in the same transaction. The queue is bounded; events that do
+    not fit are dropped and counted in ``dropped`` rather than blocking the
+    request. Pending events are flushed at interpreter exit.
+    """
+
+    def __init__(self, app=None, max_queue=10000, batch_size=200, flush_interval=2.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_queue = int(app.config.get("ANALYTICS_QUEUE_SIZE", os.getenv("ANALYTICS_QUEUE_SIZE", self.max_queue)))
+        self.batch_size = int(app.config.get("ANALYTICS_BATCH_SIZE", os.getenv("ANALYTICS_BATCH_SIZE", self.batch_size)))
+        self.flush_interval = float(app.config.get("ANALYTICS_FLUSH_INTERVAL", os.getenv("ANALYTICS_FLUSH_INTERVAL", self.flush_interval)))
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        app.extensions["analytics_recorder"] = self
+        atexit.register(self.shutdown)
+
+    def record(self, **fields):
+        fields.setdefault("timestamp", datetime.utcnow())
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows inserted."""
+        from models import Analytics
+
+        with self._flush_lock:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    db.session.execute(db.insert(Analytics), rows)
+                    apply_rollups(rows)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    with self._lock:
+                        self.failed += len(rows)
+                    logger.error(f"Error flushing {len(rows)} analytics rows: {str(e)}")
+                    return 0
+                finally:
+                    db.session.remove()
+
+            with self._lock:
+                self.flushed += len(rows)
+            return len(rows)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self.app is not None:
+            self.flush()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a gunicorn worker forked from a
+        # preloaded master starts its own flusher on first use.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="analytics-recorder", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+analytics_recorder = AnalyticsRecorder()
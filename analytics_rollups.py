@@ -0,0 +1,307 @@
+"""Hourly and daily rollups of Analytics rows (AnalyticsRollup).
+
+Each rollup row holds the call count, error count (status >= 400) and latency
+sum of one user, API key and endpoint within one UTC hour or day. Next to it,
+LatencySketchBin rows hold the same bucket's latency_sketch bin counts, from
+which p50/p90/p99 are estimated for any set of keys, endpoints and buckets,
+and StageTimingRollup rows hold the summed chat pipeline stage timings
+(stage_timer.py). The analytics recorder folds every batch it inserts into the rollups in the same
+transaction, so the dashboard reads a few rows per day instead of every raw
+event. ``flask analytics-rollup`` rebuilds them from the raw rows, for
+backfills and repairs.
+"""
+from collections import defaultdict
+
+import click
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from latency_sketch import LatencySketch, bin_for
+
+GRANULARITIES = ("hour", "day")
+REBUILD_BATCH_SIZE = 5000
+
+_KEY_COLUMNS = ("granularity", "user_id", "bucket_start", "api_key", "endpoint")
+_BIN_KEY_COLUMNS = _KEY_COLUMNS + ("bin",)
+_STAGE_KEY_COLUMNS = _KEY_COLUMNS + ("stage",)
+
+
+def bucket_start(timestamp, granularity):
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate(events):
+    """Sum event dicts into {bucket key: [calls, errors, latency_sum]}."""
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for event in events:
+        for granularity in GRANULARITIES:
+            total = totals[(granularity, event["user_id"], bucket_start(event["timestamp"], granularity),
+                            event["api_key"], event["endpoint"])]
+            total[0] += 1
+            total[1] += event["status_code"] >= 400
+            total[2] += event["response_time"]
+    return totals
+
+
+def aggregate_bins(events):
+    """Count event dicts into {bucket key + (latency bin,): samples}."""
+    counts = defaultdict(int)
+    for event in events:
+        index = bin_for(event["response_time"])
+        for granularity in GRANULARITIES:
+            counts[(granularity, event["user_id"], bucket_start(event["timestamp"], granularity),
+                    event["api_key"], event["endpoint"], index)] += 1
+    return counts
+
+
+def aggregate_stages(events):
+    """Sum event dicts' stage timings into {bucket key + (stage,): [samples, seconds, tokens]}.
+
+    Time to first token is summed as the "ttft" stage; tokens are counted on
+    the "stream" stage only.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for event in events:
+        stages = event.get("stage_timings")
+        if not stages:
+            continue
+        if event.get("ttft") is not None:
+            stages = dict(stages, ttft=event["ttft"])
+        for granularity in GRANULARITIES:
+            key = (granularity, event["user_id"], bucket_start(event["timestamp"], granularity),
+                   event["api_key"], event["endpoint"])
+            for stage, seconds in stages.items():
+                total = totals[key + (stage,)]
+                total[0] += 1
+                total[1] += seconds
+                if stage == "stream":
+                    total[2] += event.get("tokens") or 0
+    return totals
+
+
+def _rows(totals):
+    # Sorted, so concurrent flushes lock rows in the same order.
+    return [
+        dict(zip(_KEY_COLUMNS, key), calls=calls, errors=errors, latency_sum=latency_sum)
+        for key, (calls, errors, latency_sum) in sorted(totals.items(), key=lambda item: item[0])
+    ]
+
+
+def _bin_rows(counts):
+    return [dict(zip(_BIN_KEY_COLUMNS, key), samples=samples) for key, samples in sorted(counts.items())]
+
+
+def _stage_rows(totals):
+    return [
+        dict(zip(_STAGE_KEY_COLUMNS, key), samples=samples, seconds=seconds, tokens=tokens)
+        for key, (samples, seconds, tokens) in sorted(totals.items())
+    ]
+
+
+def apply_rollups(events):
+    """Add ``events`` to their hourly and daily rollups and sketches. The caller commits."""
+    from models import AnalyticsRollup, LatencySketchBin, StageTimingRollup
+
+    rows = _rows(aggregate(events))
+    if rows:
+        _upsert(AnalyticsRollup, _KEY_COLUMNS, ("calls", "errors", "latency_sum"), rows)
+        _upsert(LatencySketchBin, _BIN_KEY_COLUMNS, ("samples",), _bin_rows(aggregate_bins(events)))
+        stage_rows = _stage_rows(aggregate_stages(events))
+        if stage_rows:
+            _upsert(StageTimingRollup, _STAGE_KEY_COLUMNS, ("samples", "seconds", "tokens"), stage_rows)
+    return len(rows)
+
+
+def _upsert(model, key_columns, sum_columns, rows):
+    """Insert ``rows``, adding ``sum_columns`` into rows that already exist."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in sum_columns},
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        updated = (model.query
+                   .filter_by(**{column: row[column] for column in key_columns})
+                   .update({getattr(model, column): getattr(model, column) + row[column] for column in sum_columns},
+                           synchronize_session=False))
+        if not updated:
+            db.session.add(model(**row))
+
+
+def rebuild_rollups(since=None):
+    """Recompute rollups from the raw rows, from the start of ``since``'s day on.
+
+    Events the recorder flushes while this runs can be counted twice, so
+    rebuild days that are over, or run it while the recorder is idle.
+    Returns the number of raw rows read. The caller commits.
+    """
+    from models import Analytics, AnalyticsRollup, LatencySketchBin, StageTimingRollup
+
+    start = bucket_start(since, "day") if since else None
+    for model in (AnalyticsRollup, LatencySketchBin, StageTimingRollup):
+        delete = model.query
+        if start is not None:
+            delete = delete.filter(model.bucket_start >= start)
+        delete.delete(synchronize_session=False)
+
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    bins = defaultdict(int)
+    stages = defaultdict(lambda: [0, 0.0, 0])
+    columns = (Analytics.id, Analytics.user_id, Analytics.api_key, Analytics.endpoint,
+               Analytics.timestamp, Analytics.response_time, Analytics.status_code,
+               Analytics.ttft, Analytics.tokens, Analytics.stage_timings)
+    read = 0
+    last_id = 0
+    while True:
+        query = db.session.query(*columns).filter(Analytics.id > last_id, Analytics.timestamp.isnot(None))
+        if start is not None:
+            query = query.filter(Analytics.timestamp >= start)
+        batch = query.order_by(Analytics.id).limit(REBUILD_BATCH_SIZE).all()
+        if not batch:
+            break
+        events = [row._asdict() for row in batch]
+        for key, (calls, errors, latency_sum) in aggregate(events).items():
+            total = totals[key]
+            total[0] += calls
+            total[1] += errors
+            total[2] += latency_sum
+        for key, samples in aggregate_bins(events).items():
+            bins[key] += samples
+        for key, (samples, seconds, tokens) in aggregate_stages(events).items():
+            total = stages[key]
+            total[0] += samples
+            total[1] += seconds
+            total[2] += tokens
+        read += len(batch)
+        last_id = batch[-1].id
+
+    rows = _rows(totals)
+    if rows:
+        _upsert(AnalyticsRollup, _KEY_COLUMNS, ("calls", "errors", "latency_sum"), rows)
+        _upsert(LatencySketchBin, _BIN_KEY_COLUMNS, ("samples",), _bin_rows(bins))
+    stage_rows = _stage_rows(stages)
+    if stage_rows:
+        _upsert(StageTimingRollup, _STAGE_KEY_COLUMNS, ("samples", "seconds", "tokens"), stage_rows)
+    return read
+
+
+def usage_series(user_id, granularity="day", since=None):
+    """[(bucket_start, calls, errors, latency_sum)] for a user, summed over keys and endpoints."""
+    from models import AnalyticsRollup
+
+    query = (db.session.query(AnalyticsRollup.bucket_start,
+                              func.sum(AnalyticsRollup.calls),
+                              func.sum(AnalyticsRollup.errors),
+                              func.sum(AnalyticsRollup.latency_sum))
+             .filter(AnalyticsRollup.user_id == user_id, AnalyticsRollup.granularity == granularity))
+    if since is not None:
+        query = query.filter(AnalyticsRollup.bucket_start >= bucket_start(since, granularity))
+    return query.group_by(AnalyticsRollup.bucket_start).order_by(AnalyticsRollup.bucket_start).all()
+
+
+def latency_sketches(user_id, granularity="day", since=None, api_key=None, endpoint=None):
+    """{bucket_start: LatencySketch} for a user, merged over keys and endpoints unless filtered."""
+    from models import LatencySketchBin
+
+    query = (db.session.query(LatencySketchBin.bucket_start, LatencySketchBin.bin, func.sum(LatencySketchBin.samples))
+             .filter(LatencySketchBin.user_id == user_id, LatencySketchBin.granularity == granularity))
+    if since is not None:
+        query = query.filter(LatencySketchBin.bucket_start >= bucket_start(since, granularity))
+    if api_key is not None:
+        query = query.filter(LatencySketchBin.api_key == api_key)
+    if endpoint is not None:
+        query = query.filter(LatencySketchBin.endpoint == endpoint)
+
+    sketches = defaultdict(LatencySketch)
+    for bucket, index, samples in query.group_by(LatencySketchBin.bucket_start, LatencySketchBin.bin):
+        sketches[bucket].bins[index] += int(samples)
+    return dict(sorted(sketches.items()))
+
+
+def latency_percentiles(sketches):
+    """([{"bucket", "p50", "p90", "p99"}], overall quantiles) from latency_sketches()."""
+    series = [dict(bucket=bucket.isoformat(), **sketch.quantiles()) for bucket, sketch in sketches.items()]
+    overall = LatencySketch()
+    for sketch in sketches.values():
+        overall.merge(sketch)
+    return series, overall.quantiles()
+
+
+def stage_breakdown(user_id, granularity="day", since=None, api_key=None, endpoint=None):
+    """Average seconds per chat pipeline stage, overall and per bucket.
+
+    Returns (series, overall): series is [{"bucket", "stages", "tokens_per_second"}]
+    and overall is {"stages", "tokens_per_second"}, where "stages" maps each
+    stage to {"samples", "avg_seconds"}.
+    """
+    from models import StageTimingRollup
+
+    query = (db.session.query(StageTimingRollup.bucket_start, StageTimingRollup.stage,
+                              func.sum(StageTimingRollup.samples),
+                              func.sum(StageTimingRollup.seconds),
+                              func.sum(StageTimingRollup.tokens))
+             .filter(StageTimingRollup.user_id == user_id, StageTimingRollup.granularity == granularity))
+    if since is not None:
+        query = query.filter(StageTimingRollup.bucket_start >= bucket_start(since, granularity))
+    if api_key is not None:
+        query = query.filter(StageTimingRollup.api_key == api_key)
+    if endpoint is not None:
+        query = query.filter(StageTimingRollup.endpoint == endpoint)
+
+    buckets = defaultdict(dict)
+    overall = defaultdict(lambda: [0, 0.0, 0])
+    for bucket, stage, samples, seconds, tokens in query.group_by(StageTimingRollup.bucket_start, StageTimingRollup.stage):
+        buckets[bucket][stage] = (int(samples), float(seconds), int(tokens))
+        total = overall[stage]
+        total[0] += int(samples)
+        total[1] += float(seconds)
+        total[2] += int(tokens)
+
+    def summary(stages):
+        samples, seconds, tokens = stages.get("stream", (0, 0.0, 0))
+        return {
+            "stages": {stage: {"samples": n, "avg_seconds": total / n}
+                       for stage, (n, total, _) in sorted(stages.items()) if n},
+            # Each answer's first token opens its stream stage, as in stage_timer.tokens_per_second
+            "tokens_per_second": (tokens - samples) / seconds if seconds and tokens > samples else None,
+        }
+
+    series = [dict(bucket=bucket.isoformat(), **summary(stages)) for bucket, stages in sorted(buckets.items())]
+    return series, summary(overall)
+
+
+def recent_entries(user_id, before_id=None, limit=100):
+    """One page of a user's raw Analytics rows, newest first, keyset-paginated on id.
+
+    Returns (rows, next_before_id); next_before_id is None on the last page.
+    """
+    from models import Analytics
+
+    query = Analytics.query.filter(Analytics.user_id == user_id)
+    if before_id is not None:
+        query = query.filter(Analytics.id < before_id)
+    rows = query.order_by(Analytics.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def init_app(app):
+    @app.cli.command("analytics-rollup")
+    @click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]),
+                  help="Only rebuild days from this date (UTC) on; default is everything.")
+    def analytics_rollup_command(since):
+        """Rebuild hourly and daily analytics rollups from the raw rows."""
+        read = rebuild_rollups(since)
+        db.session.commit()
+        click.echo(f"Rebuilt rollups from {read:,} analytics rows")
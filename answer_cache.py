@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from metrics import CACHE_REQUESTS
+
+# Character n-grams match rephrasings and typos that word TF-IDF misses. The
+# hashed space is fixed, so a new question keeps the n-grams no cached
+# question has; a vocabulary fit on the cached questions would drop them.
+_VECTORIZER = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 5), alternate_sign=False, norm=None,
+                                n_features=2 ** 20)
+# A negation flips the answer while changing only a few n-grams
+_NEGATIONS = frozenset("no not never nor none nothing without cannot cant dont doesnt didnt isnt arent "
+                       "wasnt werent wont wouldnt shouldnt couldnt havent hasnt".split())
+
+
+def _negations(question):
+    return _NEGATIONS.intersection(question.split())
+
+
+def _history_digest(history):
+    # A follow-up such as "tell me more" only means the same thing after the
+    # same messages, so those are part of the key
+    return hashlib.blake2b(json.dumps(list(history), sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+class _KeyAnswers:
+    def __init__(self):
+        self.entries = []  # (question, response, expires_at), oldest first
+        self.counts = None
+        self.lock = threading.Lock()  # scoring one key does not hold up the others
+
+    def prune(self, now):
+        live = [entry for entry in self.entries if entry[2] > now]
+        if len(live) != len(self.entries):
+            self.entries = live
+            self.counts = None
+
+    def fit(self):
+        self.counts = _VECTORIZER.transform([entry[0] for entry in self.entries])
+
+    def score(self, question):
+        """(best entry index, cosine, coverage) for ``question``.
+
+        TF-IDF weights come from the cached questions plus this one, so the
+        question's own n-grams count against every entry. Coverage is the
+        share of the question's weight on n-grams the best entry also has.
+        """
+        if self.counts is None:
+            self.fit()
+        matrix = sp.vstack([self.counts, _VECTORIZER.transform([question])], format="csr")
+        columns, inverse = np.unique(matrix.indices, return_inverse=True)
+        document_frequency = np.bincount(inverse, minlength=len(columns))
+        idf = np.log((1 + matrix.shape[0]) / (1 + document_frequency)) + 1
+        matrix.data = matrix.data * idf[inverse]
+        matrix = normalize(matrix)
+        query = matrix[-1]
+        scores = (matrix[:-1] @ query.T).toarray().ravel()
+        best = int(scores.argmax())
+        covered = np.isin(query.indices, matrix[best].indices)
+        coverage = query.data[covered].sum() / query.data.sum() if query.nnz else 0.0
+        return best, scores[best], coverage
+
+
+class AnswerCache:
+    """Per-API-key cache of recent answers, matched by question similarity.
+
+    Entries are keyed by (api key, prompt_version, digest of the messages
+    before the question), so editing anything that feeds the prompt also
+    retires the cached answers, and an answer is only replayed after the same
+    conversation history the LLM saw. Lives in process memory; hit and miss
+    counters are per worker.
+
+    A hit needs cosine similarity of at least ``threshold``, at least
+    ``min_coverage`` of the question's n-gram weight found in the cached
+    question, and the same negation words in both.
+    """
+
+    def __init__(self, threshold=0.9, ttl=3600, max_entries_per_key=200, max_keys=1000, enabled=True,
+                 min_coverage=0.85):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.min_coverage = min_coverage
+        self.ttl = ttl
+        self.max_entries_per_key = max_entries_per_key
+        self.max_keys = max_keys
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(question):
+        # Punctuation would otherwise add n-grams like "da?" to the last word
+        return " ".join(re.sub(r"[^\w\s]", "", question.lower()).split())
+
+    def lookup(self, api_key, prompt_version, question, history=()):
+        """Return the stored final response for a close enough question, or None.
+
+        ``history`` is the messages before ``question`` that go into the prompt.
+        """
+        if not self.enabled:
+            return None
+        question = self._normalize(question)
+        cache_key = (api_key, prompt_version, _history_digest(history))
+        with self._lock:
+            answers = self._keys.get(cache_key)
+            if answers is not None:
+                self._keys.move_to_end(cache_key)
+        response = None
+        if answers is not None:
+            with answers.lock:
+                answers.prune(time.monotonic())
+                if answers.entries:
+                    best, score, coverage = answers.score(question)
+                    if (score >= self.threshold and coverage >= self.min_coverage
+                            and _negations(question) == _negations(answers.entries[best][0])):
+                        response = answers.entries[best][1]
+
+        with self._lock:
+            (self.misses if response is None else self.hits)[api_key] += 1
+        CACHE_REQUESTS.labels("answer_cache", "miss" if response is None else "hit").inc()
+        return response
+
+    def store(self, api_key, prompt_version, question, response, history=()):
+        if not self.enabled:
+            return
+        question = self._normalize(question)
+        cache_key = (api_key, prompt_version, _history_digest(history))
+        with self._lock:
+            answers = self._keys.get(cache_key)
+            if answers is None:
+                answers = self._keys[cache_key] = _KeyAnswers()
+                while len(self._keys) > self.max_keys:
+                    self._keys.popitem(last=False)
+            self._keys.move_to_end(cache_key)
+
+        with answers.lock:
+            answers.entries = [entry for entry in answers.entries if entry[0] != question]
+            answers.entries.append((question, response, time.monotonic() + self.ttl))
+            del answers.entries[:-self.max_entries_per_key]
+            answers.counts = None
+
+    def stats(self, api_keys):
+        hits = sum(self.hits.get(key, 0) for key in api_keys)
+        misses = sum(self.misses.get(key, 0) for key in api_keys)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9")),
+    min_coverage=float(os.getenv("ANSWER_CACHE_MIN_COVERAGE", "0.85")),
+    ttl=int(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    max_entries_per_key=int(os.getenv("ANSWER_CACHE_ENTRIES_PER_KEY", "200")),
+    max_keys=int(os.getenv("ANSWER_CACHE_MAX_KEYS", "1000")),
+    enabled=os.getenv("ANSWER_CACHE_ENABLED", "true").lower() != "false",
+)
@@ -0,0 +1,56 @@
+import os
+from collections import namedtuple
+
+from extensions import db
+from models import APIKey
+from caches import TTLCache
+
+# The widget endpoints only need these columns; extracted_text is never loaded
+# on the hot path.
+APIKeyInfo = namedtuple("APIKeyInfo", ["id", "key", "user_id", "llm", "design", "prompt_version"])
+
+api_key_cache = TTLCache(
+    maxsize=int(os.getenv("API_KEY_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("API_KEY_CACHE_TTL", "60")),
+    name="api_keys",
+)
+
+# Unknown keys get their own, smaller cache so a bot cycling through random
+# keys cannot push real keys out of the LRU.
+invalid_api_key_cache = TTLCache(
+    maxsize=int(os.getenv("INVALID_API_KEY_CACHE_SIZE", "10000")),
+    ttl=int(os.getenv("INVALID_API_KEY_CACHE_TTL", "30")),
+    name="invalid_api_keys",
+)
+
+def resolve_api_key(key):
+    """Return the APIKeyInfo for ``key``, or None if it does not exist.
+
+    Results are cached per worker for API_KEY_CACHE_TTL seconds, so edits made
+    in another worker (design, prompt_version) show up within that window.
+    """
+    if not key:
+        return None
+
+    info = api_key_cache.get(key)
+    if info is not None:
+        return info
+    if invalid_api_key_cache.get(key):
+        return None
+
+    row = db.session.query(
+        APIKey.id, APIKey.key, APIKey.user_id, APIKey.llm, APIKey.design, APIKey.prompt_version
+    ).filter_by(key=key).first()
+
+    if row is None:
+        invalid_api_key_cache.set(key, True)
+        return None
+
+    info = APIKeyInfo(*row)
+    api_key_cache.set(key, info)
+    return info
+
+def evict_api_keys(*keys):
+    for key in keys:
+        api_key_cache.pop(key)
+        invalid_api_key_cache.pop(key)
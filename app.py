@@ -17,7 +17,6 @@ from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
 from bs4 import BeautifulSoup
-from openai import OpenAI
 import os
 import json
 from dotenv import load_dotenv
@@ -32,6 +31,7 @@ import time
 from alembic import op
 import sqlalchemy as sa
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 import numpy as np
@@ -57,11 +57,27 @@ from werkzeug.utils import secure_filename
 import stripe
 from extensions import db
 from wp import wp_blueprint
+from prompts import get_system_prompt, invalidate_compiled_prompts
+from retrieval import retrieve_context
+from answer_cache import answer_cache
+from llm_providers import get_provider, LLM_PROVIDER_OVERRIDE
+from api_keys import resolve_api_key, evict_api_keys
+from analytics_recorder import analytics_recorder
+from crawl_jobs import crawl_jobs
+from recrawl import site_refresher
+import content_store
+import analytics_rollups
+from usage_counters import usage_counters
+from stage_timer import StageTimer, tokens_per_second
+import metrics
+import marketplace
+from chatbot_scripts import chatbot_scripts
+from widget_bootstrap import widget_bootstraps, refresh_bootstraps
 from sqlalchemy.orm.attributes import flag_modified
 import psycopg2
 
 # Import models
-from models import User, APIKey, CustomPrompt, Analytics, AIModel, ModelReview, FineTuneJob, ChatInteraction, Conversation, EcommerceIntegration, Team, TeamMember, WebsiteInfo, FAQ
+from models import User, APIKey, CustomPrompt, Analytics, AIModel, ModelReview, FineTuneJob, ChatInteraction, Conversation, ConversationMessage, CrawlJob, EcommerceIntegration, Team, TeamMember, WebsiteInfo, FAQ
 
 # Load environment variables from .env file
 load_dotenv()
@@ -71,11 +87,9 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 HUME_API_KEY = os.getenv('HUME_API_KEY')
 HUME_SECRET_KEY = os.getenv('HUME_SECRET_KEY')
 
-if not openai_api_key:
+if not openai_api_key and LLM_PROVIDER_OVERRIDE != "stub":
     raise ValueError("No OpenAI API key set for OPENAI_API_KEY")
 
-openai_client = OpenAI(api_key=openai_api_key)
-
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
@@ -86,7 +100,8 @@ app.config['GITHUB_CLIENT_ID'] = os.getenv('GITHUB_CLIENT_ID')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set up rate limiting
+# Set up rate limiting (RATELIMIT_ENABLED=false turns it off for local load tests)
+app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "true").lower() != "false"
 limiter = Limiter(
     key_func=get_remote_address,
     app=app,
@@ -99,7 +114,17 @@ app.config["SECRET_KEY"] = os.getenv(
 )
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///users.db")
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=marketplace.include_object)
+analytics_recorder.init_app(app)
+crawl_jobs.init_app(app)
+site_refresher.init_app(app)
+content_store.init_app(app)
+analytics_rollups.init_app(app)
+usage_counters.init_app(app)
+metrics.init_app(app)
+marketplace.init_app(app)
+chatbot_scripts.init_app(app)
+widget_bootstraps.init_app(app)
 
 app.register_blueprint(wp_blueprint, url_prefix='/wp')
 
@@ -112,11 +137,6 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def extract_text_from_url(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    return " ".join([p.text for p in soup.find_all("p")])
-
 def generate_integration_code(api_key, design):
     return f"""
 <!-- AI Chatbot Integration -->
@@ -132,31 +152,17 @@ def chatbot_script():
             app.logger.error("API key not provided in request")
             return jsonify({"error": "API key is required"}), 400
 
-        api_key_obj = APIKey.query.filter_by(key=api_key).first()
+        api_key_obj = resolve_api_key(api_key)
         if not api_key_obj:
             return jsonify({"error": "Invalid API key"}), 400
 
         design = api_key_obj.design or "0"  # Default to "0" if not set
+        script, etag = chatbot_scripts.get(api_key, design)
 
-        # Determine which design file to use
-        if design == "1":
-            design_file = "design/design1.txt"
-        elif design == "2":
-            design_file = "design/design2.txt"
-        elif design == "3":
-            design_file = "design/design3.txt"
-        else:
-            design_file = "design/design.txt"
-        
-        # Read the script from the appropriate design file
-        script_path = os.path.join(app.root_path, design_file)
-        with open(script_path, "r") as file:
-            script = file.read()
-
-        # Replace placeholders with actual API key
-        script = script.replace("{api_key}", api_key)
-
-        return Response(script, mimetype="application/javascript")
+        response = Response(script, mimetype="application/javascript")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = chatbot_scripts.cache_control()
+        return response.make_conditional(request)
     except Exception as e:
         app.logger.error(f"Error in chatbot_script: {str(e)}")
         return (
@@ -317,38 +323,56 @@ def process_url():
         return jsonify({"error": "URL and LLM choice are required"}), 400
 
     try:
-        extracted_text = extract_text_from_url(url)
         api_key = f"user_{uuid.uuid4().hex}"
 
         # Use the provided name or generate a default name if not provided
         api_name = name if name else f"API for {url[:30]}..."
 
+        # The key works right away; the site text is filled in by the crawl job.
         new_api_key = APIKey(
             key=api_key,
             name=api_name,
             llm=llm,
-            extracted_text=extracted_text,
+            extracted_text="",
             user_id=session["user_id"],
             design=design
         )
         db.session.add(new_api_key)
+        db.session.flush()
+        refresh_bootstraps(api_key_ids=[new_api_key.id])
+        job = CrawlJob(api_key_id=new_api_key.id, user_id=session["user_id"], url=url)
+        db.session.add(job)
         db.session.commit()
+        crawl_jobs.enqueue(job.id)
 
         integration_code = generate_integration_code(api_key, design)
 
         return jsonify(
             {
-                "message": "Processing complete",
+                "message": "Processing started",
                 "api_key": api_key,
                 "name": api_name,
                 "llm": llm,
                 "integration_code": integration_code,
+                "job_id": job.id,
+                "status_url": url_for("crawl_job_status", job_id=job.id),
+                "timeout_seconds": crawl_jobs.stale_after,
             }
-        )
+        ), 202
     except Exception as e:
         app.logger.error(f"Error in process_url: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/dashboard/home/crawl_jobs/<job_id>", methods=["GET"])
+@login_required
+def crawl_job_status(job_id):
+    job = db.session.get(CrawlJob, job_id)
+    if not job or job.user_id != session["user_id"]:
+        return jsonify({"error": "Crawl job not found"}), 404
+    # A job whose worker process died would otherwise stay queued or running
+    crawl_jobs.expire_stale(job)
+    return jsonify(job.to_dict())
+
 def process_ecommerce_response(response):
     # Try to extract product information using regex
     product_info = re.search(
@@ -371,10 +395,8 @@ def process_ecommerce_response(response):
         # If no product information is found, return the response as is
         return {"response": response}
 
-def generate_suggested_queries(context, conversation_history, num_suggestions=3):
-    full_text = context + ' ' + ' '.join([msg['content'] for msg in conversation_history])
-    
-    prompt = f"""Based on the following context and recent conversation, generate {num_suggestions} very short follow-up questions:
+def build_suggestion_prompt(context, conversation_history, num_suggestions=3):
+    return f"""Based on the following context and recent conversation, generate {num_suggestions} very short follow-up questions:
 
 Context: {context[:100]}...  # Truncate context for brevity
 
@@ -383,26 +405,218 @@ Conversation History:
 
 Generate {num_suggestions} short questions:"""
 
+def parse_suggested_queries(generated_text, num_suggestions=3):
+    questions = generated_text.strip().split('\n')
+
+    # Ensure questions are very short
+    questions = [q.split('. ', 1)[-1].strip()[:30] for q in questions if q.strip()]
+
+    return questions[:num_suggestions]
+
+def generate_suggested_queries(context, conversation_history, num_suggestions=3, timeout=None, llm=None):
+    prompt = build_suggestion_prompt(context, conversation_history, num_suggestions)
+
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        generated_text = get_provider(llm).complete(
+            [{"role": "user", "content": prompt}],
             max_tokens=50,  # Reduce token count for faster response
-            n=1,
             temperature=0.7,
+            timeout=timeout,
         )
 
-        generated_text = response.choices[0].message.content.strip()
-        questions = generated_text.split('\n')
-        
-        # Ensure questions are very short
-        questions = [q.split('. ', 1)[-1].strip()[:30] for q in questions if q.strip()]
-        
-        return questions[:num_suggestions]
+        return parse_suggested_queries(generated_text, num_suggestions)
     except Exception as e:
         app.logger.error(f"Error generating suggested queries: {str(e)}")
         return []
 
+async def generate_suggested_queries_async(context, conversation_history, num_suggestions=3, timeout=None, llm=None):
+    prompt = build_suggestion_prompt(context, conversation_history, num_suggestions)
+
+    try:
+        generated_text = await get_provider(llm).acomplete(
+            [{"role": "user", "content": prompt}],
+            max_tokens=50,
+            temperature=0.7,
+            timeout=timeout,
+        )
+
+        return parse_suggested_queries(generated_text, num_suggestions)
+    except Exception as e:
+        app.logger.error(f"Error generating suggested queries: {str(e)}")
+        return []
+
+# Suggested queries only depend on the context and the visitor's message, so
+# they are generated alongside the answer stream rather than after it. If they
+# are not ready by the deadline the stream closes without them.
+SUGGESTED_QUERIES_TIMEOUT = float(os.getenv("SUGGESTED_QUERIES_TIMEOUT", "3.0"))
+suggestion_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SUGGESTED_QUERIES_WORKERS", "16")),
+    thread_name_prefix="suggested-queries",
+)
+
+def start_suggested_queries(turn):
+    future = suggestion_executor.submit(
+        generate_suggested_queries, turn["context"], turn["history"], 3, SUGGESTED_QUERIES_TIMEOUT, turn["llm"]
+    )
+    return future, time.time() + SUGGESTED_QUERIES_TIMEOUT
+
+def collect_suggested_queries(pending):
+    future, deadline = pending
+    try:
+        return future.result(timeout=max(0, deadline - time.time()))
+    except FutureTimeoutError:
+        future.cancel()
+        app.logger.warning("Suggested queries missed their deadline, closing the stream without them")
+        return []
+
+def get_or_create_conversation(api_key_data):
+    conversation = Conversation.query.filter_by(user_id=api_key_data.user_id, api_key_id=api_key_data.id).order_by(Conversation.updated_at.desc()).first()
+
+    if not conversation or (datetime.utcnow() - conversation.created_at) > timedelta(hours=24):
+        conversation = Conversation(user_id=api_key_data.user_id, api_key_id=api_key_data.id)
+        db.session.add(conversation)
+        db.session.flush()
+
+    return conversation
+
+def build_chat_messages(system_prompt, history):
+    # Prepare messages for AI, including conversation history and custom prompts
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        }
+    ] + history
+
+def prepare_chat_turn(api_key, user_input, timer=None):
+    """Resolve the API key, store the user's message and build the prompt.
+
+    Returns a plain dict so the turn can be finished from another thread
+    (see asgi.py), or None when the API key is invalid. Each stage is timed
+    on ``timer``, which the turn carries on to the stream and analytics.
+    """
+    timer = timer or StageTimer()
+    with timer.span("key_lookup"):
+        api_key_data = resolve_api_key(api_key)
+    if not api_key_data:
+        return None
+
+    with timer.span("conversation"):
+        conversation = get_or_create_conversation(api_key_data)
+
+        # Append user input to conversation history
+        db.session.add(ConversationMessage(conversation_id=conversation.id, role="user", content=user_input))
+        db.session.flush()
+
+        # Include last 5 messages for context
+        history = conversation.recent_messages(5)
+
+    turn = {
+        "api_key": api_key,
+        "api_key_id": api_key_data.id,
+        "user_id": api_key_data.user_id,
+        "llm": api_key_data.llm,
+        "prompt_version": api_key_data.prompt_version,
+        "conversation_id": conversation.id,
+        "user_input": user_input,
+        "history": history,
+        "cached_response": None,
+        "context": "",
+        "messages": None,
+        "timer": timer,
+    }
+
+    # A near-identical question answered recently after the same history is
+    # replayed instead of calling the LLM again (see answer_cache.py)
+    with timer.span("answer_cache"):
+        turn["cached_response"] = answer_cache.lookup(api_key, api_key_data.prompt_version, user_input,
+                                                      history[:-1])
+
+    if not turn["cached_response"]:
+        # Only the chunks of the crawled site relevant to this question go into
+        # the prompt; the rest of the system prompt is compiled once per
+        # prompt_version and cached (see retrieval.py and prompts.py)
+        with timer.span("retrieval"):
+            turn["context"] = "\n".join(retrieve_context(api_key_data, user_input))
+        with timer.span("prompt"):
+            system_prompt = get_system_prompt(api_key_data, turn["context"])
+            turn["messages"] = build_chat_messages(system_prompt, history)
+
+    with timer.span("prepare_commit"):
+        db.session.commit()
+    return turn
+
+def record_chat_analytics(turn, status_code, response_time):
+    # Queued and bulk-inserted in the background; never blocks the stream
+    analytics_recorder.record(
+        user_id=turn["user_id"],
+        api_key=turn["api_key"],
+        endpoint="/chat",
+        response_time=response_time,
+        status_code=status_code,
+        **turn["timer"].result(),
+    )
+
+def complete_chat_turn(turn, final_response, response_time):
+    with turn["timer"].span("complete"):
+        if not turn["cached_response"] and final_response["response"]:
+            answer_cache.store(turn["api_key"], turn["prompt_version"], turn["user_input"], final_response,
+                               turn["history"][:-1])
+
+        # Append AI response to conversation history
+        db.session.add(ConversationMessage(
+            conversation_id=turn["conversation_id"], role="assistant", content=json.dumps(final_response)
+        ))
+        Conversation.query.filter_by(id=turn["conversation_id"]).update({"updated_at": datetime.utcnow()})
+        db.session.commit()
+
+    # Record analytics
+    record_chat_analytics(turn, 200, response_time)
+
+STREAM_MODES = ("full", "delta")
+
+class ChatStreamFramer:
+    """Turns LLM text deltas into SSE frames for the chat widgets.
+
+    "full" mode is the original protocol: every frame carries the whole
+    answer so far, which the widgets in design/*.txt render directly.
+    "delta" mode sends only the new text plus a sequence number, and the
+    closing frame carries the full answer and the suggested queries.
+    """
+
+    def __init__(self, mode="full"):
+        self.mode = mode if mode in STREAM_MODES else "full"
+        self.seq = 0
+        self.parts = []
+        self.accumulated = ""
+
+    @property
+    def text(self):
+        if self.mode == "full":
+            return self.accumulated
+        return "".join(self.parts)
+
+    def frame(self, delta):
+        self.seq += 1
+        if self.mode == "delta":
+            self.parts.append(delta)
+            payload = {"seq": self.seq, "delta": delta}
+        else:
+            self.accumulated += delta
+            payload = {"response": self.accumulated}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    def final(self, suggested_queries):
+        final_response = {
+            "response": self.text,
+            "suggested_queries": suggested_queries
+        }
+        payload = final_response
+        if self.mode == "delta":
+            self.seq += 1
+            payload = dict(final_response, seq=self.seq, done=True)
+        return final_response, f"data: {json.dumps(payload)}\n\n"
+
 @app.route("/chat", methods=["POST", "OPTIONS"])
 @limiter.limit("50 per minute")
 def chat():
@@ -410,127 +624,58 @@ def chat():
         return jsonify({}), 200
     
     start_time = time.time()
+    timer = StageTimer()
     try:
         user_input = request.json.get("input")
         api_key = request.json.get("api_key")
+        stream_mode = request.json.get("stream_mode", "full")
 
         if not user_input or not api_key:
             return jsonify({"error": "Input and API key are required"}), 400
 
-        api_key_data = APIKey.query.filter_by(key=api_key).first()
-        if not api_key_data:
+        turn = prepare_chat_turn(api_key, user_input, timer)
+        if not turn:
             return jsonify({"error": "Invalid API key"}), 400
 
-        # Fetch or create conversation
-        conversation = Conversation.query.filter_by(user_id=api_key_data.user_id, api_key_id=api_key_data.id).order_by(Conversation.updated_at.desc()).first()
-        
-        if not conversation or (datetime.utcnow() - conversation.created_at) > timedelta(hours=24):
-            conversation = Conversation(user_id=api_key_data.user_id, api_key_id=api_key_data.id, messages=[])
-            db.session.add(conversation)
-
-        # Append user input to conversation history
-        conversation.messages.append({"role": "user", "content": user_input})
-
-        # Fetch the extracted text associated with this API key
-        context = api_key_data.extracted_text
-
-        # Fetch custom prompts for the user
-        custom_prompts = CustomPrompt.query.filter_by(user_id=api_key_data.user_id).all()
+        logger.info(f"Sending request to AI service with input: {user_input}")
 
-        # Prepare messages for AI, including conversation history and custom prompts
-        messages = [
-            {
-                "role": "system",
-                "content": f"""You are a concise AI assistant for this website. Provide brief, relevant responses. Context: {context[:200]}...
-
-Key guidelines:
-1. Provide friendly, personalized responses based on your deep understanding of the website and company.
-2. Use a conversational tone that reflects the brand's personality.
-3. Enthusiastically share details about products, services, and what makes the company unique.
-4. Suggest complementary items or services when it would benefit the customer.
-5. Anticipate and address potential questions or concerns proactively.
-6. Incorporate industry terms naturally, as an expert would.
-7. Keep responses concise but informative. Elaborate if the customer seems interested.
-8. Engage customers by asking relevant follow-up questions or suggesting next steps.
-9. Draw on the context of the entire conversation to provide cohesive assistance.
-
-For e-commerce inquiries:
-- Access the order tracking system to provide real-time order status updates.
-- Consult the product database for accurate information on names, pricing, and inventory.
-- Share current processing times based on the latest operations reports.
-- If specific e-commerce details are unavailable, offer to personally look into it and get back to the customer.
-
-Key points:
-1. Be friendly and personalized.
-2. Use conversational tone.
-3. Be enthusiastic about products/services.
-4. Keep responses under 50 words.
-5. If unsure, ask for clarification.
-
-Custom information:
-{' '.join([f'- {prompt.prompt}: {prompt.response}' for prompt in custom_prompts])}
-
-Custom info: {' '.join([f'{prompt.prompt}: {prompt.response[:20]}...' for prompt in custom_prompts[:3]])}"""
-            }
-        ] + conversation.messages[-5:]  # Include last 5 messages for context
+        cached_response = turn["cached_response"]
 
-        logger.info(f"Sending request to AI service with input: {user_input}")
+        # Generate suggested queries based on context and conversation while the answer streams
+        pending_suggestions = None if cached_response else start_suggested_queries(turn)
 
         def generate_ai_response():
+            metrics.SSE_STREAMS_IN_FLIGHT.labels("/chat").inc()
             try:
-                accumulated_message = ""
-                for chunk in get_ai_response_stream(api_key_data.llm, messages):
-                    accumulated_message = json.loads(chunk)["response"]
-                    yield f"data: {chunk}"
-
-                # Generate suggested queries based on context and conversation
-                suggested_queries = generate_suggested_queries(context, conversation.messages)
+                framer = ChatStreamFramer(stream_mode)
+                if cached_response:
+                    timer.token()
+                    yield framer.frame(cached_response["response"])
+                    suggested_queries = cached_response.get("suggested_queries", [])
+                else:
+                    timer.stream_started()
+                    for delta in get_ai_response_stream(turn["llm"], turn["messages"]):
+                        timer.token()
+                        yield framer.frame(delta)
+
+                    with timer.span("suggestions"):
+                        suggested_queries = collect_suggested_queries(pending_suggestions)
 
                 # Add suggested queries to the response
-                final_response = {
-                    "response": accumulated_message,
-                    "suggested_queries": suggested_queries
-                }
+                final_response, final_frame = framer.final(suggested_queries)
+                yield final_frame
 
-                yield f"data: {json.dumps(final_response)}\n\n"
-
-                # Append AI response to conversation history
-                conversation.messages.append({"role": "assistant", "content": json.dumps(final_response)})
-                conversation.updated_at = datetime.utcnow()
-                flag_modified(conversation, "messages")
-                db.session.commit()
-
-                # Record analytics
-                analytics = Analytics(
-                    user_id=api_key_data.user_id,
-                    api_key=api_key,
-                    endpoint="/chat",
-                    response_time=time.time() - start_time,
-                    status_code=200,
-                )
-                db.session.add(analytics)
-                db.session.commit()
-                app.logger.info(f"Analytics recorded for user_id: {api_key_data.user_id}, api_key: {api_key}")
-
-                # Update the stored conversation with the AI's response
-                conversation = loadConversation()
-                conversation.push({ sender: 'AI', message: final_response })
-                saveConversation(conversation)
+                complete_chat_turn(turn, final_response, time.time() - start_time)
 
             except Exception as e:
                 app.logger.error(f"Error in chat route: {str(e)}", exc_info=True)
                 yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
                 # Record analytics for error case
-                analytics = Analytics(
-                    user_id=api_key_data.user_id,
-                    api_key=api_key,
-                    endpoint="/chat",
-                    response_time=time.time() - start_time,
-                    status_code=500,
-                )
-                db.session.add(analytics)
-                db.session.commit()
+                db.session.rollback()
+                record_chat_analytics(turn, 500, time.time() - start_time)
+            finally:
+                metrics.SSE_STREAMS_IN_FLIGHT.labels("/chat").dec()
 
         return Response(stream_with_context(generate_ai_response()), content_type='text/event-stream')
 
@@ -539,21 +684,13 @@ Custom info: {' '.join([f'{prompt.prompt}: {prompt.response[:20]}...' for prompt
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
 def get_ai_response_stream(llm_type, messages):
-    response = openai_client.chat.completions.create(
-        model="gpt-3.5-turbo",  # Use a faster model
-        messages=messages,
-        max_tokens=50,  # Reduce token count for faster, more concise responses
-        temperature=0.7,
-        stream=True
-    )
+    """Yield the text deltas of a streamed completion from the key's provider."""
+    # Keep max_tokens low for faster, more concise responses
+    return get_provider(llm_type).stream_chat(messages, max_tokens=50, temperature=0.7)
 
-    accumulated_message = ""
-    for chunk in response:
-        if chunk.choices[0].delta.content is not None:
-            accumulated_message += chunk.choices[0].delta.content
-            yield json.dumps({"response": accumulated_message}) + "\n\n"
-    
-    return accumulated_message
+def get_ai_response_stream_async(llm_type, messages):
+    """Asyncio twin of get_ai_response_stream, used by the ASGI /chat path."""
+    return get_provider(llm_type).astream_chat(messages, max_tokens=50, temperature=0.7)
 
 def get_ai_response(llm_type, messages):
     user_id = session.get("user_id")
@@ -581,14 +718,7 @@ def get_ai_response(llm_type, messages):
         # Update the system message with website-specific context
         messages[0]['content'] = website_context + messages[0]['content']
 
-    # Use OpenAI's GPT-4 for all requests
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        max_tokens=100,
-        temperature=0.7
-    )
-    raw_response = response.choices[0].message.content
+    raw_response = get_provider(llm_type).complete(messages, max_tokens=100, temperature=0.7)
 
     # Ensure raw_response is a string
     if not isinstance(raw_response, str):
@@ -672,67 +802,109 @@ def get_user_api_keys():
 def get_analytics():
     try:
         user_id = session["user_id"]
-        app.logger.info(f"Fetching analytics for user_id: {user_id}")
-        
-        # Get all analytics data for the user
-        analytics = Analytics.query.filter_by(user_id=user_id).order_by(Analytics.timestamp.desc()).all()
-        
-        app.logger.info(f"Found {len(analytics)} analytics entries for user_id: {user_id}")
 
-        if not analytics:
+        # Chart and totals come from the daily rollups; only the table of
+        # recent calls reads raw rows, one keyset page at a time.
+        daily = analytics_rollups.usage_series(user_id, "day")
+        latency_series, latency = analytics_rollups.latency_percentiles(analytics_rollups.latency_sketches(user_id, "day"))
+        _, stages = analytics_rollups.stage_breakdown(user_id, "day")
+        entries, next_before_id = analytics_rollups.recent_entries(user_id)
+
+        if not daily and not entries:
             return jsonify({"message": "No analytics data available", "analytics": [], "graph_data": [], "total_calls": 0, "avg_response_time": 0}), 200
 
-        # Prepare data for charts
-        daily_usage = defaultdict(int)
-        response_times = []
-        
-        for entry in analytics:
-            date = entry.timestamp.date()
-            daily_usage[date] += 1
-            response_times.append(entry.response_time)
-        
+        total_calls = sum(calls for _, calls, _, _ in daily)
+        total_errors = sum(errors for _, _, errors, _ in daily)
+        latency_sum = sum(latency for _, _, _, latency in daily)
+
         graph_data = [
-            {"date": date.isoformat(), "count": count}
-            for date, count in sorted(daily_usage.items())
+            {"date": bucket.date().isoformat(), "count": calls, "errors": errors}
+            for bucket, calls, errors, _ in daily
         ]
-        
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-        
-        analytics_data = [
-            {
-                "api_key": a.api_key,
-                "endpoint": a.endpoint,
-                "timestamp": a.timestamp.isoformat(),
-                "response_time": a.response_time,
-                "status_code": a.status_code,
-            }
-            for a in analytics[:100]  # Limit to last 100 entries for the table
-        ]
-        
+
+        user_keys = [key for (key,) in db.session.query(APIKey.key).filter_by(user_id=user_id)]
+
         result = {
-            "analytics": analytics_data,
+            "analytics": [analytics_entry_dict(a) for a in entries],
+            "next_before_id": next_before_id,
             "graph_data": graph_data,
-            "avg_response_time": avg_response_time,
-            "total_calls": len(analytics)
+            "avg_response_time": latency_sum / total_calls if total_calls else 0,
+            "latency_percentiles": latency,
+            "latency_series": latency_series,
+            "stage_breakdown": stages,
+            "total_calls": total_calls,
+            "total_errors": total_errors,
+            "answer_cache": answer_cache.stats(user_keys),
         }
-        
-        app.logger.info(f"Returning analytics data: {result}")
+
         return jsonify(result)
 
     except Exception as e:
         app.logger.error(f"Error in get_analytics: {str(e)}", exc_info=True)
         return jsonify({"error": "An error occurred while fetching analytics data"}), 500
 
+def analytics_entry_dict(entry):
+    stages = entry.stage_timings or {}
+    return {
+        "id": entry.id,
+        "api_key": entry.api_key,
+        "endpoint": entry.endpoint,
+        "timestamp": entry.timestamp.isoformat(),
+        "response_time": entry.response_time,
+        "status_code": entry.status_code,
+        "ttft": entry.ttft,
+        "tokens_per_second": tokens_per_second(entry.tokens, stages.get("stream")),
+        "stages": stages,
+    }
+
+@app.route("/dashboard/home/api/analytics/latency", methods=["GET"])
+@login_required
+def get_analytics_latency():
+    granularity = request.args.get("granularity", "day")
+    if granularity not in analytics_rollups.GRANULARITIES:
+        return jsonify({"error": "granularity must be hour or day"}), 400
+    days = request.args.get("days", 2 if granularity == "hour" else 30, type=int)
+    sketches = analytics_rollups.latency_sketches(
+        session["user_id"], granularity,
+        since=datetime.utcnow() - timedelta(days=days),
+        api_key=request.args.get("api_key"),
+        endpoint=request.args.get("endpoint"),
+    )
+    series, overall = analytics_rollups.latency_percentiles(sketches)
+    return jsonify({"granularity": granularity, "series": series, "overall": overall})
+
+@app.route("/dashboard/home/api/analytics/stages", methods=["GET"])
+@login_required
+def get_analytics_stages():
+    granularity = request.args.get("granularity", "day")
+    if granularity not in analytics_rollups.GRANULARITIES:
+        return jsonify({"error": "granularity must be hour or day"}), 400
+    days = request.args.get("days", 2 if granularity == "hour" else 30, type=int)
+    series, overall = analytics_rollups.stage_breakdown(
+        session["user_id"], granularity,
+        since=datetime.utcnow() - timedelta(days=days),
+        api_key=request.args.get("api_key"),
+        endpoint=request.args.get("endpoint"),
+    )
+    return jsonify({"granularity": granularity, "series": series, "overall": overall})
+
+@app.route("/dashboard/home/api/analytics/entries", methods=["GET"])
+@login_required
+def get_analytics_entries():
+    before_id = request.args.get("before_id", type=int)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 500)
+    entries, next_before_id = analytics_rollups.recent_entries(session["user_id"], before_id, limit)
+    return jsonify({
+        "analytics": [analytics_entry_dict(a) for a in entries],
+        "next_before_id": next_before_id,
+    })
+
 @app.route("/test_apis")
 def test_apis():
     openai_result = "Failed"
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": "Hello"}],
-            max_tokens=5,
-        )
+        get_provider("openai").complete([{"role": "user", "content": "Hello"}], max_tokens=5)
         openai_result = "Success"
     except Exception as e:
         logger.error(f"OpenAI API connection error: {str(e)}")
@@ -825,6 +997,7 @@ def delete_api_key():
     try:
         db.session.delete(api_key)
         db.session.commit()
+        evict_api_keys(api_key.key)
         return jsonify({"message": "API key and associated conversations deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -842,6 +1015,8 @@ def add_custom_prompt():
             user_id=session["user_id"], prompt=prompt, response=response
         )
         db.session.add(new_prompt)
+        invalidate_compiled_prompts(user_id=session["user_id"])
+        refresh_bootstraps(user_id=session["user_id"])
         db.session.commit()
         flash("Custom prompt added successfully", "success")
     else:
@@ -908,47 +1083,69 @@ def test_api_key():
 
 
 # New routes
+# Listings are paged, can be trimmed with ?fields= and are revalidated
+# against the catalog version (see marketplace.py)
 @app.route("/ai_models", methods=["GET"])
 def get_ai_models():
-    models = AIModel.query.all()
-    return jsonify(
-        [
-            {
-                "id": model.id,
-                "name": model.name,
-                "description": model.description,
-                "provider": model.provider,
-                "documentation_url": model.documentation_url,
-                "average_rating": get_average_rating(model.id),
-            }
-            for model in models
-        ]
-    )
+    try:
+        fields = marketplace.parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    after_id = request.args.get("after_id", type=int)
+    limit = marketplace.page_limit()
+
+    def build():
+        models, next_after_id = marketplace.model_page(after_id, limit, fields)
+        return jsonify({
+            "models": [marketplace.model_dict(model, fields) for model in models],
+            "next_after_id": next_after_id,
+        })
+
+    return marketplace.conditional_response(f"catalog-{marketplace.catalog_version()}", build)
+
+
+@app.route("/ai_models/search", methods=["GET"])
+def search_ai_models():
+    query = request.args.get("q", "")
+    if not marketplace.search_terms(query):
+        return jsonify({"error": "Query parameter q is required"}), 400
+    try:
+        fields = marketplace.parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = marketplace.page_limit(default=20)
+    version = marketplace.catalog_version()
+
+    def build():
+        models, next_offset = marketplace.search_page(query, offset, limit, fields, version)
+        return jsonify({
+            "models": [marketplace.model_dict(model, fields) for model in models],
+            "next_offset": next_offset,
+        })
+
+    return marketplace.conditional_response(f"catalog-{version}", build)
 
 
 @app.route("/ai_models/<int:model_id>", methods=["GET"])
 def get_ai_model(model_id):
-    model = AIModel.query.get_or_404(model_id)
-    reviews = ModelReview.query.filter_by(model_id=model_id).all()
-    return jsonify(
-        {
-            "id": model.id,
-            "name": model.name,
-            "description": model.description,
-            "provider": model.provider,
-            "documentation_url": model.documentation_url,
-            "average_rating": get_average_rating(model.id),
-            "reviews": [
-                {
-                    "user_id": review.user_id,
-                    "rating": review.rating,
-                    "review_text": review.review_text,
-                    "created_at": review.created_at,
-                }
-                for review in reviews
-            ],
-        }
-    )
+    try:
+        fields = marketplace.parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    before_id = request.args.get("reviews_before_id", type=int)
+    limit = marketplace.page_limit("reviews_limit")
+
+    def build():
+        model = AIModel.query.get_or_404(model_id)
+        reviews, next_before_id = marketplace.review_page(model_id, before_id, limit)
+        return jsonify(dict(
+            marketplace.model_dict(model, fields),
+            reviews=[marketplace.review_dict(review) for review in reviews],
+            next_reviews_before_id=next_before_id,
+        ))
+
+    return marketplace.conditional_response(f"catalog-{marketplace.catalog_version()}", build)
 
 @app.route('/resend-otp', methods=['POST'])
 def resend_otp_route():
@@ -969,23 +1166,33 @@ def add_model_review(model_id):
         return jsonify({"error": "User not logged in"}), 401
 
     data = request.json
+    rating = data.get("rating")
+    # int() would turn 4.9 into 4 and true into 1
+    if isinstance(rating, str) and rating.isascii() and rating.isdigit():
+        rating = int(rating)
+    if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+        return jsonify({"error": "Rating must be a whole number from 1 to 5"}), 400
+
+    # Bump the model's aggregates in SQL, in the review's transaction, so
+    # concurrent reviews cannot lose an update
+    updated = AIModel.query.filter_by(id=model_id).update(
+        {AIModel.rating_count: AIModel.rating_count + 1, AIModel.rating_sum: AIModel.rating_sum + rating},
+        synchronize_session=False,
+    )
+    if not updated:
+        db.session.rollback()
+        return jsonify({"error": "Model not found"}), 404
+
     new_review = ModelReview(
         user_id=session["user_id"],
         model_id=model_id,
-        rating=data["rating"],
+        rating=rating,
         review_text=data.get("review_text", ""),
     )
     db.session.add(new_review)
     db.session.commit()
     return jsonify({"message": "Review added successfully"}), 201
 
-
-def get_average_rating(model_id):
-    reviews = ModelReview.query.filter_by(model_id=model_id).all()
-    if not reviews:
-        return 0
-    return sum(review.rating for review in reviews) / len(reviews)
-
 @app.route('/slack/oauth_callback')
 @login_required
 def slack_oauth_callback():
@@ -1017,8 +1224,16 @@ def slack_oauth_callback():
 
 @app.route("/ai_marketplace")
 def ai_marketplace():
-    models = AIModel.query.all()
-    return render_template("ai_marketplace.html", models=models)
+    after_id = request.args.get("after_id", type=int)
+    limit = marketplace.page_limit()
+
+    def build():
+        models, next_after_id = marketplace.model_page(after_id, limit)
+        return Response(render_template("ai_marketplace.html", models=models, next_after_id=next_after_id))
+
+    # The page layout depends on who is logged in
+    etag = f"catalog-{marketplace.catalog_version()}-{session.get('user_id', 0)}"
+    return marketplace.conditional_response(etag, build)
     training_file = data.get('training_file')
 
     if not api_key_id or not training_file:
@@ -1248,27 +1463,31 @@ def serve_css():
 from flask import request, jsonify
 from datetime import datetime
 
-# Add this global variable to store API usage data
-api_usage = {}
-
 # Add this decorator to the routes that you want to track
 def track_api_usage(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        endpoint = request.endpoint
-        if endpoint not in api_usage:
-            api_usage[endpoint] = []
-        api_usage[endpoint].append(datetime.now())
+        usage_counters.record(request.endpoint)
         return func(*args, **kwargs)
     return wrapper
 
-# Add this new route to retrieve API usage data
+# Prometheus text format, summed over all workers when PROMETHEUS_MULTIPROC_DIR
+# is set (see metrics.py)
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def prometheus_metrics():
+    return Response(metrics.generate_latest(), content_type=metrics.CONTENT_TYPE)
+
+# Calls per endpoint over the last ``window`` seconds (default and max
+# USAGE_WINDOW_SECONDS), summed across all workers
 @app.route('/api/analytics', methods=['GET'])
 def get_api_analytics():
-    analytics = {}
-    for endpoint, calls in api_usage.items():
-        analytics[endpoint] = len(calls)
-    return jsonify(analytics)
+    window = request.args.get("window", type=int)
+    try:
+        return jsonify(usage_counters.counts(window))
+    except Exception as e:
+        app.logger.error(f"Error reading shared usage counters: {str(e)}")
+        return jsonify(usage_counters.local_counts(window))
 
 # Apply the decorator to the API routes you want to track
 @app.route('/api/some_endpoint', methods=['POST'])
@@ -1284,8 +1503,8 @@ def some_api_endpoint():
 @login_required
 def generate_test_analytics():
     user_id = session["user_id"]
-    for i in range(50):  # Generate 50 test entries
-        analytics = Analytics(
+    rows = [
+        dict(
             user_id=user_id,
             api_key="test_key",
             endpoint="/test",
@@ -1293,7 +1512,10 @@ def generate_test_analytics():
             status_code=random.choice([200, 200, 200, 400, 500]),
             timestamp=datetime.utcnow() - timedelta(days=random.randint(0, 29))
         )
-        db.session.add(analytics)
+        for i in range(50)  # Generate 50 test entries
+    ]
+    db.session.execute(db.insert(Analytics), rows)
+    analytics_rollups.apply_rollups(rows)
     db.session.commit()
     return "Test analytics data generated"
 
@@ -1448,12 +1670,11 @@ def get_website_info():
     if not api_key:
         return jsonify({"error": "API key is required"}), 400
 
-    api_key_data = APIKey.query.filter_by(key=api_key).first()
+    api_key_data = resolve_api_key(api_key)
     if not api_key_data:
         return jsonify({"error": "Invalid API key"}), 400
 
-    user = User.query.get(api_key_data.user_id)
-    website_info = WebsiteInfo.query.filter_by(user_id=user.id).first()
+    website_info = WebsiteInfo.query.filter_by(user_id=api_key_data.user_id).first()
 
     if not website_info:
         return jsonify({"error": "Website information not found"}), 404
@@ -1470,17 +1691,32 @@ def get_faq():
     if not api_key:
         return jsonify({"error": "API key is required"}), 400
 
-    api_key_data = APIKey.query.filter_by(key=api_key).first()
+    api_key_data = resolve_api_key(api_key)
     if not api_key_data:
         return jsonify({"error": "Invalid API key"}), 400
 
-    user = User.query.get(api_key_data.user_id)
-    faq_items = FAQ.query.filter_by(user_id=user.id).order_by(FAQ.order).all()
+    faq_items = FAQ.query.filter_by(user_id=api_key_data.user_id).order_by(FAQ.order).all()
 
     return jsonify({
         "faq": [{"question": item.question, "answer": item.answer} for item in faq_items]
     })
 
+@app.route("/api/widget-bootstrap")
+def widget_bootstrap():
+    api_key = request.args.get("api_key")
+    if not api_key:
+        return jsonify({"error": "API key is required"}), 400
+
+    api_key_data = resolve_api_key(api_key)
+    if not api_key_data:
+        return jsonify({"error": "Invalid API key"}), 400
+
+    body, etag = widget_bootstraps.get(api_key_data)
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = widget_bootstraps.cache_control()
+    return response.make_conditional(request)
+
 @app.route("/dashboard/faq", methods=["GET", "POST"])
 @login_required
 def manage_faq():
@@ -1489,6 +1725,8 @@ def manage_faq():
         answer = request.form.get("answer")
         new_faq = FAQ(user_id=session["user_id"], question=question, answer=answer)
         db.session.add(new_faq)
+        invalidate_compiled_prompts(user_id=session["user_id"])
+        refresh_bootstraps(user_id=session["user_id"])
         db.session.commit()
         flash("FAQ item added successfully", "success")
         return redirect(url_for("dashboard_section", section="faq-management"))
@@ -1514,6 +1752,8 @@ def manage_website_info():
             new_info = WebsiteInfo(user_id=session["user_id"], name=name, description=description, features=features)
             db.session.add(new_info)
 
+        invalidate_compiled_prompts(user_id=session["user_id"])
+        refresh_bootstraps(user_id=session["user_id"])
         db.session.commit()
         flash("Website information updated successfully", "success")
         return redirect(url_for("dashboard_section", section="website-info"))
@@ -1527,6 +1767,8 @@ def delete_faq():
     faq = FAQ.query.get(faq_id)
     if faq and faq.user_id == session["user_id"]:
         db.session.delete(faq)
+        invalidate_compiled_prompts(user_id=session["user_id"])
+        refresh_bootstraps(user_id=session["user_id"])
         db.session.commit()
         return jsonify({"success": True})
     return jsonify({"success": False}), 400
@@ -1540,6 +1782,8 @@ def update_faq_order():
             faq = FAQ.query.get(faq_id)
             if faq and faq.user_id == session["user_id"]:
                 faq.order = index
+        invalidate_compiled_prompts(user_id=session["user_id"])
+        refresh_bootstraps(user_id=session["user_id"])
         db.session.commit()
         return jsonify({"success": True})
     return jsonify({"success": False}), 400
@@ -1638,7 +1882,7 @@ def wc_chat():
     api_key = data.get('api_key')
 
     # Validate API key
-    api_key_obj = APIKey.query.filter_by(key=api_key).first()
+    api_key_obj = resolve_api_key(api_key)
     if not api_key_obj:
         return jsonify({'error': 'Invalid API key'}), 401
 
@@ -1764,6 +2008,8 @@ def update_api_key_design():
             return jsonify({"success": False, "error": "Invalid API key or permission denied"}), 403
 
         api_key.design = design
+        invalidate_compiled_prompts(api_key_ids=[api_key.id])
+        refresh_bootstraps(api_key_ids=[api_key.id])
         db.session.commit()
 
         return jsonify({"success": True, "message": "API key design updated successfully"})
@@ -0,0 +1,239 @@
+"""ASGI entry point.
+
+Serves POST /chat from an asyncio event loop so that one worker process can
+keep thousands of SSE streams open while it waits on the LLM. Every other
+route is handed to the regular Flask app through asgiref's WSGI adapter.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Database work is short and stays synchronous; it runs on the default thread
+pool inside an app context. Only the long-lived LLM stream lives on the loop.
+Flask-Limiter does not see requests on the async /chat path, so rate limit
+it at the proxy when serving through this module. Its request and open-stream
+metrics are recorded here, since the Flask hooks in metrics.py do not run.
+"""
+import asyncio
+import json
+import time
+from contextlib import aclosing
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app,
+    db,
+    logger,
+    SUGGESTED_QUERIES_TIMEOUT,
+    ChatStreamFramer,
+    prepare_chat_turn,
+    complete_chat_turn,
+    record_chat_analytics,
+    generate_suggested_queries_async,
+    get_ai_response_stream_async,
+)
+from llm_providers import close_providers_async
+from metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, SSE_STREAMS_IN_FLIGHT
+from stage_timer import StageTimer
+
+flask_application = WsgiToAsgi(app)
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+def _run_in_app_context(func, *args):
+    with app.app_context():
+        try:
+            return func(*args)
+        finally:
+            db.session.remove()
+
+
+async def run_db(func, *args):
+    return await asyncio.to_thread(_run_in_app_context, func, *args)
+
+
+def _cors_headers(scope):
+    origin = dict(scope["headers"]).get(b"origin", b"*")
+    return [
+        (b"access-control-allow-origin", origin),
+        (b"access-control-allow-credentials", b"true"),
+        (b"access-control-allow-headers", b"Content-Type"),
+        (b"access-control-allow-methods", b"POST, OPTIONS"),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, scope, status, payload):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")] + _cors_headers(scope),
+    })
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+
+async def chat(scope, receive, send):
+    if scope["method"] == "OPTIONS":
+        return await _send_json(send, scope, 200, {})
+    if scope["method"] != "POST":
+        return await _send_json(send, scope, 405, {"error": "Method not allowed"})
+
+    start_time = time.time()
+    timer = StageTimer()
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+    except ValueError:
+        return await _send_json(send, scope, 400, {"error": "Invalid JSON body"})
+    if not isinstance(data, dict):
+        return await _send_json(send, scope, 400, {"error": "JSON body must be an object"})
+
+    user_input = data.get("input")
+    api_key = data.get("api_key")
+    stream_mode = data.get("stream_mode", "full")
+    if not user_input or not api_key:
+        return await _send_json(send, scope, 400, {"error": "Input and API key are required"})
+
+    try:
+        turn = await run_db(prepare_chat_turn, api_key, user_input, timer)
+    except Exception as e:
+        logger.error(f"Error in async chat route: {str(e)}", exc_info=True)
+        return await _send_json(send, scope, 500, {"error": f"Unexpected error: {str(e)}"})
+    if not turn:
+        return await _send_json(send, scope, 400, {"error": "Invalid API key"})
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": SSE_HEADERS + _cors_headers(scope),
+    })
+
+    async def emit(frame):
+        await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+
+    cached_response = turn["cached_response"]
+
+    # Suggested queries run alongside the answer stream with their own deadline.
+    suggestions = None
+    if not cached_response:
+        suggestions = asyncio.create_task(asyncio.wait_for(
+            generate_suggested_queries_async(
+                turn["context"], turn["history"], 3, SUGGESTED_QUERIES_TIMEOUT, turn["llm"]
+            ),
+            SUGGESTED_QUERIES_TIMEOUT,
+        ))
+
+    # The body has been read, so the next message is the client going away.
+    # The LLM stream and suggestions are then cancelled instead of finishing
+    # for nobody.
+    disconnected = False
+    stream_task = asyncio.current_task()
+
+    async def cancel_on_disconnect():
+        nonlocal disconnected
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected = True
+        stream_task.cancel()
+
+    watcher = asyncio.create_task(cancel_on_disconnect())
+    recorded = False
+    try:
+        framer = ChatStreamFramer(stream_mode)
+        if cached_response:
+            timer.token()
+            await emit(framer.frame(cached_response["response"]))
+            suggested_queries = cached_response.get("suggested_queries", [])
+        else:
+            timer.stream_started()
+            async with aclosing(get_ai_response_stream_async(turn["llm"], turn["messages"])) as deltas:
+                async for delta in deltas:
+                    timer.token()
+                    await emit(framer.frame(delta))
+
+            try:
+                with timer.span("suggestions"):
+                    suggested_queries = await suggestions
+            except asyncio.TimeoutError:
+                logger.warning("Suggested queries missed their deadline, closing the stream without them")
+                suggested_queries = []
+        final_response, final_frame = framer.final(suggested_queries)
+        await emit(final_frame)
+        watcher.cancel()
+        if not disconnected:
+            recorded = True
+            await run_db(complete_chat_turn, turn, final_response, time.time() - start_time)
+    except asyncio.CancelledError:
+        if not disconnected:
+            raise
+    except Exception as e:
+        logger.error(f"Error in async chat route: {str(e)}", exc_info=True)
+        try:
+            await emit(f"data: {json.dumps({'error': str(e)})}\n\n")
+        except Exception:
+            pass  # client already went away
+        recorded = True
+        record_chat_analytics(turn, 500, time.time() - start_time)
+    finally:
+        watcher.cancel()
+        if suggestions is not None:
+            suggestions.cancel()
+        if not recorded:
+            # Client closed the request, as nginx logs it; also covers shutdown
+            record_chat_analytics(turn, 499, time.time() - start_time)
+
+    if not disconnected:
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def with_request_metrics(handler, route, scope, receive, send):
+    start = time.perf_counter()
+    streaming = False
+
+    async def send_and_count(message):
+        nonlocal streaming
+        if message["type"] == "http.response.start":
+            HTTP_REQUESTS.labels(route, scope["method"], message["status"]).inc()
+            HTTP_REQUEST_DURATION.labels(route, scope["method"]).observe(time.perf_counter() - start)
+            if (b"content-type", b"text/event-stream") in message["headers"]:
+                streaming = True
+                SSE_STREAMS_IN_FLIGHT.labels(route).inc()
+        await send(message)
+
+    try:
+        return await handler(scope, receive, send_and_count)
+    finally:
+        if streaming:
+            SSE_STREAMS_IN_FLIGHT.labels(route).dec()
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_providers_async()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(scope, receive, send)
+    if scope["type"] == "http" and scope["path"] == "/chat":
+        return await with_request_metrics(chat, "/chat", scope, receive, send)
+    return await flask_application(scope, receive, send)
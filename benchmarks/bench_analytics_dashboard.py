@@ -0,0 +1,100 @@
+"""Dashboard analytics load: raw-row scan vs hourly/daily rollups.
+
+Seeds --rows Analytics events for one user, in time order over --days,
+through the recorder's flush path (bulk insert + rollup upsert, timed), then
+times the analytics endpoint against the old approach: load every row with
+.all() and group by date in Python. Also pages through the recent-entries
+table with keyset pagination. Exits non-zero if rollup totals differ from the raw rows.
+
+    python benchmarks/bench_analytics_dashboard.py --rows 300000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_api_key  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=200, help="recorder batch size")
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    api_key = seed_api_key()
+    logging.disable(logging.WARNING)
+
+    from app import app, db
+    from analytics_rollups import apply_rollups
+    from models import APIKey, Analytics
+
+    random.seed(7)
+    now = datetime.utcnow()
+    with app.app_context():
+        user_id = APIKey.query.filter_by(key=api_key).one().user_id
+        insert_time = rollup_time = 0.0
+        for offset in range(0, args.rows, args.batch):
+            rows = [dict(user_id=user_id, api_key=api_key, endpoint=random.choice(["/chat", "/wp/wp_chat"]),
+                         response_time=random.lognormvariate(6, 0.6), status_code=random.choice([200] * 19 + [500]),
+                         timestamp=now - timedelta(days=args.days) + timedelta(days=args.days) * (i / args.rows))
+                    for i in range(offset, min(offset + args.batch, args.rows))]
+            start = time.perf_counter()
+            db.session.execute(db.insert(Analytics), rows)
+            middle = time.perf_counter()
+            apply_rollups(rows)
+            end = time.perf_counter()
+            db.session.commit()
+            insert_time += middle - start
+            rollup_time += end - middle
+        print(f"seeded {args.rows:,} events in batches of {args.batch}: raw insert {insert_time:.2f}s, "
+              f"rollup upsert +{rollup_time:.2f}s ({rollup_time / insert_time:.0%})")
+
+        start = time.perf_counter()
+        analytics = Analytics.query.filter_by(user_id=user_id).order_by(Analytics.timestamp.desc()).all()
+        daily_usage = defaultdict(int)
+        response_times = []
+        for entry in analytics:
+            daily_usage[entry.timestamp.date()] += 1
+            response_times.append(entry.response_time)
+        old_avg = sum(response_times) / len(response_times)
+        old_days = {date.isoformat(): count for date, count in daily_usage.items()}
+        old_time = time.perf_counter() - start
+        db.session.remove()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    start = time.perf_counter()
+    data = client.get("/dashboard/home/api/analytics").json
+    new_time = time.perf_counter() - start
+    new_days = {entry["date"]: entry["count"] for entry in data["graph_data"]}
+
+    print(f"  old (.all() + Python group by): {old_time * 1000:8.1f}ms")
+    print(f"  new (daily rollups):            {new_time * 1000:8.1f}ms  -> {old_time / new_time:.0f}x")
+
+    start = time.perf_counter()
+    pages = 1
+    before_id = data["next_before_id"]
+    while before_id and pages < 50:
+        page = client.get(f"/dashboard/home/api/analytics/entries?before_id={before_id}").json
+        before_id = page["next_before_id"]
+        pages += 1
+    print(f"  recent entries: {pages} keyset pages of 100 in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    ok = (data["total_calls"] == args.rows and new_days == old_days
+          and abs(data["avg_response_time"] - old_avg) < 1e-6 * old_avg)
+    print("rollups match raw rows" if ok else f"MISMATCH: {data['total_calls']} calls, avg {data['avg_response_time']} vs {old_avg}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
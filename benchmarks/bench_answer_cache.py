@@ -0,0 +1,98 @@
+"""Answer cache: which questions replay a cached answer, and lookup cost.
+
+Fills one key with --entries FAQ-style questions, including "Do you ship
+to Canada?", then checks that:
+  - the same question with other case, punctuation or spacing is a hit;
+  - the question with an extra clause, a negation, a refusal or another
+    country is a miss, since replaying the cached answer would be wrong;
+  - a follow-up such as "Tell me more" is only a hit after the same
+    conversation history it was answered in.
+Prints the similarity and coverage of every probe, and times lookup()
+after a store (scores rebuilt) and between stores. Exits non-zero if any
+probe lands on the wrong side.
+
+    python benchmarks/bench_answer_cache.py --entries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from answer_cache import AnswerCache  # noqa: E402
+
+CACHED = "Do you ship to Canada?"
+HITS = [
+    "Do you ship to Canada?",
+    "do you ship to canada",
+    "Do you ship to Canada??",
+    "  DO YOU SHIP TO   CANADA ? ",
+]
+MISSES = [
+    "Do you ship to Canada? Also what is the refund policy for damaged items?",
+    "Do you not ship to Canada?",
+    "Don't you ship to Canada?",
+    "Why do you refuse to ship to Canada?",
+    "Do you ship to Mexico?",
+    "Do you ship to Canada and Mexico?",
+]
+TOPICS = ["the refund policy", "delivery times", "gift cards", "store hours", "bulk orders", "warranty claims",
+          "payment options", "order tracking", "returns", "discount codes"]
+TEMPLATES = ["What is {}?", "How do I find {}?", "Can you explain {}?", "Where can I read about {}?",
+             "Who handles {}?", "Is there a page on {}?", "Tell me about {}", "Any news on {}?",
+             "How does {} work?", "Who do I ask about {}?", "Do you have info on {}?", "Can I get help with {}?",
+             "What changed in {}?", "Why is {} like this?", "When was {} updated?", "Is {} the same everywhere?",
+             "Does {} apply to me?", "How fast is {}?", "Can I see {}?", "Do you offer {}?"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200)
+    args = parser.parse_args()
+
+    cache = AnswerCache(max_entries_per_key=args.entries)
+    fillers = [template.format(topic) for topic in TOPICS for template in TEMPLATES]
+    for question in fillers[:args.entries - 1]:
+        cache.store("key", 1, question, {"response": question})
+    cache.store("key", 1, CACHED, {"response": "Yes, we ship to Canada."})
+    answers = next(iter(cache._keys.values()))
+
+    ok = True
+    print(f"{len(answers.entries)} cached questions, threshold {cache.threshold}, min coverage {cache.min_coverage}:")
+    for question, expected in [(q, True) for q in HITS] + [(q, False) for q in MISSES]:
+        hit = cache.lookup("key", 1, question) is not None
+        _, score, coverage = answers.score(cache._normalize(question))
+        ok &= hit == expected
+        print(f"  {question[:60]!r:64} cos {score:.3f} cov {coverage:.3f} -> {'hit' if hit else 'miss'} "
+              f"{'ok' if hit == expected else 'FAIL'}")
+
+    shipping = [{"role": "user", "content": CACHED}, {"role": "assistant", "content": "Yes, we ship to Canada."}]
+    refunds = [{"role": "user", "content": "What is the refund policy?"},
+               {"role": "assistant", "content": "Refunds within 30 days."}]
+    cache.store("key", 1, "Tell me more", {"response": "We ship to Canada with tracked mail."}, shipping)
+    for history, expected in [(shipping, True), (refunds, False), ((), False)]:
+        hit = cache.lookup("key", 1, "tell me more", history) is not None
+        ok &= hit == expected
+        print(f"  {'tell me more after ' + (history[0]['content'] if history else 'nothing')!r:64} "
+              f"-> {'hit' if hit else 'miss'} {'ok' if hit == expected else 'FAIL'}")
+
+    rounds = 200
+    start = time.perf_counter()
+    for n in range(rounds):
+        cache.store("key", 1, fillers[n % len(fillers)], {"response": ""})
+        cache.lookup("key", 1, MISSES[n % len(MISSES)])
+    refit = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for n in range(rounds):
+        cache.lookup("key", 1, MISSES[n % len(MISSES)])
+    warm = (time.perf_counter() - start) / rounds
+    print(f"  lookup after a store: {refit * 1000:.2f}ms, between stores: {warm * 1000:.2f}ms")
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Async /chat: a client that goes away mid-stream stops the LLM work.
+
+Drives asgi.application directly against the fake LLM server, whose answer
+stream lasts --tokens x --delay seconds and whose suggested-queries call
+takes --completion-delay. One turn runs to the end; the others disconnect
+after --frames frames. A disconnected turn must return within --budget
+seconds, leave no task running (the LLM stream and the suggestions call are
+cancelled), and record its analytics row with status 499. Exits non-zero
+otherwise.
+
+    python benchmarks/bench_chat_disconnect.py --turns 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_api_key, start_fake_llm  # noqa: E402
+
+
+async def run_turn(application, api_key, question, disconnect_after=None):
+    """(status, frames received, seconds until the app returned after the disconnect)."""
+    requests = [{"type": "http.request", "body": json.dumps({"input": question, "api_key": api_key}).encode()}]
+    gone = asyncio.Event()
+    frames = []
+    status = None
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message.get("body"):
+            frames.append(message["body"])
+            if disconnect_after is not None and len(frames) == disconnect_after:
+                gone.set()
+
+    scope = {"type": "http", "path": "/chat", "method": "POST", "headers": []}
+    await application(scope, receive, send)
+    returned = time.perf_counter()
+    return status, frames, returned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--completion-delay", type=float, default=1.5)
+    parser.add_argument("--frames", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=0.25)
+    args = parser.parse_args()
+
+    llm, llm_port = start_fake_llm(args.tokens, args.delay, args.completion_delay)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"), llm_port, ANSWER_CACHE_ENABLED="false")
+        api_key = seed_api_key()
+        logging.disable(logging.WARNING)
+
+        from analytics_recorder import analytics_recorder
+        from app import app
+        from asgi import application
+        from models import Analytics
+
+        async def scenario():
+            ok = True
+            status, frames, _ = await run_turn(application, api_key, "Do you ship to Canada?")
+            full = len(frames)
+            ok &= status == 200 and b"suggested_queries" in frames[-1]
+            print(f"complete turn: {full} frames")
+
+            for i in range(args.turns):
+                start = time.perf_counter()
+                status, frames, returned = await run_turn(application, api_key, f"Question {i}?", args.frames)
+                await asyncio.sleep(0.05)  # let cancelled tasks unwind
+                leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+                after = returned - start - args.frames * args.delay
+                ok &= len(frames) == args.frames and not leftover and after < args.budget
+                print(f"  disconnected after {len(frames)} frames: returned {after * 1000:.0f}ms later, "
+                      f"tasks left running: {len(leftover)}")
+            return ok
+
+        ok = asyncio.run(scenario())
+        analytics_recorder.flush()
+        with app.app_context():
+            statuses = [row.status_code for row in Analytics.query.filter_by(endpoint="/chat")]
+        print(f"analytics statuses: {sorted(statuses)}")
+        ok &= sorted(statuses) == [200] + [499] * args.turns
+    finally:
+        llm.terminate()
+        llm.wait()
+
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
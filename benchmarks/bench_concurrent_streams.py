@@ -0,0 +1,106 @@
+"""Compare concurrent /chat stream capacity of the sync and ASGI servers.
+
+Starts the fake LLM server, then serves the app twice: once under gunicorn
+gthread workers (the current deployment) and once under uvicorn via
+asgi.py. Each run opens N /chat streams at the same time and reports how
+many finished before the deadline and how long they took.
+
+    python benchmarks/bench_concurrent_streams.py --streams 500 --deadline 30
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, free_port, percentile, seed_api_key, start_fake_llm, start_process  # noqa: E402
+
+
+async def open_streams(port, api_key, streams, deadline):
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=0)
+    timeout = httpx.Timeout(deadline, connect=deadline)
+    results = []
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def one(i):
+            start = time.perf_counter()
+            first_byte = None
+            try:
+                async with client.stream(
+                    "POST", f"http://127.0.0.1:{port}/chat",
+                    json={"input": f"Do you ship to Canada? ({i})", "api_key": api_key},
+                ) as response:
+                    async for _ in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                    ok = response.status_code == 200
+            except (httpx.HTTPError, asyncio.TimeoutError):
+                ok = False
+            results.append((ok, first_byte, time.perf_counter() - start))
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(one(i) for i in range(streams))), deadline + 5)
+        except asyncio.TimeoutError:
+            pass
+    return results
+
+
+def report(label, results, streams, wall):
+    done = [r for r in results if r[0]]
+    ttfb = [r[1] for r in done if r[1] is not None]
+    total = [r[2] for r in done]
+    print(f"{label:>6}: {len(done)}/{streams} streams completed in {wall:.1f}s "
+          f"| ttfb p50 {percentile(ttfb, 50):.2f}s p95 {percentile(ttfb, 95):.2f}s "
+          f"| total p50 {percentile(total, 50):.2f}s p95 {percentile(total, 95):.2f}s")
+
+
+def run(label, args, env, port, api_key, streams, deadline):
+    proc = start_process(args, env, port)
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(open_streams(port, api_key, streams, deadline))
+        report(label, results, streams, time.perf_counter() - start)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=300)
+    parser.add_argument("--deadline", type=float, default=30.0, help="per-stream timeout in seconds")
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--sync-workers", type=int, default=2)
+    parser.add_argument("--sync-threads", type=int, default=8)
+    args = parser.parse_args()
+
+    llm, llm_port = start_fake_llm(args.tokens, args.delay)
+    tmp = tempfile.mkdtemp()
+    env = bench_env(os.path.join(tmp, "bench.db"), llm_port)
+    api_key = seed_api_key()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"{args.streams} concurrent streams, {args.tokens} tokens at {args.delay}s each")
+    try:
+        port = free_port()
+        run("sync", ["gunicorn", "-k", "gthread", "-w", str(args.sync_workers),
+                     "--threads", str(args.sync_threads), "-b", f"127.0.0.1:{port}", "app:app"],
+            env, port, api_key, args.streams, args.deadline)
+
+        port = free_port()
+        run("async", [sys.executable, "-m", "uvicorn", "asgi:application", "--port", str(port),
+                      "--log-level", "warning", "--backlog", "4096"],
+            env, port, api_key, args.streams, args.deadline)
+    finally:
+        llm.terminate()
+        llm.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Storage per extra API key built from a site that is already stored.
+
+Crawls the local fixture site into one key through /dashboard/home/process_url,
+then into --keys more keys from the same URL. Each key gets one chat
+retrieval. Reports content_store.storage_report() after the first key and
+after all of them, next to what the per-key layout stored before sharing:
+page text, site text and index chunks uncompressed for every key.
+Exits non-zero if:
+  - the extra keys add stored text or index bytes;
+  - the keys do not share a single context index;
+  - retrieval for any key differs from retrieval over freshly cut chunks.
+
+    python benchmarks/bench_content_store.py --pages 40 --keys 5
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_user, start_fixture_site  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--keys", type=int, default=5)
+    args = parser.parse_args()
+
+    site, site_port = start_fixture_site(pages=args.pages, delay=0.0)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"), CRAWL_MAX_PAGES=args.pages + 5)
+        user_id = seed_user()
+        logging.disable(logging.WARNING)
+
+        from api_keys import resolve_api_key
+        from app import app, db
+        from content_store import storage_report
+        from models import APIKey, CrawledPage
+        from retrieval import chunk_text, retrieve_context
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+
+        def crawl():
+            response = client.post("/dashboard/home/process_url",
+                                   json={"url": f"http://127.0.0.1:{site_port}/", "llm": "openai"})
+            while True:
+                job = client.get(response.json["status_url"]).json
+                if job["status"] in ("succeeded", "failed"):
+                    assert job["status"] == "succeeded", job
+                    return response.json["api_key"]
+                time.sleep(0.05)
+
+        keys = [crawl()]
+        with app.app_context():
+            first = storage_report()
+        keys += [crawl() for _ in range(args.keys)]
+
+        ok = True
+        with app.app_context():
+            report = storage_report()
+            before_bytes = 0
+            for key in keys:
+                api_key = APIKey.query.filter_by(key=key).one()
+                text = api_key.extracted_text
+                pages = sum(len(page.text.encode("utf-8")) for page in CrawledPage.query.filter_by(api_key_id=api_key.id))
+                chunks = chunk_text(text)
+                # What each key stored before: its pages, its site text and the index with its chunks
+                before_bytes += pages + len(text.encode("utf-8")) + len(json.dumps(chunks).encode("utf-8"))
+                retrieved = retrieve_context(resolve_api_key(key), "page shipping returns")
+                ok &= bool(retrieved) and all(chunk in chunks for chunk in retrieved)
+            before_bytes += report["index_logical_bytes"]
+            db.session.commit()
+
+        print(f"{args.pages} pages, 1 + {args.keys} keys from the same site:")
+        for label, values in (("after the first key", first), (f"after {len(keys)} keys", report)):
+            print(f"  {label:>20}: {values['crawled_pages']:4} pages, {values['blobs']:3} blobs, "
+                  f"{values['context_indexes']} index(es) | text stored {values['text_stored_bytes']:9,} B, "
+                  f"index stored {values['index_stored_bytes']:9,} B")
+        print(f"  per-key layout before sharing: {before_bytes:,} B for {len(keys)} keys "
+              f"({before_bytes // len(keys):,} B per key); now {report['stored_bytes']:,} B")
+
+        shared = (report["text_stored_bytes"] == first["text_stored_bytes"]
+                  and report["index_stored_bytes"] == first["index_stored_bytes"]
+                  and report["context_indexes"] == 1 and report["api_keys_with_index"] == len(keys))
+        print(f"  extra keys add no stored text or index bytes: {shared}; retrieval matches for every key: {ok}")
+        ok &= shared
+        print("ok" if ok else "FAIL")
+        sys.exit(0 if ok else 1)
+    finally:
+        site.terminate()
+        site.wait()
+
+
+if __name__ == "__main__":
+    main()
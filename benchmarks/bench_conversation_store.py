@@ -0,0 +1,82 @@
+"""Compare chat-turn cost of the JSON blob and ConversationMessage stores.
+
+Seeds conversations that already hold --history messages, then times one
+chat turn (store the user message, read the last 5, store the reply) the old
+way, rewriting Conversation.messages, and the new way, appending rows.
+
+    python benchmarks/bench_conversation_store.py --history 1000 --turns 200
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, percentile, seed_api_key  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    api_key = seed_api_key()
+    logging.disable(logging.WARNING)
+
+    from sqlalchemy.orm.attributes import flag_modified
+    from app import app, db
+    from models import APIKey, Conversation, ConversationMessage
+
+    reply = "Thanks for reaching out! Our store ships worldwide within five business days. " * 3
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + reply}
+        for i in range(args.history)
+    ]
+
+    with app.app_context():
+        key = APIKey.query.filter_by(key=api_key).first()
+        conversation = Conversation(user_id=key.user_id, api_key_id=key.id, legacy_messages=list(history))
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.bulk_insert_mappings(ConversationMessage, [
+            dict(message, conversation_id=conversation.id) for message in history
+        ])
+        db.session.commit()
+        conversation_id = conversation.id
+
+        blob, rows = [], []
+        for i in range(args.turns):
+            db.session.expire_all()
+            start = time.perf_counter()
+            conv = Conversation.query.get(conversation_id)
+            conv.legacy_messages.append({"role": "user", "content": f"question {i}"})
+            flag_modified(conv, "legacy_messages")
+            db.session.commit()
+            _ = conv.legacy_messages[-5:]
+            conv.legacy_messages.append({"role": "assistant", "content": reply})
+            flag_modified(conv, "legacy_messages")
+            db.session.commit()
+            blob.append(time.perf_counter() - start)
+
+            db.session.expire_all()
+            start = time.perf_counter()
+            conv = Conversation.query.get(conversation_id)
+            db.session.add(ConversationMessage(conversation_id=conversation_id, role="user", content=f"question {i}"))
+            db.session.flush()
+            _ = conv.recent_messages(5)
+            db.session.commit()
+            db.session.add(ConversationMessage(conversation_id=conversation_id, role="assistant", content=reply))
+            db.session.commit()
+            rows.append(time.perf_counter() - start)
+
+    print(f"{args.turns} turns on a conversation with {args.history}+ messages")
+    for label, values in (("json blob", blob), ("rows", rows)):
+        print(f"{label:>9}: p50 {percentile(values, 50) * 1000:.2f} ms  p95 {percentile(values, 95) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
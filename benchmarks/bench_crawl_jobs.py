@@ -0,0 +1,107 @@
+"""Drive process_url and the crawl job queue against the local fixture site.
+
+Submits --jobs URLs through /dashboard/home/process_url, a --slow share of
+them pointing at a page that never finishes, and polls the status endpoint
+until every job settles. Each job is capped at one page, so this measures
+the queue rather than the crawler (see bench_crawler.py). Reports how long
+the endpoint took to answer and how long the jobs took, and exits non-zero
+if a fast job failed or a slow one was not cut off by CRAWL_JOB_TIMEOUT.
+Also plants one queued and one running job that no worker holds, as if
+their process had died, and checks that the status endpoint fails them once
+they are older than the timeout plus CRAWL_STALE_GRACE, and only then.
+
+    python benchmarks/bench_crawl_jobs.py --jobs 20 --slow 4 --job-timeout 2
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, percentile, seed_user, start_fixture_site  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--slow", type=int, default=4, help="how many jobs point at the never-ending page")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--job-timeout", type=float, default=2.0)
+    parser.add_argument("--delay", type=float, default=0.2, help="fixture latency per page")
+    args = parser.parse_args()
+
+    site, site_port = start_fixture_site(pages=args.jobs, delay=args.delay, trickle_delay=0.2)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"),
+                  CRAWL_WORKERS=args.workers, CRAWL_JOB_TIMEOUT=args.job_timeout, CRAWL_MAX_PAGES=1)
+        user_id = seed_user()
+        logging.disable(logging.WARNING)
+
+        from app import app
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+
+        base = f"http://127.0.0.1:{site_port}"
+        submitted, submit_times = {}, []
+        start = time.perf_counter()
+        for i in range(args.jobs):
+            url = f"{base}/slow" if i < args.slow else f"{base}/page/{i}.html"
+            t0 = time.perf_counter()
+            response = client.post("/dashboard/home/process_url", json={"url": url, "llm": "openai"})
+            submit_times.append(time.perf_counter() - t0)
+            assert response.status_code == 202, response.get_data(as_text=True)
+            submitted[response.json["job_id"]] = (url, response.json["status_url"])
+
+        finished = {}
+        while len(finished) < len(submitted):
+            for job_id, (url, status_url) in submitted.items():
+                if job_id not in finished:
+                    job = client.get(status_url).json
+                    if job["status"] in ("succeeded", "failed"):
+                        finished[job_id] = (url, job, time.perf_counter() - start)
+            time.sleep(0.05)
+        wall = time.perf_counter() - start
+
+        wrong = [(url, job) for url, job, _ in finished.values()
+                 if (job["status"] == "succeeded") == url.endswith("/slow")]
+        durations = [elapsed for _, _, elapsed in finished.values()]
+        # robots.txt, sitemap.xml and the page itself
+        serial = (args.jobs - args.slow) * 3 * args.delay + args.slow * args.job_timeout
+
+        print(f"{args.jobs} jobs ({args.slow} slow), {args.workers} workers, job timeout {args.job_timeout}s")
+        print(f"  process_url: p50 {percentile(submit_times, 50) * 1000:.1f}ms p95 {percentile(submit_times, 95) * 1000:.1f}ms")
+        print(f"  jobs settled in {wall:.2f}s (one at a time would be ~{serial:.1f}s) | "
+              f"done p50 {percentile(durations, 50):.2f}s p95 {percentile(durations, 95):.2f}s")
+        for url, job in wrong:
+            print(f"  unexpected {job['status']} for {url}: {job['error']}")
+
+        from app import crawl_jobs, db
+        from models import APIKey, CrawlJob
+
+        with app.app_context():
+            key_id = APIKey.query.filter_by(user_id=user_id).first().id
+            old = datetime.utcnow() - timedelta(seconds=crawl_jobs.stale_after + 1)
+            orphans = [CrawlJob(api_key_id=key_id, user_id=user_id, url=base, status="queued", created_at=old),
+                       CrawlJob(api_key_id=key_id, user_id=user_id, url=base, status="running", created_at=old,
+                                started_at=old),
+                       CrawlJob(api_key_id=key_id, user_id=user_id, url=base, status="queued")]
+            db.session.add_all(orphans)
+            db.session.commit()
+            orphan_ids = [job.id for job in orphans]
+        states = [client.get(f"/dashboard/home/crawl_jobs/{job_id}").json["status"] for job_id in orphan_ids]
+        expired = states == ["failed", "failed", "queued"]
+        print(f"  orphaned jobs (stale queued, stale running, fresh queued): {', '.join(states)} "
+              f"{'ok' if expired else 'FAIL'}")
+        sys.exit(1 if wrong or not expired else 0)
+    finally:
+        site.terminate()
+        site.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Crawler throughput (pages/sec) against the local fixture site.
+
+Crawls the whole fixture site once per concurrency level with a shared,
+pooled session, and once more with concurrency 1 and a new connection per
+request, which is roughly what the single-page fetch used to cost per page.
+Then crawls a copy of the site whose robots.txt and sitemap index also list
+a sitemap on another host: the crawler must not request it, and must still
+find every page. Exits non-zero otherwise.
+
+    python benchmarks/bench_crawler.py --pages 200 --delay 0.05
+"""
+import argparse
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, start_fixture_site  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from crawler import SiteCrawler  # noqa: E402
+
+
+class UnpooledSession(requests.Session):
+    """A session that opens a fresh connection for every request."""
+
+    def request(self, *args, **kwargs):
+        with requests.Session() as session:
+            response = session.request(*args, **kwargs)
+            response.content  # read before the connection goes away
+            return response
+
+
+class RecordingSession(requests.Session):
+    """A session that remembers the host of every request."""
+
+    def __init__(self):
+        super().__init__()
+        self.hosts = set()
+
+    def request(self, method, url, *args, **kwargs):
+        self.hosts.add(urlsplit(url).netloc)
+        return super().request(method, url, *args, **kwargs)
+
+
+def run(url, pages, concurrency, session=None):
+    crawler = SiteCrawler(url, max_pages=pages, max_bytes=1 << 30, concurrency=concurrency,
+                          timeout=600, session=session)
+    start = time.perf_counter()
+    crawled = crawler.crawl()
+    elapsed = time.perf_counter() - start
+    return len(crawled), elapsed, crawler.bytes_fetched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="fixture latency per response")
+    parser.add_argument("--concurrency", default="1,4,8,16")
+    args = parser.parse_args()
+
+    site, port = start_fixture_site(pages=args.pages, delay=args.delay)
+    try:
+        url = f"http://127.0.0.1:{port}/"
+        print(f"fixture: {args.pages} pages, {args.delay * 1000:.0f}ms per response")
+        count, elapsed, _ = run(url, args.pages, 1, UnpooledSession())
+        print(f"  unpooled  c=1 : {count} pages in {elapsed:.2f}s -> {count / elapsed:.1f} pages/s")
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            count, elapsed, fetched = run(url, args.pages, concurrency)
+            print(f"  pooled   c={concurrency:<2}: {count} pages in {elapsed:.2f}s -> {count / elapsed:.1f} pages/s"
+                  f" ({fetched / 1024:.0f} KiB)")
+    finally:
+        site.terminate()
+        site.wait()
+
+    site, port = start_fixture_site(pages=args.pages, delay=0, foreign_sitemaps=True)
+    try:
+        session = RecordingSession()
+        count, _, _ = run(f"http://127.0.0.1:{port}/", args.pages, 8, session)
+    finally:
+        site.terminate()
+        site.wait()
+    foreign = sorted(session.hosts - {f"127.0.0.1:{port}"})
+    ok = not foreign and count == args.pages
+    print(f"  foreign sitemaps listed: {count} pages crawled, other hosts requested: {foreign or 'none'}")
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
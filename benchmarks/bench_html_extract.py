@@ -0,0 +1,120 @@
+"""Peak memory and parse time of HTML text extraction, old vs streaming.
+
+Serves generated pages from a local http.server and extracts each one in a
+fresh subprocess so its peak RSS is measured on its own:
+
+  bs4         the old way: download the whole body, BeautifulSoup it, join <p>
+  stream      html_extract.HTMLTextExtractor fed from iter_content (html.parser)
+  stream-lxml the same with lxml's parser, when lxml is installed
+
+Streaming runs once with the crawler's per-page cap (--cap, the
+CRAWL_PAGE_MAX_BYTES default) and once uncapped, to separate what the cap
+saves from what not building a tree saves. The "hostile" page is --hostile-mb
+of nested, unclosed markup.
+
+    python benchmarks/bench_html_extract.py --article-mb 5 --hostile-mb 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, free_port, start_process  # noqa: E402
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[4])
+import requests
+
+method, url, cap = sys.argv[1], sys.argv[2], int(sys.argv[3])
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if method == "bs4":
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(requests.get(url).text, "html.parser")
+    text = " ".join(p.get_text() for p in soup.find_all("p"))
+else:
+    from html_extract import HTMLTextExtractor
+    extractor = HTMLTextExtractor(max_bytes=cap, use_lxml=method == "stream-lxml")
+    with requests.get(url, stream=True) as response:
+        text = "\n".join(extractor.iter_blocks(response.iter_content(chunk_size=16384)))
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_kib": peak, "delta_kib": peak - baseline, "chars": len(text)}))
+"""
+
+
+def write_article(path, megabytes):
+    paragraph = ("<p>Our handmade oak tables are finished with natural oils and ship worldwide "
+                 "within <b>ten</b> working days. <a href='/care'>Care guide</a>.</p>\n")
+    nav = "<nav><ul>" + "".join(f"<li><a href='/p/{n}'>Page {n}</a></li>" for n in range(50)) + "</ul></nav>"
+    with open(path, "w") as f:
+        f.write(f"<html><head><title>Article</title><script>var x = 1;</script></head><body>{nav}<main>")
+        written = 0
+        while written < megabytes << 20:
+            written += f.write(paragraph)
+        f.write("</main><footer>(c) Example</footer></body></html>")
+
+
+def write_hostile(path, megabytes):
+    # Deeply nested unclosed elements: every one becomes a tree node for a DOM parser.
+    chunk = "<div><span class=x>word " * 256 + "\n"
+    with open(path, "w") as f:
+        f.write("<html><head><title>Hostile</title></head><body>")
+        written = 0
+        while written < megabytes << 20:
+            written += f.write(chunk)
+
+
+def measure(method, url, cap):
+    out = subprocess.run([sys.executable, "-c", CHILD, method, url, str(cap), ROOT],
+                         capture_output=True, text=True, timeout=900)
+    if out.returncode:
+        return {"error": out.stderr.strip().splitlines()[-1]}
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--article-mb", type=int, default=5)
+    parser.add_argument("--hostile-mb", type=int, default=50)
+    parser.add_argument("--cap", type=int, default=1024 * 1024, help="per-page byte cap for streaming")
+    args = parser.parse_args()
+
+    try:
+        import lxml  # noqa: F401
+        methods = ["bs4", "stream", "stream-lxml"]
+    except ImportError:
+        methods = ["bs4", "stream"]
+
+    directory = tempfile.mkdtemp()
+    write_article(os.path.join(directory, "article.html"), args.article_mb)
+    write_hostile(os.path.join(directory, "hostile.html"), args.hostile_mb)
+
+    port = free_port()
+    server = start_process([sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1",
+                            "--directory", directory], dict(os.environ), port)
+    try:
+        for name, megabytes in (("article", args.article_mb), ("hostile", args.hostile_mb)):
+            url = f"http://127.0.0.1:{port}/{name}.html"
+            print(f"{name} page, {megabytes} MiB")
+            for method in methods:
+                caps = [0] if method == "bs4" else [args.cap, 1 << 40]
+                for cap in caps:
+                    label = method if method == "bs4" else f"{method} ({'capped' if cap == args.cap else 'uncapped'})"
+                    result = measure(method, url, cap)
+                    if "error" in result:
+                        print(f"  {label:>24}: failed: {result['error']}")
+                        continue
+                    print(f"  {label:>24}: {result['seconds']:6.2f}s, peak RSS {result['peak_kib'] / 1024:7.1f} MiB "
+                          f"(+{result['delta_kib'] / 1024:.1f} MiB), {result['chars']:,} chars")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
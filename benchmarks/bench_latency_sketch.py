@@ -0,0 +1,143 @@
+"""Accuracy and cost of the latency sketches behind the p50/p90/p99 series.
+
+First checks latency_sketch.LatencySketch on its own: for synthetic data
+shaped like generate_test_analytics (uniform 0.1-2.0s, 1 in 5 errors) and
+a heavy-tailed lognormal, every estimated quantile must be within
+RELATIVE_ACCURACY of the exact order statistic, and sketches built from
+parts and merged must equal one built from everything.
+
+Then seeds --rows events through the recorder's rollup path and compares
+the per-day percentiles from /dashboard/home/api/analytics/latency with
+exact ones from sorting the raw rows, timing both. Exits non-zero if any
+estimate is off by more than RELATIVE_ACCURACY.
+
+    python benchmarks/bench_latency_sketch.py --rows 200000
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, bench_env, seed_api_key  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from latency_sketch import RELATIVE_ACCURACY, LatencySketch  # noqa: E402
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def exact(sorted_values, q):
+    return sorted_values[math.floor(q * (len(sorted_values) - 1))]
+
+
+def relative_error(estimate, value):
+    return abs(estimate - value) / value if value else abs(estimate)
+
+
+def check(label, values, sketch):
+    values = sorted(values)
+    worst = 0.0
+    parts = []
+    for q in QUANTILES:
+        estimate, truth = sketch.quantile(q), exact(values, q)
+        worst = max(worst, relative_error(estimate, truth))
+        parts.append(f"p{round(q * 100)} {estimate:.4f} vs {truth:.4f}")
+    ok = worst <= RELATIVE_ACCURACY + 1e-9
+    print(f"  {label:>26}: {', '.join(parts)} | worst error {worst:.2%} {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def sketch_checks(rng):
+    print(f"sketch alone (relative accuracy {RELATIVE_ACCURACY:.0%}):")
+    datasets = {
+        "uniform 0.1-2.0s, n=50": [rng.uniform(0.1, 2.0) for _ in range(50)],
+        "uniform 0.1-2.0s, n=100k": [rng.uniform(0.1, 2.0) for _ in range(100000)],
+        "lognormal tail, n=100k": [rng.lognormvariate(0, 1.2) for _ in range(100000)],
+    }
+    ok = True
+    for label, values in datasets.items():
+        sketch = LatencySketch()
+        for value in values:
+            sketch.add(value)
+        ok &= check(label, values, sketch)
+
+        merged = LatencySketch()
+        for start in range(0, len(values), 997):
+            part = LatencySketch()
+            for value in values[start:start + 997]:
+                part.add(value)
+            merged.merge(part)
+        if merged.bins != sketch.bins:
+            print(f"  {label:>26}: merged sketch differs from the single sketch FAIL")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    ok = sketch_checks(rng)
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    api_key = seed_api_key()
+    logging.disable(logging.WARNING)
+
+    from app import app, db
+    from analytics_rollups import apply_rollups
+    from models import APIKey, Analytics
+
+    now = datetime.utcnow().replace(hour=12)
+    with app.app_context():
+        user_id = APIKey.query.filter_by(key=api_key).one().user_id
+        for offset in range(0, args.rows, 500):
+            rows = [dict(user_id=user_id, api_key=api_key, endpoint=rng.choice(["/chat", "/wp/wp_chat"]),
+                         response_time=rng.choice([rng.uniform(0.1, 2.0), rng.lognormvariate(0, 1.2)]),
+                         status_code=rng.choice([200, 200, 200, 400, 500]),
+                         timestamp=now - timedelta(days=args.days - 1) + timedelta(days=args.days - 1) * (i / args.rows))
+                    for i in range(offset, min(offset + 500, args.rows))]
+            db.session.execute(db.insert(Analytics), rows)
+            apply_rollups(rows)
+            db.session.commit()
+
+        start = time.perf_counter()
+        per_day = defaultdict(list)
+        for timestamp, response_time in db.session.query(Analytics.timestamp, Analytics.response_time).filter_by(user_id=user_id):
+            per_day[timestamp.date().isoformat()].append(response_time)
+        exact_series = {day: [exact(sorted(values), q) for q in QUANTILES] for day, values in per_day.items()}
+        exact_time = time.perf_counter() - start
+        db.session.remove()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    start = time.perf_counter()
+    data = client.get(f"/dashboard/home/api/analytics/latency?days={args.days}").json
+    sketch_time = time.perf_counter() - start
+
+    worst = 0.0
+    for point in data["series"]:
+        truth = exact_series[point["bucket"][:10]]
+        for estimate, value in zip((point["p50"], point["p90"], point["p99"]), truth):
+            worst = max(worst, relative_error(estimate, value))
+    matched = len(data["series"]) == len(exact_series)
+    print(f"{args.rows:,} events over {len(exact_series)} days, per-day p50/p90/p99:")
+    print(f"  exact (load + sort raw rows): {exact_time * 1000:8.1f}ms")
+    print(f"  sketches (rollup bins):       {sketch_time * 1000:8.1f}ms | worst error {worst:.2%}")
+    ok &= matched and worst <= RELATIVE_ACCURACY + 1e-9
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
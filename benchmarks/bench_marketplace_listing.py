@@ -0,0 +1,121 @@
+"""Marketplace listings: one unbounded response vs keyset pages and 304s.
+
+Seeds --models AIModel rows, with descriptions of a realistic size, and
+--reviews reviews on the first model. Times and sizes:
+  - the old /ai_models body: every model serialized in one go;
+  - the first page, the same page trimmed with ?fields=, and a walk over
+    every page;
+  - a revalidation with If-None-Match, and the SQL statements it runs.
+Then it checks that:
+  - the pages hold every model exactly once;
+  - the review pages of the first model hold every review once;
+  - posting a review changes the ETag, so the next revalidation gets a 200.
+Exits non-zero if any of this fails.
+
+    python benchmarks/bench_marketplace_listing.py --models 50000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_user  # noqa: E402
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=50000)
+    parser.add_argument("--reviews", type=int, default=5000)
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    user_id = seed_user()
+    logging.disable(logging.WARNING)
+    from flask import jsonify
+    from sqlalchemy import event
+
+    from app import app, db
+    from marketplace import bump_catalog_version
+    from models import AIModel, ModelReview
+
+    rng = random.Random(9)
+    words = "fast accurate multilingual summarization vision chat code embedding small large open".split()
+    with app.app_context():
+        for offset in range(0, args.models, 10000):
+            db.session.execute(db.insert(AIModel), [
+                dict(name=f"model-{i}", description=" ".join(rng.choices(words, k=80)), provider=f"provider-{i % 50}",
+                     api_endpoint="https://example.com/v1", documentation_url="https://example.com/docs")
+                for i in range(offset, min(offset + 10000, args.models))])
+        db.session.execute(db.insert(ModelReview), [
+            dict(user_id=user_id, model_id=1, rating=rng.randint(1, 5), review_text="Solid.") for _ in range(args.reviews)])
+        # Bulk Core inserts bypass the session hook
+        bump_catalog_version(db.session.connection())
+        db.session.commit()
+
+        def old_listing():
+            return jsonify([{"id": m.id, "name": m.name, "description": m.description, "provider": m.provider,
+                             "documentation_url": m.documentation_url, "average_rating": m.average_rating}
+                            for m in AIModel.query.all()]).get_data()
+
+        with app.test_request_context():
+            old_body, old_ms = timed(old_listing)
+        db.session.remove()
+
+    client = app.test_client()
+    first, first_ms = timed(lambda: client.get("/ai_models"))
+    trimmed, trimmed_ms = timed(lambda: client.get("/ai_models?fields=name,average_rating"))
+    etag = first.headers["ETag"]
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *a: statements.append(a[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    revalidated, revalidate_ms = timed(lambda: client.get("/ai_models", headers={"If-None-Match": etag}))
+    event.remove(engine, "before_cursor_execute", listener)
+
+    def walk(path, key, cursor_arg, next_key):
+        items, cursor = [], ""
+        while cursor is not None:
+            page = client.get(f"{path}{cursor_arg}={cursor}").json
+            items.extend(entry["id"] for entry in page[key])
+            cursor = page[next_key]
+        return items
+
+    ids, walk_ms = timed(lambda: walk("/ai_models?limit=200&fields=id&", "models", "after_id", "next_after_id"))
+    review_ids = walk("/ai_models/1?fields=id&reviews_limit=200&", "reviews", "reviews_before_id", "next_reviews_before_id")
+
+    print(f"{args.models:,} models:")
+    print(f"  old /ai_models, all models:        {old_ms:8.1f}ms {len(old_body) / 1024:9.0f} KiB")
+    print(f"  first page (50):                   {first_ms:8.1f}ms {len(first.data) / 1024:9.1f} KiB")
+    print(f"  first page, fields=name,rating:    {trimmed_ms:8.1f}ms {len(trimmed.data) / 1024:9.1f} KiB")
+    print(f"  every page (200, fields=id):       {walk_ms:8.1f}ms")
+    print(f"  If-None-Match revalidation:        {revalidate_ms:8.1f}ms -> {revalidated.status_code}, "
+          f"{len(statements)} SQL statement(s)")
+
+    ok = revalidated.status_code == 304 and len(statements) == 1
+    ok &= ids == list(range(1, args.models + 1))
+    ok &= sorted(review_ids) == list(range(1, args.reviews + 1)) and review_ids == sorted(review_ids, reverse=True)
+
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    client.post("/ai_models/2/review", json={"rating": 4})
+    after_review = client.get("/ai_models", headers={"If-None-Match": etag})
+    print(f"  after a new review:                {after_review.status_code}, ETag {etag} -> {after_review.headers['ETag']}")
+    ok &= after_review.status_code == 200 and after_review.headers["ETag"] != etag
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""/ai_models ratings: per-model review scans vs the denormalized aggregates.
+
+Seeds --models AIModel rows and --reviews ModelReview rows with random
+ratings. It backfills rating_count and rating_sum with the grouped UPDATE of
+migration b3f9d6a1e827, then times /ai_models (every page) against the old
+get_average_rating() loop, which loaded every review of every model. It then
+posts --posts reviews through /ai_models/<id>/review and checks that every
+model's aggregates still match a fresh GROUP BY over the reviews. Exits
+non-zero if any model differs.
+
+    python benchmarks/bench_marketplace_ratings.py --models 1000 --reviews 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_user  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--reviews", type=int, default=1000000)
+    parser.add_argument("--posts", type=int, default=500)
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    user_id = seed_user()
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from models import AIModel, ModelReview
+
+    rng = random.Random(3)
+    with app.app_context():
+        db.session.execute(db.insert(AIModel), [
+            dict(name=f"model-{i}", description="A model.", provider="bench", api_endpoint="https://example.com",
+                 documentation_url="https://example.com/docs") for i in range(args.models)])
+        start = time.perf_counter()
+        for offset in range(0, args.reviews, 50000):
+            db.session.execute(db.insert(ModelReview), [
+                dict(user_id=user_id, model_id=rng.randint(1, args.models), rating=rng.randint(1, 5))
+                for _ in range(offset, min(offset + 50000, args.reviews))])
+        db.session.commit()
+        print(f"seeded {args.models:,} models and {args.reviews:,} reviews in {time.perf_counter() - start:.1f}s")
+
+        # Same statement as the migration's backfill
+        start = time.perf_counter()
+        reviews = (db.select(ModelReview.model_id, db.func.count().label("rating_count"),
+                             db.func.sum(ModelReview.rating).label("rating_sum"))
+                   .group_by(ModelReview.model_id).subquery())
+        db.session.execute(db.update(AIModel).where(AIModel.id == reviews.c.model_id)
+                           .values(rating_count=reviews.c.rating_count, rating_sum=reviews.c.rating_sum)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        print(f"  backfill (one grouped UPDATE):      {time.perf_counter() - start:8.2f}s")
+
+        start = time.perf_counter()
+        old = {}
+        for model in AIModel.query.all():
+            model_reviews = ModelReview.query.filter_by(model_id=model.id).all()
+            old[model.id] = sum(r.rating for r in model_reviews) / len(model_reviews) if model_reviews else 0
+        old_time = time.perf_counter() - start
+        db.session.remove()
+
+    client = app.test_client()
+    start = time.perf_counter()
+    listing = []
+    after_id = ""
+    while after_id is not None:
+        page = client.get(f"/ai_models?limit=200&after_id={after_id}").json
+        listing.extend(page["models"])
+        after_id = page["next_after_id"]
+    new_time = time.perf_counter() - start
+    print(f"  old /ai_models (reviews per model): {old_time:8.2f}s")
+    print(f"  new /ai_models (aggregates, paged): {new_time:8.3f}s  -> {old_time / new_time:.0f}x")
+    ok = all(abs(entry["average_rating"] - old[entry["id"]]) < 1e-9 for entry in listing)
+
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    start = time.perf_counter()
+    for _ in range(args.posts):
+        response = client.post(f"/ai_models/{rng.randint(1, args.models)}/review", json={"rating": rng.randint(1, 5)})
+        ok &= response.status_code == 201
+    post_time = time.perf_counter() - start
+    for bad in (9, 4.9, True, "4.9", "", None):
+        ok &= client.post("/ai_models/1/review", json={"rating": bad}).status_code == 400
+    ok &= client.post("/ai_models/1/review", json={"rating": "4"}).status_code == 201
+    ok &= client.post(f"/ai_models/{args.models + 1}/review", json={"rating": 3}).status_code == 404
+
+    with app.app_context():
+        truth = {model_id: (count, total) for model_id, count, total in
+                 db.session.query(ModelReview.model_id, db.func.count(), db.func.sum(ModelReview.rating))
+                 .group_by(ModelReview.model_id)}
+        stored = {model.id: (model.rating_count, model.rating_sum) for model in AIModel.query}
+    mismatched = [model_id for model_id, aggregates in stored.items() if aggregates != truth.get(model_id, (0, 0))]
+    print(f"  {args.posts} reviews posted in {post_time / args.posts * 1000:.2f}ms each; "
+          f"models whose aggregates differ from GROUP BY: {len(mismatched)}")
+    ok &= not mismatched
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Marketplace search: FTS index vs filtering the whole catalog.
+
+Seeds --models synthetic AIModel rows through bulk inserts, so the index
+triggers are on the write path being timed. The descriptions draw from a
+5,000-word vocabulary with Zipf frequencies, like real prose: a few words
+are in most models and most words are rare. For queries from broad to
+narrow it times:
+  - GET /ai_models/search, cold (ranking from the index) and warm (ranked
+    ids cached for the catalog version);
+  - what clients did before: load every model and filter in Python;
+  - a LIKE scan in the database.
+Then it checks that:
+  - every query returns exactly the models containing all its words;
+  - the last word also matches as a prefix;
+  - a name match ranks above a description-only match;
+  - models added, renamed and deleted through the ORM are found, or no
+    longer found, straight away.
+Exits non-zero if any check fails or a search takes longer than --budget-ms.
+Queries matching more than a quarter of the catalog are held to the budget
+warm only, since ranking costs time in proportion to the matches.
+
+    python benchmarks/bench_marketplace_search.py --models 100000
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env  # noqa: E402
+
+# Consonant-vowel syllables closed by k, m, p or z: no suffix the porter
+# stemmer strips, so an exact-word scan is the reference
+SYLLABLES = [c + v for c in "bdfghklmnprstvz" for v in "aeiou"]
+
+
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 3))) + rng.choice("kmpz"))
+    return sorted(words)
+
+
+def timed(call, repeat=1, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        result = call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=100000)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    logging.disable(logging.WARNING)
+    from app import app, db
+    from models import AIModel
+
+    import marketplace
+
+    rng = random.Random(17)
+    words = vocabulary(rng, 5000)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    providers = words[-200:]
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        for offset in range(0, args.models, 10000):
+            db.session.execute(db.insert(AIModel), [
+                dict(name=f"{rng.choice(words[:1000])} {rng.choice(words[:1000])} {i}",
+                     description=" ".join(rng.choices(words, cum_weights=weights, k=40)),
+                     provider=rng.choice(providers), api_endpoint="https://example.com/v1",
+                     documentation_url="https://example.com/docs")
+                for i in range(offset, min(offset + 10000, args.models))])
+        db.session.commit()
+        insert_ms = (time.perf_counter() - start) * 1000
+
+        catalog = [(m.id, f"{m.name} {m.provider} {m.description}".lower().split())
+                   for m in AIModel.query.options(db.load_only(AIModel.name, AIModel.provider, AIModel.description))]
+
+        def reference(query):
+            *terms, last = query.split()
+            return {model_id for model_id, tokens in catalog
+                    if all(term in tokens for term in terms) and any(token.startswith(last) for token in tokens)}
+
+        def client_side(query):
+            terms = query.split()
+            return [m.id for m in AIModel.query.all()
+                    if all(term in f"{m.name} {m.provider} {m.description}".lower().split() for term in terms)]
+
+        def like_scan(query):
+            columns = (AIModel.name, AIModel.provider, AIModel.description)
+            return db.session.query(AIModel.id).filter(
+                *(db.or_(*(column.ilike(f"%{term}%") for column in columns)) for term in query.split())).all()
+
+        # From a word in most descriptions down to rare words, a provider and a prefix
+        queries = [words[1], words[8], words[60], f"{words[20]} {words[150]}", words[700], words[3000],
+                   f"{providers[7]} {words[40]}", f"{words[5]} {words[90]} {words[400]}", words[2500][:5]]
+        baselines = {}
+        for query in queries[1:4]:
+            baselines[query] = (timed(lambda: client_side(query))[1], timed(lambda: like_scan(query), 3)[1])
+        db.session.remove()
+
+    client = app.test_client()
+
+    def search_all(query):
+        ids, offset = [], 0
+        while offset is not None:
+            page = client.get(f"/ai_models/search?q={query}&fields=id&limit=200&offset={offset}").json
+            ids.extend(model["id"] for model in page["models"])
+            offset = page["next_offset"]
+        return ids
+
+    print(f"{args.models:,} models, bulk insert with index triggers: {insert_ms:.0f}ms")
+    ok = True
+    for query in queries:
+        url = f"/ai_models/search?q={query}"
+        response, cold_ms = timed(lambda: client.get(url), 9, before=marketplace._search_results.clear)
+        _, warm_ms = timed(lambda: client.get(url), 20)
+        ids = search_all(query)
+        expected = reference(query)
+        correct = response.status_code == 200 and len(ids) == len(set(ids)) and set(ids) == expected
+        broad = len(expected) > len(catalog) / 4
+        within = warm_ms <= args.budget_ms and (broad or cold_ms <= args.budget_ms)
+        ok &= correct and within
+        line = (f"  q={query!r:28} {len(expected):6} matches ({len(expected) / len(catalog):4.0%}), "
+                f"cold {cold_ms:6.2f}ms, warm {warm_ms:5.2f}ms")
+        if query in baselines:
+            line += f" | client-side {baselines[query][0]:5.0f}ms, LIKE scan {baselines[query][1]:5.0f}ms"
+        print(f"{line} {'ok' if correct and within else 'FAIL'}")
+
+    with app.app_context():
+        named = AIModel(name="zephyr", description="general assistant", provider="acme",
+                        api_endpoint="https://example.com/v1", documentation_url="https://example.com/docs")
+        described = AIModel(name="plain", description="tuned from zephyr weights", provider="acme",
+                            api_endpoint="https://example.com/v1", documentation_url="https://example.com/docs")
+        db.session.add_all([described, named])
+        db.session.commit()
+        named_id, described_id = named.id, described.id
+    ranked = [model["id"] for model in client.get("/ai_models/search?q=zephyr").json["models"]]
+    ok &= ranked == [named_id, described_id]
+    print(f"  added through the ORM, name match first: {ranked == [named_id, described_id]}")
+
+    with app.app_context():
+        db.session.get(AIModel, named_id).name = "mistral"
+        db.session.commit()
+    renamed = [model["id"] for model in client.get("/ai_models/search?q=mistral").json["models"]]
+    stale = [model["id"] for model in client.get("/ai_models/search?q=zephyr").json["models"]]
+    ok &= renamed == [named_id] and stale == [described_id]
+    print(f"  renamed: found by new name {renamed == [named_id]}, gone from old name {stale == [described_id]}")
+
+    with app.app_context():
+        db.session.delete(db.session.get(AIModel, named_id))
+        db.session.commit()
+    gone = client.get("/ai_models/search?q=mistral").json["models"]
+    ok &= gone == []
+    print(f"  deleted: gone from results {gone == []}")
+    ok &= client.get("/ai_models/search?q=%22%29(*").status_code == 400
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""/metrics: update cost and cross-worker aggregation under gunicorn.
+
+Times prometheus_client's Counter.inc and Histogram.observe with values in
+process memory and in the memory-mapped files of its multiprocess mode. Then
+serves the app under gunicorn (--workers sync workers, recycled every
+--max-requests requests so some workers exit mid-run) with
+PROMETHEUS_MULTIPROC_DIR set. It sends --requests widget-bootstrap requests
+and scrapes /metrics --scrapes times. Whichever worker answers the scrape, it
+must report exactly --requests for the route, in both the counter and the
+histogram count, and no open streams. The gauge files left in the directory
+must all belong to live workers, i.e. gunicorn.conf.py's child_exit hook
+removed those of exited ones. Exits non-zero otherwise.
+
+    python benchmarks/bench_metrics.py --requests 2000 --workers 4
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, bench_env, free_port, seed_api_key, start_process  # noqa: E402
+
+ROUTE = "/api/widget-bootstrap"
+
+
+def update_cost(rounds=200000):
+    from prometheus_client import Counter, Histogram
+
+    counter = Counter("bench", "Bench counter.", ("route", "status"), registry=None)
+    histogram = Histogram("bench_seconds", "Bench histogram.", ("route",), registry=None)
+    costs = []
+    for call in (lambda: counter.labels("/chat", 200).inc(), lambda: histogram.labels("/chat").observe(0.042)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            call()
+        costs.append((time.perf_counter() - start) / rounds * 1e6)
+    return costs
+
+
+def measure_update_cost(directory=None):
+    # prometheus_client picks the value store at import, so each mode gets a process
+    env = dict(os.environ)
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    if directory:
+        env["PROMETHEUS_MULTIPROC_DIR"] = directory
+    output = subprocess.run([sys.executable, __file__, "--update-cost"], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return [float(cost) for cost in output.split()]
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def sample(text, name, **labels):
+    pattern = re.escape(name) + r"\{([^}]*)\} (\S+)"
+    total = 0.0
+    for label_text, value in re.findall(pattern, text):
+        found = dict(re.findall(r'(\w+)="([^"]*)"', label_text))
+        if all(found.get(k) == v for k, v in labels.items()):
+            total += float(value)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-requests", type=int, default=300)
+    parser.add_argument("--scrapes", type=int, default=12)
+    parser.add_argument("--update-cost", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.update_cost:
+        print(*update_cost())
+        return
+
+    directory = tempfile.mkdtemp()
+    metrics_dir = os.path.join(directory, "metrics")
+    memory = measure_update_cost()
+    os.makedirs(os.path.join(directory, "cost"))
+    files = measure_update_cost(os.path.join(directory, "cost"))
+    env = bench_env(os.path.join(directory, "bench.db"), PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+    print("per update:        Counter.inc  Histogram.observe")
+    print(f"  process memory:  {memory[0]:8.2f}us  {memory[1]:8.2f}us")
+    print(f"  mmap files:      {files[0]:8.2f}us  {files[1]:8.2f}us")
+
+    api_key = seed_api_key()
+    port = free_port()
+    server = start_process(["gunicorn", "-w", str(args.workers), "--max-requests", str(args.max_requests),
+                            "-b", f"127.0.0.1:{port}", "app:app"], env, port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        def get(path):
+            with urllib.request.urlopen(base + path, timeout=30) as response:
+                return response.status, response.read()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(16) as pool:
+            statuses = list(pool.map(lambda _: get(f"{ROUTE}?api_key={api_key}")[0], range(args.requests)))
+        elapsed = time.perf_counter() - start
+        pids = {int(name[:-3].rsplit("_", 1)[1]) for name in os.listdir(metrics_dir) if name.endswith(".db")}
+        gauge_pids = {int(name[:-3].rsplit("_", 1)[1]) for name in os.listdir(metrics_dir)
+                      if name.startswith("gauge_live")}
+        stale_gauges = [pid for pid in gauge_pids if not alive(pid)]
+
+        ok = statuses.count(200) == args.requests
+        seen = []
+        scrape_times = []
+        for _ in range(args.scrapes):
+            start = time.perf_counter()
+            text = get("/metrics")[1].decode()
+            scrape_times.append(time.perf_counter() - start)
+            requests_total = sample(text, "http_requests_total", route=ROUTE)
+            histogram_count = sample(text, "http_request_duration_seconds_count", route=ROUTE)
+            streams = sample(text, "sse_streams_in_flight")
+            seen.append((requests_total, histogram_count, streams))
+            ok &= requests_total == args.requests and histogram_count == args.requests and streams == 0
+        ok &= not stale_gauges
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.requests} requests over {args.workers} gunicorn workers recycled every {args.max_requests} "
+          f"requests ({len(pids)} worker processes in all) in {elapsed:.2f}s")
+    print(f"  {args.scrapes} scrapes in {sum(scrape_times) / len(scrape_times) * 1000:.1f}ms avg; "
+          f"(requests_total, histogram count, open streams) seen: {sorted(set(seen))}")
+    print(f"  gauge files of exited workers left: {len(stale_gauges)} (of {len(gauge_pids)})")
+    print("ok" if ok else f"FAIL: expected ({args.requests}, {args.requests}, 0) on every scrape "
+          f"and no gauge files of exited workers")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Full crawl vs incremental refresh of the same site.
+
+Crawls the fixture site through a crawl job, then refreshes it three ways:
+nothing changed (all 304s), --changed pages edited, and once more against a
+copy of the site that sends no ETag/Last-Modified, so unchanged pages are
+only caught by their content hash. A last crawl of that copy runs out of
+its byte budget part way; refreshing it with the same per-page cap must
+find every page unchanged. Exits non-zero if the page counts of a refresh
+are not the expected ones.
+
+    python benchmarks/bench_recrawl.py --pages 100 --changed 10
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, seed_user, start_fixture_site  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.02, help="fixture latency per response")
+    args = parser.parse_args()
+
+    site, port = start_fixture_site(pages=args.pages, delay=args.delay)
+    plain_site, plain_port = start_fixture_site(pages=args.pages, delay=args.delay, validators=False)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"), CRAWL_MAX_PAGES=args.pages)
+        user_id = seed_user()
+        logging.disable(logging.WARNING)
+
+        from app import app, db, crawl_jobs
+        from models import APIKey, CrawlJob
+        from recrawl import refresh_site
+
+        def crawl(url, page_max_bytes=None, max_bytes=None):
+            limits = crawl_jobs.page_max_bytes, crawl_jobs.max_bytes
+            crawl_jobs.page_max_bytes = page_max_bytes or crawl_jobs.page_max_bytes
+            crawl_jobs.max_bytes = max_bytes or crawl_jobs.max_bytes
+            with app.app_context():
+                api_key = APIKey(key=f"bench_{time.time_ns()}", name="bench", llm="openai",
+                                 extracted_text="", user_id=user_id)
+                db.session.add(api_key)
+                db.session.flush()
+                job = CrawlJob(api_key_id=api_key.id, user_id=user_id, url=url)
+                db.session.add(job)
+                db.session.commit()
+                api_key_id, job_id = api_key.id, job.id
+            start, cpu = time.perf_counter(), time.process_time()
+            assert crawl_jobs.run(job_id) == "succeeded"
+            crawl_jobs.page_max_bytes, crawl_jobs.max_bytes = limits
+            return api_key_id, time.perf_counter() - start, time.process_time() - cpu
+
+        def refresh(api_key_id, **limits):
+            with app.app_context():
+                start, cpu = time.perf_counter(), time.process_time()
+                run = refresh_site(api_key_id, **limits)
+                return run.to_dict(), time.perf_counter() - start, time.process_time() - cpu
+
+        api_key_id, crawl_time, crawl_cpu = crawl(f"http://127.0.0.1:{port}/")
+        plain_key_id, _, _ = crawl(f"http://127.0.0.1:{plain_port}/")
+        # Fixture pages are about 800 bytes, so this budget ends the crawl after a dozen
+        budget_key_id, _, _ = crawl(f"http://127.0.0.1:{plain_port}/", page_max_bytes=2000, max_bytes=10000)
+        print(f"{args.pages} pages, {args.delay * 1000:.0f}ms per response; "
+              f"full crawl {crawl_time:.2f}s ({crawl_cpu:.2f}s CPU)")
+
+        touched = ",".join(str(n) for n in range(1, args.changed + 1))
+        cases = [
+            ("nothing changed", api_key_id, None, {"pages_not_modified": args.pages}, {}),
+            (f"{args.changed} pages changed", api_key_id, touched,
+             {"pages_changed": args.changed, "pages_not_modified": args.pages - args.changed}, {}),
+            ("no validators", plain_key_id, None, {"pages_unchanged": args.pages}, {}),
+            ("byte budget hit", budget_key_id, None, {"pages_changed": 0, "pages_failed": 0, "reindexed": False},
+             {"page_max_bytes": 2000}),
+        ]
+        failed = False
+        for label, key_id, touch, expected, limits in cases:
+            if touch:
+                requests.post(f"http://127.0.0.1:{port}/_touch", params={"pages": touch}).raise_for_status()
+            run, elapsed, cpu = refresh(key_id, **limits)
+            print(f"  {label:>17}: {elapsed:.2f}s ({cpu:.2f}s CPU) | 304 {run['pages_not_modified']}, "
+                  f"same hash/text {run['pages_unchanged']}, changed {run['pages_changed']}, "
+                  f"failed {run['pages_failed']}, reindexed {run['reindexed']}")
+            if any(run[field] != count for field, count in expected.items()):
+                print(f"    expected {expected}")
+                failed = True
+        sys.exit(1 if failed else 0)
+    finally:
+        for proc in (site, plain_site):
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Per-stage chat timings: overhead and consistency.
+
+First times StageTimer on its own: the dozen spans, --tokens token marks
+and result() of one /chat request. Then sends --requests chat turns through
+/chat against the fake LLM (--tokens deltas, --delay apart). It checks the
+stored Analytics rows and the /dashboard/home/api/analytics/stages
+breakdown against what the fake LLM was told to do:
+  - every row has stage timings, TTFT and the streamed token count;
+  - the stream stage and tokens per second match --tokens and --delay;
+  - the sequential stages add up to the recorded response time.
+Exits non-zero if any check fails.
+
+    python benchmarks/bench_stage_timing.py --requests 40
+"""
+import argparse
+import logging
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, bench_env, seed_api_key, start_fake_llm  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from stage_timer import StageTimer, tokens_per_second  # noqa: E402
+
+# Stages that run one after another; ttft and first_token overlap them.
+SEQUENTIAL = ("key_lookup", "conversation", "answer_cache", "retrieval", "prompt", "prepare_commit",
+              "first_token", "stream", "suggestions", "complete")
+
+
+def timer_overhead(tokens, rounds=20000):
+    names = SEQUENTIAL[:6] + ("suggestions", "complete")
+    start = time.perf_counter()
+    for _ in range(rounds):
+        timer = StageTimer()
+        for name in names:
+            with timer.span(name):
+                pass
+        timer.stream_started()
+        for _ in range(tokens):
+            timer.token()
+        timer.result()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    overhead = timer_overhead(args.tokens)
+    print(f"StageTimer per request ({args.tokens} tokens): {overhead * 1e6:.1f}us")
+
+    llm, port = start_fake_llm(tokens=args.tokens, delay=args.delay, completion_delay=0.05)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"), port)
+        api_key = seed_api_key()
+        logging.disable(logging.WARNING)
+        from app import app, analytics_recorder
+        from models import Analytics, APIKey
+
+        # Unrelated questions, so none is answered from the answer cache
+        rng = random.Random(5)
+        questions = [" ".join("".join(rng.choices(string.ascii_lowercase, k=7)) for _ in range(6))
+                     for _ in range(args.requests)]
+        client = app.test_client()
+        start = time.perf_counter()
+        for question in questions:
+            response = client.post("/chat", json={"input": question, "api_key": api_key})
+            response.get_data()
+        elapsed = time.perf_counter() - start
+        analytics_recorder.flush()
+
+        with app.app_context():
+            user_id = APIKey.query.filter_by(key=api_key).one().user_id
+            rows = Analytics.query.filter_by(user_id=user_id, endpoint="/chat").all()
+
+        ok = len(rows) == args.requests
+        expected_stream = (args.tokens - 1) * args.delay
+        worst_rate = worst_gap = 0.0
+        for row in rows:
+            stages = row.stage_timings or {}
+            if row.tokens != args.tokens or not row.ttft or set(SEQUENTIAL) - set(stages):
+                print(f"  row {row.id}: tokens {row.tokens}, ttft {row.ttft}, stages {sorted(stages)} FAIL")
+                ok = False
+                continue
+            rate = tokens_per_second(row.tokens, stages["stream"])
+            worst_rate = max(worst_rate, abs(rate * args.delay - 1))
+            # response_time is taken as the turn completes, so "complete" is not
+            # part of it. What else the spans miss: framing and the generator.
+            covered = sum(stages[s] for s in SEQUENTIAL if s != "complete")
+            worst_gap = max(worst_gap, (row.response_time - covered) / row.response_time)
+            ok &= covered <= row.response_time
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+        breakdown = client.get("/dashboard/home/api/analytics/stages").json["overall"]
+    finally:
+        llm.terminate()
+
+    stages = breakdown["stages"]
+    print(f"{args.requests} /chat requests in {elapsed:.2f}s; per-stage averages from the rollups:")
+    for stage, timing in sorted(stages.items(), key=lambda item: -item[1]["avg_seconds"]):
+        print(f"  {stage:>15}: {timing['avg_seconds'] * 1000:8.2f}ms over {timing['samples']} requests")
+    rate = breakdown["tokens_per_second"]
+    print(f"  tokens/s {rate:.1f} (fake LLM: {1 / args.delay:.1f}); worst per-request rate error {worst_rate:.1%}; "
+          f"time outside spans at most {worst_gap:.1%} of a request")
+
+    ok &= stages["stream"]["samples"] == args.requests
+    ok &= abs(stages["stream"]["avg_seconds"] - expected_stream) < 0.5 * expected_stream
+    ok &= abs(rate * args.delay - 1) < 0.3 and worst_gap < 0.2
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure /chat stream-close latency with serial vs overlapped suggestions.
+
+"serial" replays the old ordering (answer stream, then the suggested-queries
+call); "overlapped" is the /chat route as it stands, where suggestions run
+alongside the stream under SUGGESTED_QUERIES_TIMEOUT.
+
+    python benchmarks/bench_stream_close.py --requests 20 --completion-delay 0.6
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, percentile, seed_api_key, start_fake_llm  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.02)
+    parser.add_argument("--completion-delay", type=float, default=0.6)
+    args = parser.parse_args()
+
+    llm, llm_port = start_fake_llm(args.tokens, args.delay, args.completion_delay)
+    try:
+        bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"), llm_port)
+        api_key = seed_api_key()
+        logging.disable(logging.WARNING)
+
+        from app import app, get_ai_response_stream, generate_suggested_queries, prepare_chat_turn
+
+        serial = []
+        with app.app_context():
+            for i in range(args.requests):
+                start = time.perf_counter()
+                turn = prepare_chat_turn(api_key, f"Do you ship to Canada? ({i})")
+                for _ in get_ai_response_stream(turn["llm"], turn["messages"]):
+                    pass
+                generate_suggested_queries(turn["context"], turn["history"])
+                serial.append(time.perf_counter() - start)
+
+        overlapped = []
+        client = app.test_client()
+        for i in range(args.requests):
+            start = time.perf_counter()
+            response = client.post("/chat", json={"input": f"Do you ship to Canada? ({i})", "api_key": api_key})
+            response.get_data()
+            overlapped.append(time.perf_counter() - start)
+
+        stream_time = args.tokens * args.delay
+        print(f"answer stream ~{stream_time:.2f}s, suggestions {args.completion_delay:.2f}s")
+        for label, values in (("serial", serial), ("overlapped", overlapped)):
+            print(f"{label:>10}: close p50 {percentile(values, 50):.3f}s p95 {percentile(values, 95):.3f}s")
+    finally:
+        llm.terminate()
+        llm.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Sliding-window usage counters: memory, record() cost and cross-worker totals.
+
+Records --calls calls into the old api_usage structure (a list of datetimes
+per endpoint) and into one process's SlidingWindowCounter rings, comparing
+memory and per-call cost. Then forks --workers processes that each record
+--per-worker calls through usage_counters against a shared SQLite file
+(USAGE_COUNTERS_URL), the same way gunicorn workers would, and checks that
+/api/analytics in the parent reports the sum. Exits non-zero if it does not.
+
+    python benchmarks/bench_usage_counters.py --calls 1000000 --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env  # noqa: E402
+
+ENDPOINTS = ["some_api_endpoint", "chat", "wp.wp_chat"]
+
+
+def measure(label, record, calls):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for n in range(calls):
+        record(ENDPOINTS[n % len(ENDPOINTS)])
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:>26}: {elapsed / calls * 1e6:6.2f}us per call, {size / 1024 / 1024:7.2f} MiB held")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=20000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    bench_env(os.path.join(directory, "bench.db"), USAGE_COUNTERS_URL=f"sqlite:///{os.path.join(directory, 'usage.db')}",
+              USAGE_FLUSH_INTERVAL=0.5)
+    logging.disable(logging.WARNING)
+    from app import app, usage_counters
+    from usage_counters import SlidingWindowCounter
+
+    print(f"{args.calls:,} calls over {len(ENDPOINTS)} endpoints:")
+    api_usage = {}
+
+    def old_record(endpoint):
+        api_usage.setdefault(endpoint, []).append(datetime.now())
+
+    measure("api_usage lists (old)", old_record, args.calls)
+    del api_usage
+
+    rings = {}
+
+    def ring_record(endpoint):
+        counter = rings.get(endpoint)
+        if counter is None:
+            counter = rings[endpoint] = SlidingWindowCounter(usage_counters.window)
+        counter.add(int(time.time()))
+
+    measure("per-second rings", ring_record, args.calls)
+    measure("usage_counters.record", usage_counters.record, args.calls // 10)
+    usage_counters.flush()
+    baseline = app.test_client().get("/api/analytics").json
+
+    pids = []
+    start = time.perf_counter()
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            for n in range(args.per_worker):
+                usage_counters.record(ENDPOINTS[n % len(ENDPOINTS)])
+            usage_counters.shutdown()
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    elapsed = time.perf_counter() - start
+
+    totals = app.test_client().get("/api/analytics").json
+    added = sum(totals.values()) - sum(baseline.values())
+    expected = args.workers * args.per_worker
+    print(f"{args.workers} forked workers x {args.per_worker:,} calls in {elapsed:.2f}s: "
+          f"/api/analytics counts {added:,} new calls (expected {expected:,}); local view {usage_counters.local_counts()}")
+    sys.exit(0 if added == expected else 1)
+
+
+if __name__ == "__main__":
+    main()
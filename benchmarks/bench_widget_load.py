@@ -0,0 +1,138 @@
+"""Server cost of loading the chat widget on a customer page.
+
+Times the requests a page view makes through the Flask test client and
+counts the SQL statements they run:
+
+  old          /chatbot.js as it used to be (design file read and placeholder
+               replaced per request, registered on a side route), then
+               /api/website-info and /api/faq
+  new          /chatbot.js and /api/widget-bootstrap, full 200 responses
+  revalidate   the same two with If-None-Match, answered with bodiless 304s
+
+Then adds a FAQ through the dashboard and checks that the bootstrap ETag
+changes and the new entry is served, and adds a custom prompt (which bumps
+prompt_version). Serving the bootstrap must never write the APIKey row, not
+even for the seeded key, which starts without a stored payload. Exits
+non-zero otherwise.
+
+    python benchmarks/bench_widget_load.py --requests 2000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, percentile, seed_api_key  # noqa: E402
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--faqs", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_env(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    api_key = seed_api_key()
+    logging.disable(logging.WARNING)
+
+    from flask import Response, request
+    from sqlalchemy import event
+    from app import app, db
+    from api_keys import resolve_api_key
+    from models import APIKey, FAQ, WebsiteInfo
+
+    @app.route("/_bench/uncached_chatbot.js")
+    def uncached_chatbot_script():
+        api_key = request.args.get("api_key")
+        design = resolve_api_key(api_key).design or "0"
+        design_file = {"1": "design/design1.txt", "2": "design/design2.txt",
+                       "3": "design/design3.txt"}.get(design, "design/design.txt")
+        with open(os.path.join(app.root_path, design_file), "r") as file:
+            script = file.read()
+        return Response(script.replace("{api_key}", api_key), mimetype="application/javascript")
+
+    with app.app_context():
+        user_id = APIKey.query.filter_by(key=api_key).one().user_id
+        db.session.add(WebsiteInfo(user_id=user_id, name="Oak & Co", description="Handmade furniture",
+                                   features="Free shipping,Lifetime warranty,Custom sizes"))
+        for n in range(args.faqs):
+            db.session.add(FAQ(user_id=user_id, question=f"Question {n}?", answer=f"Answer {n}.", order=n))
+        db.session.commit()
+        statements = [0]
+        key_writes = [0]
+
+        def count(conn, cursor, statement, *args):
+            statements[0] += 1
+            if statement.lstrip().upper().startswith("UPDATE API_KEY"):
+                key_writes[0] += 1
+
+        event.listen(db.engine, "before_cursor_execute", count)
+
+    client = app.test_client()
+    script_url = f"/chatbot.js?api_key={api_key}"
+    bootstrap_url = f"/api/widget-bootstrap?api_key={api_key}"
+    script_etag = client.get(script_url).headers["ETag"]
+    bootstrap = client.get(bootstrap_url)
+    bootstrap_etag = bootstrap.headers["ETag"]
+    print(f"bootstrap: {len(bootstrap.data):,} bytes, {len(bootstrap.json['faq'])} FAQs, "
+          f"Cache-Control {bootstrap.headers['Cache-Control']}")
+
+    def page_view(urls, headers=None, status=200):
+        def run():
+            for url, etag in urls:
+                response = client.get(url, headers={"If-None-Match": etag} if headers else None)
+                assert response.status_code == status, (url, response.status_code)
+        return run
+
+    cases = [
+        ("old (3 requests)", page_view([(f"/_bench/uncached_chatbot.js?api_key={api_key}", None),
+                                        (f"/api/website-info?api_key={api_key}", None),
+                                        (f"/api/faq?api_key={api_key}", None)])),
+        ("new (2 requests)", page_view([(script_url, None), (bootstrap_url, None)])),
+        ("revalidate (2 x 304)", page_view([(script_url, script_etag), (bootstrap_url, bootstrap_etag)],
+                                           headers=True, status=304)),
+    ]
+    for label, run in cases:
+        statements[0] = 0
+        samples = timed(run, args.requests)
+        print(f"  {label:>20}: p50 {percentile(samples, 50):.3f}ms p95 {percentile(samples, 95):.3f}ms per page view, "
+              f"{statements[0] / args.requests:.1f} SQL statements")
+
+    ok = key_writes[0] == 0
+    print(f"APIKey writes while serving: {key_writes[0]}")
+
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    client.post("/dashboard/faq", data={"question": "Do you ship abroad?", "answer": "Yes."})
+    statements[0] = key_writes[0] = 0
+    updated = client.get(bootstrap_url, headers={"If-None-Match": bootstrap_etag})
+    fresh = (updated.status_code == 200 and updated.headers["ETag"] != bootstrap_etag
+             and "Do you ship abroad?" in [item["question"] for item in updated.json["faq"]])
+    ok &= fresh and key_writes[0] == 0
+    print(f"after a FAQ edit: HTTP {updated.status_code}, new ETag {updated.headers.get('ETag')}, "
+          f"{statements[0]} SQL statements, {key_writes[0]} APIKey writes, {'ok' if fresh else 'STALE'}")
+
+    client.post("/add_custom_prompt", data={"prompt": "Returns", "response": "Within 30 days."})
+    statements[0] = key_writes[0] = 0
+    after_prompt = client.get(bootstrap_url, headers={"If-None-Match": updated.headers["ETag"]})
+    ok &= after_prompt.status_code == 304 and key_writes[0] == 0
+    print(f"after a custom prompt edit: HTTP {after_prompt.status_code}, {statements[0]} SQL statements, "
+          f"{key_writes[0]} APIKey writes")
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
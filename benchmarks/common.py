@@ -0,0 +1,114 @@
+"""Shared plumbing for the scripts in this directory.
+
+The benchmarks run the real app against a throwaway SQLite database and the
+fake LLM server, so they need the same environment variables app.py reads at
+import time. Call bench_env() before importing app.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_env(db_path, llm_port=None, **extra):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "bench"),
+        "SMTP_PORT": env.get("SMTP_PORT", "465"),
+        "RATELIMIT_ENABLED": "false",
+    })
+    if llm_port:
+        env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{llm_port}/v1"
+    env.update({k: str(v) for k, v in extra.items()})
+    os.environ.update(env)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return env
+
+
+def seed_user():
+    """Create a user in the configured database; returns its id."""
+    from app import app, db
+    from models import User
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def seed_api_key(extracted_text="We sell handmade furniture and ship worldwide."):
+    """Create a user and an API key in the configured database; returns the key."""
+    from app import app, db
+    from models import User, APIKey
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password="x")
+        db.session.add(user)
+        db.session.flush()
+        key = f"user_{uuid.uuid4().hex}"
+        db.session.add(APIKey(key=key, name="bench", llm="openai", extracted_text=extracted_text, user_id=user.id))
+        db.session.commit()
+        return key
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def start_process(args, env, port):
+    proc = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return proc
+
+
+def start_fake_llm(tokens=40, delay=0.05, completion_delay=0.5):
+    port = free_port()
+    proc = start_process(
+        [sys.executable, "benchmarks/fake_llm_server.py", "--port", str(port),
+         "--tokens", str(tokens), "--delay", str(delay),
+         "--completion-delay", str(completion_delay)],
+        dict(os.environ), port,
+    )
+    return proc, port
+
+
+def start_fixture_site(pages=200, delay=0.05, links=5, trickle_delay=0.5, validators=True, foreign_sitemaps=False):
+    port = free_port()
+    proc = start_process(
+        [sys.executable, "benchmarks/fixture_site.py", "--port", str(port),
+         "--pages", str(pages), "--delay", str(delay), "--links", str(links),
+         "--trickle-delay", str(trickle_delay)] + ([] if validators else ["--no-validators"])
+        + (["--foreign-sitemaps"] if foreign_sitemaps else []),
+        dict(os.environ), port,
+    )
+    return proc, port
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100.0 * (len(values) - 1)))))
+    return values[index]
@@ -0,0 +1,84 @@
+"""Minimal OpenAI-compatible chat completions server for load tests.
+
+Streams a fixed reply one token at a time with a configurable delay, so the
+chat endpoints can be driven without touching the network. Point the app at
+it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/fake_llm_server.py --port 8900 --tokens 40 --delay 0.05
+
+Non-streamed requests (suggested queries) answer after --completion-delay.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+REPLY_WORDS = (
+    "Thanks for reaching out! Our store ships worldwide within five business days "
+    "and every order includes free returns. Is there a product you would like "
+    "to know more about today?"
+).split()
+
+
+def make_app(tokens, delay, completion_delay):
+    words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(tokens)]
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        payload = json.loads(body or b"{}")
+        model = payload.get("model", "fake-model")
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            await asyncio.sleep(completion_delay)
+            content = "1. Do you ship abroad?\n2. What is the return policy?\n3. Any discounts?"
+            response = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": json.dumps(response).encode()})
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+            }
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n", "more_body": False})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed tokens")
+    parser.add_argument("--completion-delay", type=float, default=0.5, help="latency of non-streamed completions")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(make_app(args.tokens, args.delay, args.completion_delay), host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Local website fixture for the crawler benchmarks.
+
+Serves a generated site of --pages HTML pages that link to each other, with
+a sitemap.xml and a robots.txt, plus a few misbehaving endpoints:
+
+    /page/<n>.html   a page of paragraphs linking to the next few pages
+    /private/...     disallowed by robots.txt
+    /slow            trickles one byte every --trickle-delay seconds until the client leaves
+    /missing         404
+    POST /_touch?pages=1,2   gives those pages new text (for re-crawl runs)
+
+Pages carry an ETag and Last-Modified and answer conditional requests with
+304, unless --no-validators is given. With --foreign-sitemaps, robots.txt and
+/sitemap-index.xml also list a sitemap on another host (localhost instead of
+the host the site was requested on).
+
+    python benchmarks/fixture_site.py --port 8901 --pages 200 --delay 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+from email.utils import formatdate
+from urllib.parse import parse_qs
+
+PARAGRAPH = (
+    "Our workshop builds handmade oak and walnut furniture. Every table is "
+    "finished by hand, ships worldwide within five business days and comes "
+    "with a ten year warranty."
+)
+
+
+def render_page(n, pages, links, revision=0):
+    targets = [(n + i) % pages for i in range(1, links + 1)]
+    anchors = "".join(f'<li><a href="/page/{t}.html">Page {t}</a></li>' for t in targets)
+    return (
+        f"<html><head><title>Page {n}</title><style>p {{ color: #333; }}</style>"
+        f"<script>var page = {n};</script></head><body>"
+        f"<nav><a href=\"/\">Home</a> <a href=\"/private/admin\">Admin</a></nav>"
+        f"<h1>Page {n}</h1><p>Page {n}, revision {revision}. {PARAGRAPH}</p><p>{PARAGRAPH}</p>"
+        f"<ul>{anchors}</ul></body></html>"
+    )
+
+
+def make_app(pages, delay, links, trickle_delay, validators=True, foreign_sitemaps=False):
+    revisions = {}
+    modified = {}
+    started = formatdate(usegmt=True)
+
+    sitemap = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(f"<url><loc>{{base}}/page/{n}.html</loc></url>" for n in range(pages))
+        + "</urlset>"
+    )
+
+    async def respond(send, status, body, content_type=b"text/html; charset=utf-8", extra_headers=()):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()),
+                                *extra_headers]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def respond_page(send, headers, n):
+        body = render_page(n, pages, links, revisions.get(n, 0)).encode()
+        if not validators:
+            await respond(send, 200, body)
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'.encode()
+        last_modified = modified.get(n, started).encode()
+        if headers.get(b"if-none-match") == etag:
+            await respond(send, 304, b"", extra_headers=[(b"etag", etag)])
+            return
+        await respond(send, 200, body, extra_headers=[(b"etag", etag), (b"last-modified", last_modified)])
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        headers = dict(scope["headers"])
+        host = headers.get(b"host", b"127.0.0.1").decode()
+
+        if path == "/_touch" and scope["method"] == "POST":
+            query = parse_qs(scope["query_string"].decode())
+            for n in (int(p) for p in query.get("pages", [""])[0].split(",") if p):
+                revisions[n] = revisions.get(n, 0) + 1
+                modified[n] = formatdate(usegmt=True)
+            await respond(send, 204, b"")
+            return
+
+        if path == "/slow":
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/html; charset=utf-8")]})
+            await send({"type": "http.response.body", "body": b"<html><body><p>", "more_body": True})
+            await receive()  # the (empty) request body; the next message is the disconnect
+            disconnected = asyncio.ensure_future(receive())
+            while not disconnected.done():
+                await asyncio.sleep(trickle_delay)
+                await send({"type": "http.response.body", "body": b"a", "more_body": True})
+            return
+
+        if delay:
+            await asyncio.sleep(delay)
+        foreign = "localhost:" + host.rsplit(":", 1)[1] if ":" in host else "localhost"
+        if path == "/robots.txt":
+            robots = "User-agent: *\nDisallow: /private/\n"
+            if foreign_sitemaps:
+                robots += f"Sitemap: http://{foreign}/sitemap.xml\nSitemap: http://{host}/sitemap-index.xml\n"
+            await respond(send, 200, robots.encode(), b"text/plain")
+        elif path == "/sitemap-index.xml" and foreign_sitemaps:
+            index = ('<?xml version="1.0" encoding="UTF-8"?>'
+                     '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                     f"<sitemap><loc>http://{foreign}/sitemap.xml</loc></sitemap>"
+                     f"<sitemap><loc>http://{host}/sitemap.xml</loc></sitemap></sitemapindex>")
+            await respond(send, 200, index.encode(), b"application/xml")
+        elif path == "/sitemap.xml":
+            await respond(send, 200, sitemap.replace("{base}", f"http://{host}").encode(), b"application/xml")
+        elif path in ("/", "/index.html"):
+            await respond_page(send, headers, 0)
+        elif path.startswith("/page/") and path.endswith(".html"):
+            try:
+                n = int(path[len("/page/"):-len(".html")])
+            except ValueError:
+                n = pages
+            if 0 <= n < pages:
+                await respond_page(send, headers, n)
+            else:
+                await respond(send, 404, b"<html><body><p>Not found</p></body></html>")
+        elif path.startswith("/private/"):
+            await respond(send, 200, b"<html><body><p>Private area</p></body></html>")
+        else:
+            await respond(send, 404, b"<html><body><p>Not found</p></body></html>")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="latency of every normal response")
+    parser.add_argument("--links", type=int, default=5, help="links from each page to the following pages")
+    parser.add_argument("--trickle-delay", type=float, default=0.5, help="seconds between bytes on /slow")
+    parser.add_argument("--no-validators", action="store_true", help="send no ETag/Last-Modified and never 304")
+    parser.add_argument("--foreign-sitemaps", action="store_true", help="also list sitemaps on another host")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(make_app(args.pages, args.delay, args.links, args.trickle_delay, not args.no_validators,
+                         args.foreign_sitemaps),
+                host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Rendered chatbot.js per API key.
+
+The design/*.txt templates are read and split on their ``{api_key}``
+placeholder once, in init_app. A rendered script depends only on the template
+and the key, so it is memoized per (key, design) together with a strong ETag
+derived from both. Browsers and CDNs revalidate with If-None-Match and get a
+304 without a body.
+"""
+import hashlib
+import os
+
+from caches import TTLCache
+
+DESIGN_FILES = {
+    "1": "design1.txt",
+    "2": "design2.txt",
+    "3": "design3.txt",
+}
+DEFAULT_DESIGN_FILE = "design.txt"
+PLACEHOLDER = "{api_key}"
+
+
+class ScriptTemplate:
+    def __init__(self, source):
+        self.parts = source.split(PLACEHOLDER)
+        self.digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def render(self, api_key):
+        return api_key.join(self.parts)
+
+
+class ChatbotScripts:
+    def __init__(self, app=None):
+        self.templates = {}
+        self.max_age = 300
+        self.rendered = TTLCache(maxsize=10000, ttl=3600, name="chatbot_scripts")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = int(app.config.get("CHATBOT_SCRIPT_MAX_AGE", os.getenv("CHATBOT_SCRIPT_MAX_AGE", self.max_age)))
+        self.rendered.maxsize = int(app.config.get("CHATBOT_SCRIPT_CACHE_SIZE", os.getenv("CHATBOT_SCRIPT_CACHE_SIZE", self.rendered.maxsize)))
+        design_dir = os.path.join(app.root_path, "design")
+        for filename in {DEFAULT_DESIGN_FILE, *DESIGN_FILES.values()}:
+            with open(os.path.join(design_dir, filename), "r") as file:
+                self.templates[filename] = ScriptTemplate(file.read())
+        self.rendered.clear()
+        app.extensions["chatbot_scripts"] = self
+
+    def cache_control(self):
+        return f"public, max-age={self.max_age}"
+
+    def get(self, api_key, design):
+        """Return (body bytes, etag) of the script for ``api_key`` with ``design``."""
+        cache_key = (api_key, design)
+        entry = self.rendered.get(cache_key)
+        if entry is None:
+            template = self.templates[DESIGN_FILES.get(design, DEFAULT_DESIGN_FILE)]
+            body = template.render(api_key).encode("utf-8")
+            etag = hashlib.sha256(f"{template.digest}:{api_key}".encode("utf-8")).hexdigest()[:32]
+            entry = (body, etag)
+            self.rendered.set(cache_key, entry)
+        return entry
+
+
+chatbot_scripts = ChatbotScripts()
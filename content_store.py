@@ -0,0 +1,131 @@
+"""Content-addressed, compressed storage for large texts (ContentBlob).
+
+A text is stored once per SHA-256 of its content, so several API keys built
+from the same site share one row. Rows are zlib-compressed and only
+decompressed when a caller actually reads the text. Both a key's combined
+site text (APIKey.text_hash) and each crawled page (CrawledPage.text_hash)
+are stored this way. The ContextIndex built from a site text is shared by
+hash too (see retrieval.py).
+"""
+import hashlib
+import os
+import zlib
+
+import click
+from sqlalchemy import Text, cast, func, select, union
+
+from extensions import db
+
+CODEC = "zlib"
+COMPRESSION_LEVEL = int(os.getenv("CONTENT_COMPRESSION_LEVEL", "6"))
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text):
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress_text(data, codec=CODEC):
+    if codec != "zlib":
+        raise ValueError(f"Unknown content codec: {codec}")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _referenced_hashes():
+    from models import APIKey, ContextIndex, CrawledPage
+
+    return union(
+        select(APIKey.text_hash).where(APIKey.text_hash.isnot(None)),
+        select(CrawledPage.text_hash),
+        select(ContextIndex.text_hash),
+    )
+
+
+def storage_report():
+    """Logical vs stored bytes of site text, crawled pages and context indexes.
+
+    Logical bytes count one uncompressed copy per row that uses the content,
+    as each key stored it before sharing. For indexes that leaves out the
+    chunks every key used to store as well, so the real saving is larger.
+    """
+    from models import APIKey, ContentBlob, ContextIndex, CrawledPage
+
+    def text_references(column):
+        return (db.session.query(func.count(column), func.coalesce(func.sum(ContentBlob.size), 0))
+                .join(ContentBlob, column == ContentBlob.hash)
+                .one())
+
+    keys_with_text, key_bytes = text_references(APIKey.text_hash)
+    pages, page_bytes = text_references(CrawledPage.text_hash)
+    blobs, unique_bytes, blob_bytes = db.session.query(
+        func.count(ContentBlob.hash),
+        func.coalesce(func.sum(ContentBlob.size), 0),
+        func.coalesce(func.sum(func.length(ContentBlob.data)), 0),
+    ).one()
+    unreferenced_blobs = (db.session.query(func.count(ContentBlob.hash))
+                          .filter(ContentBlob.hash.not_in(_referenced_hashes()))
+                          .scalar())
+
+    index_size = (func.length(ContextIndex.matrix) + func.length(cast(ContextIndex.vocabulary, Text))
+                  + func.length(cast(ContextIndex.idf, Text)))
+    keys_with_index, index_logical_bytes = (db.session.query(func.count(APIKey.id), func.coalesce(func.sum(index_size), 0))
+                                            .join(ContextIndex, ContextIndex.text_hash == APIKey.text_hash)
+                                            .one())
+    indexes, index_bytes = db.session.query(func.count(ContextIndex.id), func.coalesce(func.sum(index_size), 0)).one()
+    unreferenced_indexes = (db.session.query(func.count(ContextIndex.id))
+                            .filter(ContextIndex.text_hash.not_in(
+                                select(APIKey.text_hash).where(APIKey.text_hash.isnot(None))))
+                            .scalar())
+
+    logical_bytes = int(key_bytes) + int(page_bytes) + int(index_logical_bytes)
+    stored_bytes = int(blob_bytes) + int(index_bytes)
+    return {
+        "api_keys_with_text": keys_with_text,
+        "crawled_pages": pages,
+        "blobs": blobs,
+        "unreferenced_blobs": unreferenced_blobs,
+        "api_keys_with_index": keys_with_index,
+        "context_indexes": indexes,
+        "unreferenced_indexes": unreferenced_indexes,
+        "text_logical_bytes": int(key_bytes) + int(page_bytes),  # one uncompressed copy per key and page
+        "unique_text_bytes": int(unique_bytes),  # after dedupe, before compression
+        "text_stored_bytes": int(blob_bytes),
+        "index_logical_bytes": int(index_logical_bytes),  # one index per key
+        "index_stored_bytes": int(index_bytes),
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "saved_ratio": 1 - stored_bytes / logical_bytes if logical_bytes else 0.0,
+    }
+
+
+def prune_unreferenced():
+    """Delete context indexes no key uses, then blobs nothing points at; returns (indexes, blobs).
+
+    The caller commits.
+    """
+    from models import APIKey, ContentBlob, ContextIndex
+
+    indexes = (ContextIndex.query
+               .filter(ContextIndex.text_hash.not_in(select(APIKey.text_hash).where(APIKey.text_hash.isnot(None))))
+               .delete(synchronize_session=False))
+    blobs = (ContentBlob.query
+             .filter(ContentBlob.hash.not_in(_referenced_hashes()))
+             .delete(synchronize_session=False))
+    return indexes, blobs
+
+
+def init_app(app):
+    @app.cli.command("storage-report")
+    @click.option("--prune", is_flag=True, help="Delete context indexes and blobs that nothing references.")
+    def storage_report_command(prune):
+        """Show how much site text and index storage dedupe and compression save."""
+        if prune:
+            indexes, blobs = prune_unreferenced()
+            db.session.commit()
+            click.echo(f"Pruned {indexes} unreferenced context indexes and {blobs} unreferenced blobs")
+        report = storage_report()
+        for name, value in report.items():
+            click.echo(f"{name:>20}: {value:.2%}" if name == "saved_ratio" else f"{name:>20}: {value:,}")
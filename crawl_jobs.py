@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from crawler import PAGE_MAX_BYTES, SiteCrawler
+from extensions import db
+from models import APIKey, CrawledPage, CrawlJob
+from prompts import invalidate_compiled_prompts
+from retrieval import build_context_index
+from widget_bootstrap import refresh_bootstraps
+
+logger = logging.getLogger(__name__)
+
+
+def index_site_text(api_key, text):
+    """Store a key's combined site text and point it at that text's context index.
+
+    Bumps prompt_version so every worker drops the old prompt and index, and
+    stores the widget bootstrap at the new version; the caller commits.
+    """
+    api_key.extracted_text = text
+    if text:
+        build_context_index(api_key.text_blob.hash, text)
+    invalidate_compiled_prompts(api_key_ids=[api_key.id])
+    refresh_bootstraps(api_key_ids=[api_key.id])
+
+
+class CrawlJobQueue:
+    """Runs CrawlJob rows on a bounded thread pool.
+
+    process_url creates the APIKey and a queued CrawlJob, commits, and calls
+    enqueue(); a worker thread crawls the site (crawler.SiteCrawler), stores
+    the pages, the combined text and the context index, and marks the job
+    succeeded or failed. Each job gets ``job_timeout`` seconds of wall-clock
+    time and at most ``max_pages`` pages / ``max_bytes`` bytes. Jobs live in
+    the database, so any worker process can answer a status request, but a
+    job that was queued in a process that died is not picked up again.
+    expire_stale() fails such jobs instead: a job queued, or running, for
+    more than ``stale_after`` seconds is marked failed when its status is
+    read.
+    """
+
+    def __init__(self, app=None, workers=4, job_timeout=60.0, max_pages=50, max_bytes=5 * 1024 * 1024,
+                 page_max_bytes=PAGE_MAX_BYTES, concurrency=4, stale_grace=60.0):
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.stale_grace = stale_grace
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.page_max_bytes = page_max_bytes
+        self.concurrency = concurrency
+        self.succeeded = 0
+        self.failed = 0
+        self.app = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = int(app.config.get("CRAWL_WORKERS", os.getenv("CRAWL_WORKERS", self.workers)))
+        self.job_timeout = float(app.config.get("CRAWL_JOB_TIMEOUT", os.getenv("CRAWL_JOB_TIMEOUT", self.job_timeout)))
+        self.max_pages = int(app.config.get("CRAWL_MAX_PAGES", os.getenv("CRAWL_MAX_PAGES", self.max_pages)))
+        self.max_bytes = int(app.config.get("CRAWL_MAX_BYTES", os.getenv("CRAWL_MAX_BYTES", self.max_bytes)))
+        self.page_max_bytes = int(app.config.get("CRAWL_PAGE_MAX_BYTES", os.getenv("CRAWL_PAGE_MAX_BYTES", self.page_max_bytes)))
+        self.concurrency = int(app.config.get("CRAWL_CONCURRENCY", os.getenv("CRAWL_CONCURRENCY", self.concurrency)))
+        self.stale_grace = float(app.config.get("CRAWL_STALE_GRACE", os.getenv("CRAWL_STALE_GRACE", self.stale_grace)))
+        app.extensions["crawl_jobs"] = self
+        atexit.register(self.shutdown)
+
+    def enqueue(self, job_id):
+        """Schedule a committed CrawlJob; returns the Future."""
+        return self._ensure_executor().submit(self.run, job_id)
+
+    def run(self, job_id):
+        with self.app.app_context():
+            try:
+                return self._run(job_id)
+            finally:
+                db.session.remove()
+
+    def _run(self, job_id):
+        job = db.session.get(CrawlJob, job_id)
+        if job is None or job.status != "queued":
+            return None
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        url = job.url
+        db.session.commit()
+
+        try:
+            pages = SiteCrawler(url, max_pages=self.max_pages, max_bytes=self.max_bytes,
+                                page_max_bytes=self.page_max_bytes, concurrency=self.concurrency,
+                                timeout=self.job_timeout).crawl()
+            api_key = db.session.get(APIKey, job.api_key_id)
+            if api_key is None:
+                raise LookupError("API key was deleted before the crawl finished")
+            CrawledPage.query.filter_by(api_key_id=api_key.id).delete()
+            db.session.add_all(CrawledPage(api_key_id=api_key.id, url=page.url, title=page.title,
+                                           text=page.text, size=page.size, etag=page.etag,
+                                           last_modified=page.last_modified, content_hash=page.content_hash)
+                               for page in pages)
+            text = "\n\n".join(page.text for page in pages)
+            index_site_text(api_key, text)
+            job.status = "succeeded"
+            job.pages_crawled = len(pages)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Crawl job {job_id} for {url} failed: {str(e)}")
+            # The key may have been deleted along with its jobs.
+            job = db.session.get(CrawlJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.error = str(e) or e.__class__.__name__
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+            with self._lock:
+                self.failed += 1
+            return "failed"
+
+        with self._lock:
+            self.succeeded += 1
+        logger.info(f"Crawl job {job_id} for {url} indexed {len(pages)} pages, {len(text)} characters")
+        return "succeeded"
+
+    @property
+    def stale_after(self):
+        """Seconds a job may stay queued, and then running, before it counts as lost."""
+        return self.job_timeout + self.stale_grace
+
+    def expire_stale(self, job, now=None):
+        """Mark ``job`` failed if it has been queued or running past stale_after; returns True if it did.
+
+        The update only applies while the job is still in the state that was
+        read, so a worker that picks the job up or finishes it meanwhile wins.
+        """
+        since = {"queued": job.created_at, "running": job.started_at}.get(job.status)
+        now = now or datetime.utcnow()
+        if since is None or (now - since).total_seconds() <= self.stale_after:
+            return False
+        error = f"Crawl job was {job.status} for more than {self.stale_after:.0f} seconds"
+        expired = CrawlJob.query.filter_by(id=job.id, status=job.status).update(
+            {CrawlJob.status: "failed", CrawlJob.error: error, CrawlJob.finished_at: now},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if expired:
+            logger.warning(f"Crawl job {job.id} for {job.url} expired: {error}")
+            with self._lock:
+                self.failed += 1
+        db.session.refresh(job)
+        return bool(expired)
+
+    def shutdown(self, wait=False):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self):
+        return {"workers": self.workers, "concurrency": self.concurrency,
+                "succeeded": self.succeeded, "failed": self.failed}
+
+    def _ensure_executor(self):
+        # Same fork rule as the analytics recorder: each worker process gets
+        # its own pool on first use.
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl-job")
+            return self._executor
+
+
+crawl_jobs = CrawlJobQueue()
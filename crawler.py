@@ -0,0 +1,327 @@
+"""Bounded-concurrency crawler for the site behind an API key.
+
+Starts from the submitted URL plus whatever the site's sitemaps list, then
+follows same-site links breadth first. robots.txt is honoured, URLs are
+normalised and fetched at most once, and every crawl stops at a page budget,
+a byte budget and a wall-clock deadline, whichever comes first. All requests
+of one crawl share a requests.Session, so connections to the host are kept
+alive and reused instead of reconnecting for every page.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from html_extract import HTMLTextExtractor, extract_text
+
+logger = logging.getLogger(__name__)
+
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "InfinityChatBot/1.0 (+https://infin8t.tech)")
+
+SKIP_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".pdf", ".zip", ".gz",
+    ".mp3", ".mp4", ".avi", ".mov", ".css", ".js", ".json", ".xml", ".woff", ".woff2",
+)
+MAX_SITEMAPS = 10
+# Bytes read from one page. The crawl and recrawl.py both read every page up
+# to this cap, so a page's content_hash covers the same bytes in both.
+PAGE_MAX_BYTES = 1024 * 1024
+
+_CHARSET = re.compile(r"charset=[\"']?([A-Za-z0-9_.:-]+)", re.IGNORECASE)
+
+FetchedPage = namedtuple("FetchedPage", ["url", "status_code", "content_type", "body", "encoding", "etag", "last_modified"])
+ExtractedPage = namedtuple("ExtractedPage", ["url", "status_code", "content_type", "title", "text", "links",
+                                             "size", "content_hash", "etag", "last_modified"])
+Page = namedtuple("Page", ["url", "title", "text", "size", "etag", "last_modified", "content_hash"])
+
+
+class CrawlError(Exception):
+    pass
+
+
+class CrawlTimeout(CrawlError):
+    pass
+
+
+def normalize_url(url, base=None):
+    """Absolute http(s) URL without fragment or default port, or None."""
+    try:
+        url, _ = urldefrag(urljoin(base, url) if base else url)
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if port and port != {"http": 80, "https": 443}[parts.scheme]:
+        host = f"{host}:{port}"
+    return urlunsplit((parts.scheme, host, parts.path or "/", parts.query, ""))
+
+
+def site_of(url):
+    """The host a URL belongs to for same-site checks; www. is ignored."""
+    netloc = urlsplit(url).netloc
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = CRAWL_USER_AGENT
+    return session
+
+
+def _conditional_get(url, deadline, session=None, connect_timeout=5.0, etag=None, last_modified=None):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise CrawlTimeout(f"Timed out before fetching {url}")
+
+    headers = {"User-Agent": CRAWL_USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    http = session or requests
+    return http.get(url, stream=True, timeout=(min(connect_timeout, remaining), remaining), headers=headers)
+
+
+def _iter_body(response, deadline, url):
+    for chunk in response.iter_content(chunk_size=16384):
+        yield chunk
+        if time.monotonic() > deadline:
+            raise CrawlTimeout(f"Timed out reading {url}")
+
+
+def declared_charset(content_type):
+    match = _CHARSET.search(content_type or "")
+    return match.group(1) if match else None
+
+
+def fetch_page(url, deadline, max_bytes, session=None, connect_timeout=5.0, etag=None, last_modified=None):
+    """GET ``url``, reading at most ``max_bytes`` of the raw body.
+
+    Fails with CrawlTimeout once ``deadline`` (a time.monotonic() value)
+    passes, even if the server keeps trickling bytes. Passing the validators
+    of an earlier fetch makes the request conditional; an unchanged page then
+    comes back as a 304 with an empty body.
+    """
+    with _conditional_get(url, deadline, session, connect_timeout, etag, last_modified) as response:
+        body = bytearray()
+        if response.ok:
+            for chunk in _iter_body(response, deadline, url):
+                body.extend(chunk)
+                if len(body) >= max_bytes:
+                    del body[max_bytes:]
+                    break
+        content_type = response.headers.get("Content-Type", "")
+        return FetchedPage(response.url, response.status_code, content_type, bytes(body),
+                           declared_charset(content_type), response.headers.get("ETag"),
+                           response.headers.get("Last-Modified"))
+
+
+def fetch_and_extract(url, deadline, max_bytes, session=None, connect_timeout=5.0):
+    """GET an HTML page and extract its text while it downloads.
+
+    The body is parsed chunk by chunk (html_extract) and never held whole;
+    reading stops at ``max_bytes``. Non-HTML and error responses come back
+    with no text.
+    """
+    with _conditional_get(url, deadline, session, connect_timeout) as response:
+        content_type = response.headers.get("Content-Type", "")
+        extractor = HTMLTextExtractor(max_bytes=max_bytes, encoding=declared_charset(content_type))
+        blocks = []
+        if response.ok and "html" in content_type.lower():
+            blocks = list(extractor.iter_blocks(_iter_body(response, deadline, url)))
+        return ExtractedPage(response.url, response.status_code, content_type, extractor.title,
+                             "\n".join(blocks), extractor.links, extractor.bytes_read, extractor.content_hash,
+                             response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+
+def content_hash(body, max_bytes=PAGE_MAX_BYTES):
+    """SHA-256 of a page body cut at the per-page cap, as the crawl stores it.
+
+    fetch_and_extract hashes the same bytes as it reads them (html_extract).
+    """
+    return hashlib.sha256(body[:max_bytes]).hexdigest()
+
+
+def parse_page(body, encoding=None):
+    """Return (title, text, links) for an already downloaded HTML body."""
+    return extract_text(body, max_bytes=max(len(body), 1), encoding=encoding)
+
+
+class SiteCrawler:
+    def __init__(self, start_url, max_pages=50, max_bytes=5 * 1024 * 1024, page_max_bytes=PAGE_MAX_BYTES,
+                 concurrency=4, timeout=60.0, session=None):
+        self.start_url = normalize_url(start_url)
+        if self.start_url is None:
+            raise CrawlError(f"Not an http(s) URL: {start_url}")
+        self.site = site_of(self.start_url)
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.page_max_bytes = min(page_max_bytes, max_bytes)
+        self.concurrency = concurrency
+        self.deadline = time.monotonic() + timeout
+        self.session = session or make_session(concurrency)
+        self._owns_session = session is None
+        self.robots = None
+        self.seen = set()
+        self.frontier = deque()
+        self.pages = []
+        self.bytes_fetched = 0
+        self.bytes_reserved = 0
+        self.errors = []
+
+    def crawl(self):
+        """Crawl the site and return the pages that had text, the start page first and the rest by URL."""
+        try:
+            self.robots = self._load_robots()
+            if not self._allowed(self.start_url):
+                raise CrawlError(f"robots.txt does not allow crawling {self.start_url}")
+            self._enqueue(self.start_url)
+            for url in self._sitemap_urls():
+                self._enqueue(url)
+            self._run()
+        finally:
+            if self._owns_session:
+                self.session.close()
+
+        if not self.pages and self.errors:
+            error = self.errors[0]
+            raise error if isinstance(error, CrawlError) else CrawlError(str(error))
+        # Pages finish in a different order on every crawl. A fixed order gives
+        # the same site the same combined text, so keys share its blob and index.
+        self.pages.sort(key=lambda page: (page.url != self.start_url, page.url))
+        return self.pages
+
+    def _run(self):
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crawler")
+        in_flight = {}
+        try:
+            while self.frontier or in_flight:
+                while (self.frontier and len(in_flight) < self.concurrency
+                       and len(self.pages) + len(in_flight) < self.max_pages
+                       and self.bytes_fetched + self.bytes_reserved + self.page_max_bytes <= self.max_bytes):
+                    url = self.frontier.popleft()
+                    # Each fetch reserves a whole page's cap of the site budget
+                    # up front, so parallel fetches can never read past it
+                    # together. A page is never read with a smaller cap: its
+                    # content_hash would then not match the recrawl's.
+                    budget = self.page_max_bytes
+                    self.bytes_reserved += budget
+                    future = pool.submit(fetch_and_extract, url, self.deadline, budget, self.session)
+                    in_flight[future] = (url, budget)
+                if not in_flight:
+                    break
+
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.errors.append(CrawlTimeout(f"Crawl of {self.start_url} ran out of time"))
+                    break
+                done, _ = wait(in_flight, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, budget = in_flight.pop(future)
+                    self.bytes_reserved -= budget
+                    try:
+                        self._handle(url, future.result())
+                    except (requests.RequestException, CrawlError) as e:
+                        logger.debug(f"Crawling {url} failed: {str(e)}")
+                        self.errors.append(e)
+        finally:
+            # Fetches still running stop at the deadline on their own.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _handle(self, requested_url, fetched):
+        self.bytes_fetched += fetched.size
+        if fetched.status_code >= 400:
+            raise CrawlError(f"{fetched.url} returned HTTP {fetched.status_code}")
+        if "html" not in fetched.content_type.lower():
+            return
+
+        url = normalize_url(fetched.url) or fetched.url
+        if url != requested_url:
+            # Redirected; skip it if the target was already queued.
+            if url in self.seen:
+                return
+            self.seen.add(url)
+        if site_of(url) != self.site or len(self.pages) >= self.max_pages:
+            return
+
+        if fetched.text:
+            self.pages.append(Page(url, fetched.title, fetched.text, fetched.size, fetched.etag,
+                                   fetched.last_modified, fetched.content_hash))
+        for link in fetched.links:
+            self._enqueue(normalize_url(link, url))
+
+    def _enqueue(self, url):
+        if (url is None or url in self.seen or site_of(url) != self.site
+                or urlsplit(url).path.lower().endswith(SKIP_EXTENSIONS) or not self._allowed(url)):
+            return
+        self.seen.add(url)
+        self.frontier.append(url)
+
+    def _allowed(self, url):
+        return self.robots.can_fetch(CRAWL_USER_AGENT, url)
+
+    def _load_robots(self):
+        robots = RobotFileParser()
+        parts = urlsplit(self.start_url)
+        try:
+            fetched = fetch_page(f"{parts.scheme}://{parts.netloc}/robots.txt", self.deadline,
+                                 self.page_max_bytes, self.session)
+        except (requests.RequestException, CrawlTimeout) as e:
+            logger.debug(f"No robots.txt for {self.site}: {str(e)}")
+            robots.allow_all = True
+            return robots
+        # Same reading of status codes as RobotFileParser.read()
+        if fetched.status_code in (401, 403):
+            robots.disallow_all = True
+        elif fetched.status_code >= 400:
+            robots.allow_all = True
+        else:
+            robots.parse(fetched.body.decode(fetched.encoding or "utf-8", "replace").splitlines())
+        return robots
+
+    def _sitemap_urls(self):
+        parts = urlsplit(self.start_url)
+        pending = deque(self.robots.site_maps() or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"])
+        visited = set()
+        urls = []
+        while pending and len(visited) < MAX_SITEMAPS and len(urls) < self.max_pages:
+            sitemap_url = normalize_url(pending.popleft(), self.start_url)
+            if sitemap_url is None or sitemap_url in visited:
+                continue
+            if site_of(sitemap_url) != self.site:
+                # robots.txt and sitemap indexes are the site's to write; they
+                # must not point the crawler at other hosts
+                logger.debug(f"Skipping sitemap {sitemap_url}: not on {self.site}")
+                continue
+            visited.add(sitemap_url)
+            try:
+                fetched = fetch_page(sitemap_url, self.deadline, self.page_max_bytes, self.session)
+                if fetched.status_code >= 400 or site_of(normalize_url(fetched.url) or fetched.url) != self.site:
+                    continue
+                root = ElementTree.fromstring(fetched.body)
+            except (requests.RequestException, CrawlTimeout, ElementTree.ParseError) as e:
+                logger.debug(f"Skipping sitemap {sitemap_url}: {str(e)}")
+                continue
+
+            locations = [loc.text.strip() for loc in root.iter("{*}loc") if loc.text]
+            if root.tag.endswith("sitemapindex"):
+                pending.extend(locations)
+            else:
+                urls.extend(normalize_url(loc) for loc in locations)
+        return urls[:self.max_pages]
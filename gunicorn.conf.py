@@ -0,0 +1,11 @@
+"""Gunicorn settings, read automatically when gunicorn is started from this directory."""
+import os
+
+
+def child_exit(server, worker):
+    # Drop an exited worker's gauges from /metrics (see metrics.py); its
+    # counter and histogram files stay so totals never go backwards.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,233 @@
+"""Streaming HTML to text extraction.
+
+HTMLTextExtractor is fed the raw body chunk by chunk as it arrives, and
+returns text blocks as soon as they are complete. No document tree is built
+and the body is never held in memory as a whole. Reading stops at
+``max_bytes``. lxml's parser is used when it is installed. Otherwise the
+stdlib html.parser is used. Both drive the same callbacks.
+
+script/style/nav/header/footer and similar boilerplate are skipped. So are
+blocks made almost entirely of link text, such as menus and "related pages"
+lists. Links are still collected everywhere so the crawler can follow them.
+"""
+import codecs
+import hashlib
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # optional, html.parser is used instead
+    etree = None
+
+SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "nav", "header", "footer", "aside", "form", "select", "button",
+})
+BLOCK_TAGS = frozenset({
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "dt", "dd", "td", "th", "tr",
+    "blockquote", "pre", "div", "section", "article", "main", "figcaption", "caption",
+    "address", "table", "ul", "ol", "dl", "br", "hr", "body",
+})
+# Blocks whose text is more than this share of link text are menus, not content.
+MAX_LINK_DENSITY = 0.8
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+
+
+def sniff_encoding(first_chunk, declared=None):
+    """Return the declared charset, else a <meta charset> in the first chunk, else utf-8."""
+    for candidate in (declared, _meta_charset(first_chunk)):
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                pass
+    return "utf-8"
+
+
+def _meta_charset(chunk):
+    match = _META_CHARSET.search(chunk[:4096])
+    return match.group(1).decode("ascii") if match else None
+
+
+class _BlockCollector:
+    """Parser target: turns start/end/data callbacks into text blocks."""
+
+    def __init__(self):
+        self.blocks = []
+        self.links = []
+        self._title_parts = []
+        self._parts = []
+        self._link_chars = 0
+        self._skip_depth = 0
+        self._link_depth = 0
+        self._in_title = False
+
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        if tag == "a":
+            href = attrib.get("href")
+            if href:
+                self.links.append(href)
+            self._link_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag == "a":
+            self._link_depth = max(0, self._link_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def data(self, text):
+        if self._in_title:
+            if len(self._title_parts) < 100:
+                self._title_parts.append(text)
+        elif not self._skip_depth:
+            self._parts.append(text)
+            if self._link_depth:
+                self._link_chars += len(text.strip())
+
+    def comment(self, text):
+        pass
+
+    @property
+    def title(self):
+        return " ".join("".join(self._title_parts).split())[:255]
+
+    def close(self):
+        self._flush()
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = " ".join("".join(self._parts).split())
+        if text and self._link_chars <= MAX_LINK_DENSITY * len(text):
+            self.blocks.append(text)
+        self._parts = []
+        self._link_chars = 0
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def close(self):
+        super().close()
+        self.target.close()
+
+
+class HTMLTextExtractor:
+    """Incremental, size-capped HTML text extractor.
+
+    Call feed() with raw byte chunks; each call returns the text blocks that
+    were completed by that chunk, and close() returns the rest. After close(),
+    ``title``, ``links``, ``bytes_read`` and ``content_hash`` (SHA-256 of the
+    bytes that were read) describe the page. ``truncated`` is set when the
+    body was cut off at ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024, encoding=None, use_lxml=None):
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+        self.use_lxml = etree is not None if use_lxml is None else use_lxml
+        self._declared_encoding = encoding
+        self._decoder = None
+        self._hash = hashlib.sha256()
+        self._collector = _BlockCollector()
+        if self.use_lxml:
+            self._parser = etree.HTMLParser(target=self._collector, recover=True, no_network=True)
+        else:
+            self._parser = _StdlibParser(self._collector)
+
+    @property
+    def title(self):
+        return self._collector.title
+
+    @property
+    def links(self):
+        return self._collector.links
+
+    @property
+    def content_hash(self):
+        return self._hash.hexdigest()
+
+    def feed(self, chunk):
+        if self.truncated or not chunk:
+            return []
+        remaining = self.max_bytes - self.bytes_read
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            self.truncated = True
+        self.bytes_read += len(chunk)
+        self._hash.update(chunk)
+
+        if self._decoder is None:
+            encoding = sniff_encoding(chunk, self._declared_encoding)
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        text = self._decoder.decode(chunk, final=self.truncated)
+        if text:
+            self._parser.feed(text)
+        return self._drain()
+
+    def close(self):
+        if self._decoder is not None:
+            tail = self._decoder.decode(b"", final=True)
+            if tail:
+                self._parser.feed(tail)
+            if self.truncated and not self.use_lxml:
+                # html.parser would emit a tag cut off at the cap as text.
+                self._collector.close()
+                return self._drain()
+            try:
+                self._parser.close()
+            except Exception:
+                # lxml raises on a document it could not make sense of at all.
+                self._collector.close()
+        return self._drain()
+
+    def iter_blocks(self, chunks):
+        """Feed ``chunks`` and yield text blocks until the input or the byte cap ends."""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+            if self.truncated:
+                break
+        yield from self.close()
+
+    def _drain(self):
+        blocks, self._collector.blocks = self._collector.blocks, []
+        return blocks
+
+
+def extract_text(html, max_bytes=1024 * 1024, encoding=None):
+    """Return (title, text, links) for a complete HTML document (str or bytes)."""
+    if isinstance(html, str):
+        html, encoding = html.encode("utf-8"), "utf-8"
+    extractor = HTMLTextExtractor(max_bytes=max_bytes, encoding=encoding)
+    blocks = list(extractor.iter_blocks([html]))
+    return extractor.title, "\n".join(blocks), extractor.links
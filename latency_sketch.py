@@ -0,0 +1,64 @@
+"""Mergeable latency quantile sketch.
+
+Response times are counted in logarithmic bins: bin ``i`` holds values in
+(GAMMA**(i-1), GAMMA**i], and every value in a bin is reported as the bin's
+midpoint, which is within RELATIVE_ACCURACY of it. Two sketches merge by
+adding their bin counts. That is what makes them storable per API key,
+endpoint and hour as plain (bin, count) rows that SQL can sum across keys,
+endpoints and days without going back to the raw rows. Quantiles estimated
+this way are within RELATIVE_ACCURACY of the exact order statistic.
+"""
+import math
+from collections import Counter
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+MIN_VALUE = 1e-6
+# Values at or below MIN_VALUE (including 0) share one bin reported as 0.
+ZERO_BIN = -1000000
+
+_LOG_GAMMA = math.log(GAMMA)
+
+
+def bin_for(value):
+    if value <= MIN_VALUE:
+        return ZERO_BIN
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def bin_value(index):
+    if index == ZERO_BIN:
+        return 0.0
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class LatencySketch:
+    def __init__(self, bins=None):
+        self.bins = Counter(bins or {})
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def add(self, value, count=1):
+        self.bins[bin_for(value)] += count
+
+    def merge(self, other):
+        self.bins.update(other.bins)
+        return self
+
+    def quantile(self, q):
+        """Estimate of the value at rank floor(q * (count - 1)), or None if empty."""
+        total = self.count
+        if not total:
+            return None
+        rank = math.floor(q * (total - 1))
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        return {f"p{round(q * 100):d}": self.quantile(q) for q in qs}
@@ -0,0 +1,321 @@
+"""LLM backends, routed by APIKey.llm.
+
+Each provider owns long-lived, connection-pooled HTTP clients (one sync, one
+async) so requests reuse warm connections instead of paying a TLS handshake
+per call. Together AI is reached through its OpenAI-compatible endpoint,
+which lets both hosted backends share one implementation.
+
+LLM_PROVIDER_OVERRIDE=stub routes every key to the deterministic local stub,
+so load tests and CI can drive /chat at full speed without the network.
+
+get_provider() hands out providers wrapped in InstrumentedProvider, which
+records each call's latency and failures in metrics.py.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from metrics import LLM_ERRORS, LLM_FIRST_TOKEN, LLM_REQUEST_DURATION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_PROVIDER = os.getenv("DEFAULT_LLM_PROVIDER", "openai")
+LLM_PROVIDER_OVERRIDE = os.getenv("LLM_PROVIDER_OVERRIDE")
+
+
+class LLMProvider(ABC):
+    """A chat backend. Subclasses that leave a method out cannot be instantiated."""
+
+    name = None
+
+    @abstractmethod
+    def stream_chat(self, messages, max_tokens=50, temperature=0.7):
+        """Yield the text deltas of a streamed chat completion."""
+
+    @abstractmethod
+    def complete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        """Return the text of a non-streamed chat completion."""
+
+    @abstractmethod
+    def astream_chat(self, messages, max_tokens=50, temperature=0.7):
+        """Async generator of the text deltas of a streamed chat completion."""
+
+    @abstractmethod
+    async def acomplete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        """Return the text of a non-streamed chat completion."""
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    def __init__(self, name, api_key, base_url=None, chat_model="gpt-3.5-turbo",
+                 completion_model="gpt-4o-mini", timeout=30.0, connect_timeout=5.0,
+                 max_connections=100, async_max_connections=5000, max_retries=2):
+        self.name = name
+        self.chat_model = chat_model
+        self.completion_model = completion_model
+        self._api_key = api_key
+        self._base_url = base_url
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._max_retries = max_retries
+        self._async_max_connections = async_max_connections
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self._timeout,
+            max_retries=max_retries,
+            http_client=DefaultHttpxClient(
+                timeout=self._timeout,
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections),
+            ),
+        )
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        # Created on first use so it binds to the serving event loop (asgi.py).
+        # Every open chat stream holds a connection, so the pool is sized for
+        # the number of streams a worker should carry.
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                timeout=self._timeout,
+                max_retries=self._max_retries,
+                http_client=DefaultAsyncHttpxClient(
+                    timeout=self._timeout,
+                    limits=httpx.Limits(max_connections=self._async_max_connections,
+                                        max_keepalive_connections=self._async_max_connections // 10),
+                ),
+            )
+        return self._async_client
+
+    def stream_chat(self, messages, max_tokens=50, temperature=0.7):
+        response = self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def complete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        client = self.client.with_options(timeout=timeout) if timeout else self.client
+        response = client.chat.completions.create(
+            model=self.completion_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            n=1,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content or ""
+
+    async def astream_chat(self, messages, max_tokens=50, temperature=0.7):
+        response = await self.async_client.chat.completions.create(
+            model=self.chat_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def acomplete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        client = self.async_client.with_options(timeout=timeout) if timeout else self.async_client
+        response = await client.chat.completions.create(
+            model=self.completion_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            n=1,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content or ""
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+class StubProvider(LLMProvider):
+    """Deterministic local backend: no network, same input gives the same reply."""
+
+    name = "stub"
+    FILLER = ("Thanks for your question! Here is a short answer from the test "
+              "backend so the chat pipeline can be exercised end to end.").split()
+
+    def __init__(self, token_delay=0.0):
+        self.token_delay = token_delay
+
+    def _reply_tokens(self, messages, max_tokens):
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = f"You asked: {question}".split() + self.FILLER
+        return [word if i == 0 else " " + word for i, word in enumerate(words[:max_tokens])]
+
+    def stream_chat(self, messages, max_tokens=50, temperature=0.7):
+        for token in self._reply_tokens(messages, max_tokens):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+    def complete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        return "1. What do you sell?\n2. Do you ship abroad?\n3. How do returns work?"
+
+    async def astream_chat(self, messages, max_tokens=50, temperature=0.7):
+        for token in self._reply_tokens(messages, max_tokens):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+    async def acomplete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        return self.complete(messages, max_tokens, temperature, timeout)
+
+
+class InstrumentedProvider(LLMProvider):
+    """Times another provider's calls and counts its failures.
+
+    A stream that the caller abandons (the visitor closed the widget) is
+    timed up to that point and is not counted as a failure.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+
+    def stream_chat(self, messages, max_tokens=50, temperature=0.7):
+        start = time.perf_counter()
+        first = True
+        try:
+            for delta in self.provider.stream_chat(messages, max_tokens, temperature):
+                if first:
+                    LLM_FIRST_TOKEN.labels(self.name).observe(time.perf_counter() - start)
+                    first = False
+                yield delta
+        except Exception:
+            LLM_ERRORS.labels(self.name, "stream").inc()
+            raise
+        finally:
+            LLM_REQUEST_DURATION.labels(self.name, "stream").observe(time.perf_counter() - start)
+
+    def complete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        start = time.perf_counter()
+        try:
+            return self.provider.complete(messages, max_tokens, temperature, timeout)
+        except Exception:
+            LLM_ERRORS.labels(self.name, "complete").inc()
+            raise
+        finally:
+            LLM_REQUEST_DURATION.labels(self.name, "complete").observe(time.perf_counter() - start)
+
+    async def astream_chat(self, messages, max_tokens=50, temperature=0.7):
+        start = time.perf_counter()
+        first = True
+        try:
+            async for delta in self.provider.astream_chat(messages, max_tokens, temperature):
+                if first:
+                    LLM_FIRST_TOKEN.labels(self.name).observe(time.perf_counter() - start)
+                    first = False
+                yield delta
+        except Exception:
+            LLM_ERRORS.labels(self.name, "stream").inc()
+            raise
+        finally:
+            LLM_REQUEST_DURATION.labels(self.name, "stream").observe(time.perf_counter() - start)
+
+    async def acomplete(self, messages, max_tokens=50, temperature=0.7, timeout=None):
+        start = time.perf_counter()
+        try:
+            return await self.provider.acomplete(messages, max_tokens, temperature, timeout)
+        except Exception:
+            LLM_ERRORS.labels(self.name, "complete").inc()
+            raise
+        finally:
+            LLM_REQUEST_DURATION.labels(self.name, "complete").observe(time.perf_counter() - start)
+
+    def close(self):
+        self.provider.close()
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+def _build_provider(name):
+    if name == "stub":
+        return StubProvider(token_delay=float(os.getenv("STUB_LLM_TOKEN_DELAY", "0")))
+    if name == "openai":
+        return OpenAICompatibleProvider(
+            "openai",
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            chat_model=os.getenv("OPENAI_CHAT_MODEL", "gpt-3.5-turbo"),
+            completion_model=os.getenv("OPENAI_COMPLETION_MODEL", "gpt-4o-mini"),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            async_max_connections=int(os.getenv("ASYNC_LLM_MAX_CONNECTIONS", "5000")),
+        )
+    if name == "together":
+        api_key = os.getenv("TOGETHER_API_KEY")
+        if not api_key:
+            return None
+        return OpenAICompatibleProvider(
+            "together",
+            api_key=api_key,
+            base_url=os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1"),
+            chat_model=os.getenv("TOGETHER_CHAT_MODEL", "meta-llama/Llama-3.3-70B-Instruct-Turbo"),
+            completion_model=os.getenv("TOGETHER_COMPLETION_MODEL", "meta-llama/Llama-3.3-70B-Instruct-Turbo"),
+            timeout=float(os.getenv("TOGETHER_TIMEOUT", "30")),
+            max_connections=int(os.getenv("TOGETHER_MAX_CONNECTIONS", "100")),
+            async_max_connections=int(os.getenv("ASYNC_LLM_MAX_CONNECTIONS", "5000")),
+        )
+    return None
+
+
+def _create_provider(name):
+    provider = _build_provider(name)
+    return InstrumentedProvider(provider) if provider is not None else None
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(llm=None):
+    """Return the provider for an APIKey.llm value, falling back to the default."""
+    name = (LLM_PROVIDER_OVERRIDE or llm or DEFAULT_LLM_PROVIDER).lower()
+    provider = _providers.get(name)
+    if provider is not None:
+        return provider
+
+    with _providers_lock:
+        if name not in _providers:
+            provider = _create_provider(name)
+            if provider is None:
+                logger.warning(f"LLM provider '{name}' is not available, using '{DEFAULT_LLM_PROVIDER}'")
+                provider = _providers.get(DEFAULT_LLM_PROVIDER) or _create_provider(DEFAULT_LLM_PROVIDER)
+                _providers.setdefault(DEFAULT_LLM_PROVIDER, provider)
+            _providers[name] = provider
+        return _providers[name]
+
+
+async def close_providers_async():
+    for provider in set(_providers.values()):
+        await provider.aclose()
@@ -0,0 +1,271 @@
+"""AI model marketplace listings: keyset pages, field selection and ETags.
+
+Models are listed in id order and a model's reviews newest first, one page
+at a time, keyset-paginated on id like the analytics entries. ``fields``
+picks the model attributes to return, and only the columns those need are
+loaded.
+
+Every response carries an ETag built from the "ai_models" VersionCounter.
+Any flush that adds, changes or deletes an AIModel or ModelReview bumps that
+counter. A client revalidating with If-None-Match costs one primary key
+lookup and gets a 304 without anything being queried or serialized. Writes
+that bypass the ORM session (bulk Core inserts, raw SQL) must call
+bump_catalog_version() themselves.
+
+search_model_ids() ranks models by name, provider and description. The
+index lives in the database and is kept current by the database itself:
+  - SQLite: the ai_model_fts FTS5 table, external content over ai_model,
+    maintained by insert/update/delete triggers and ranked with bm25();
+  - PostgreSQL: the generated ai_model.search_vector tsvector column with a
+    GIN index, ranked with ts_rank_cd().
+Other databases fall back to unranked LIKE matching. The migration builds
+the index for existing rows; db.create_all() builds it with the table.
+
+Ranking costs time in proportion to the number of matches. Broad queries
+therefore keep their first SEARCH_CACHE_DEPTH ranked ids in a per-process
+cache. The key includes the catalog version, so any change to the catalog
+makes the cached rankings unreachable.
+"""
+import re
+
+from flask import Response, request
+from sqlalchemy import event, or_, text
+from sqlalchemy.orm import Session, load_only
+
+from caches import TTLCache
+from extensions import db
+
+CATALOG = "ai_models"
+MAX_PAGE_SIZE = 200
+
+# Field -> columns it is computed from
+MODEL_FIELDS = {
+    "id": ("id",),
+    "name": ("name",),
+    "description": ("description",),
+    "provider": ("provider",),
+    "api_endpoint": ("api_endpoint",),
+    "documentation_url": ("documentation_url",),
+    "created_at": ("created_at",),
+    "average_rating": ("rating_sum", "rating_count"),
+    "rating_count": ("rating_count",),
+}
+DEFAULT_MODEL_FIELDS = ("id", "name", "description", "provider", "documentation_url", "average_rating", "rating_count")
+
+MAX_SEARCH_TERMS = 8
+SEARCH_CACHE_DEPTH = 1000
+# Underscores split words, as in the FTS5 and tsvector tokenizers
+_SEARCH_TERM = re.compile(r"[^\W_]+")
+
+# (catalog version, terms) -> ranked ids, at most SEARCH_CACHE_DEPTH + 1
+_search_results = TTLCache(maxsize=512, ttl=600, name="marketplace_search")
+
+# Kept in step with migration f2b8d5c1a974
+SEARCH_INDEX_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE ai_model_fts USING fts5(name, description, provider, "
+        "content='ai_model', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER ai_model_fts_insert AFTER INSERT ON ai_model BEGIN "
+        "INSERT INTO ai_model_fts(rowid, name, description, provider) "
+        "VALUES (new.id, new.name, new.description, new.provider); END",
+        "CREATE TRIGGER ai_model_fts_delete AFTER DELETE ON ai_model BEGIN "
+        "INSERT INTO ai_model_fts(ai_model_fts, rowid, name, description, provider) "
+        "VALUES ('delete', old.id, old.name, old.description, old.provider); END",
+        # Only the indexed columns, so rating updates leave the index alone
+        "CREATE TRIGGER ai_model_fts_update AFTER UPDATE OF name, description, provider ON ai_model BEGIN "
+        "INSERT INTO ai_model_fts(ai_model_fts, rowid, name, description, provider) "
+        "VALUES ('delete', old.id, old.name, old.description, old.provider); "
+        "INSERT INTO ai_model_fts(rowid, name, description, provider) "
+        "VALUES (new.id, new.name, new.description, new.provider); END",
+    ],
+    "postgresql": [
+        "ALTER TABLE ai_model ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', name), 'A') || "
+        "setweight(to_tsvector('english', provider), 'B') || "
+        "setweight(to_tsvector('english', description), 'C')) STORED",
+        "CREATE INDEX ix_ai_model_search_vector ON ai_model USING gin (search_vector)",
+    ],
+}
+# Search index objects that are not in the models, hidden from autogenerate.
+# FTS5 keeps its data in ai_model_fts_data, ai_model_fts_idx and so on.
+_SEARCH_INDEX_OBJECTS = re.compile(r"ai_model_fts(_\w+)?|search_vector|ix_ai_model_search_vector")
+
+
+def catalog_version():
+    from models import VersionCounter
+
+    return db.session.query(VersionCounter.value).filter_by(name=CATALOG).scalar() or 0
+
+
+def bump_catalog_version(connection):
+    from models import VersionCounter
+
+    table = VersionCounter.__table__
+    updated = connection.execute(
+        table.update().where(table.c.name == CATALOG).values(value=table.c.value + 1)
+    ).rowcount
+    if not updated:
+        connection.execute(table.insert().values(name=CATALOG, value=1))
+
+
+def parse_fields(raw):
+    """Requested model fields from a comma-separated ``fields`` argument; id is always included."""
+    if not raw:
+        return DEFAULT_MODEL_FIELDS
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in MODEL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(MODEL_FIELDS)}")
+    return ("id",) + tuple(field for field in dict.fromkeys(fields) if field != "id")
+
+
+def _model_columns(fields):
+    from models import AIModel
+
+    names = dict.fromkeys(column for field in fields for column in MODEL_FIELDS[field])
+    return load_only(*(getattr(AIModel, name) for name in names))
+
+
+def model_page(after_id=None, limit=50, fields=DEFAULT_MODEL_FIELDS):
+    """(models, next_after_id) for one page in id order; next_after_id is None on the last page."""
+    from models import AIModel
+
+    query = AIModel.query.options(_model_columns(fields))
+    if after_id is not None:
+        query = query.filter(AIModel.id > after_id)
+    models = query.order_by(AIModel.id).limit(limit + 1).all()
+    if len(models) > limit:
+        return models[:limit], models[limit - 1].id
+    return models, None
+
+
+def review_page(model_id, before_id=None, limit=50):
+    """(reviews, next_before_id) for one page of a model's reviews, newest first."""
+    from models import ModelReview
+
+    query = ModelReview.query.filter(ModelReview.model_id == model_id)
+    if before_id is not None:
+        query = query.filter(ModelReview.id < before_id)
+    reviews = query.order_by(ModelReview.id.desc()).limit(limit + 1).all()
+    if len(reviews) > limit:
+        return reviews[:limit], reviews[limit - 1].id
+    return reviews, None
+
+
+def search_terms(raw):
+    """Words of a search query, lowercased; punctuation and query syntax are dropped."""
+    return _SEARCH_TERM.findall((raw or "").lower())[:MAX_SEARCH_TERMS]
+
+
+def search_model_ids(terms, limit=20, offset=0):
+    """Ids of the models matching every term, best match first.
+
+    The last term also matches as a prefix, so results follow what is being
+    typed. Name matches rank above provider matches, which rank above
+    description matches.
+    """
+    from models import AIModel
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        rows = db.session.execute(text(
+            "SELECT rowid FROM ai_model_fts WHERE ai_model_fts MATCH :match "
+            "ORDER BY bm25(ai_model_fts, 10.0, 1.0, 5.0), rowid LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset})
+    elif dialect == "postgresql":
+        query = " & ".join(f"'{term}'" for term in terms) + ":*"
+        rows = db.session.execute(text(
+            "SELECT id FROM ai_model, to_tsquery('english', :query) query WHERE search_vector @@ query "
+            "ORDER BY ts_rank_cd(search_vector, query) DESC, id LIMIT :limit OFFSET :offset"
+        ), {"query": query, "limit": limit, "offset": offset})
+    else:
+        columns = (AIModel.name, AIModel.provider, AIModel.description)
+        rows = (db.session.query(AIModel.id)
+                .filter(*(or_(*(column.ilike(f"%{term}%") for column in columns)) for term in terms))
+                .order_by(AIModel.id).limit(limit).offset(offset))
+    return [row[0] for row in rows]
+
+
+def search_page(raw, offset=0, limit=20, fields=DEFAULT_MODEL_FIELDS, version=None):
+    """(models, next_offset) for one page of search results; next_offset is None on the last page."""
+    from models import AIModel
+
+    terms = search_terms(raw)
+    if not terms:
+        return [], None
+    if offset + limit < SEARCH_CACHE_DEPTH:
+        key = (catalog_version() if version is None else version, tuple(terms))
+        ranked = _search_results.get(key)
+        if ranked is None:
+            ranked = search_model_ids(terms, SEARCH_CACHE_DEPTH + 1)
+            _search_results.set(key, ranked)
+        ids = ranked[offset:offset + limit + 1]
+    else:
+        ids = search_model_ids(terms, limit + 1, offset)
+    next_offset = offset + limit if len(ids) > limit else None
+    ids = ids[:limit]
+    models = {model.id: model for model in AIModel.query.options(_model_columns(fields)).filter(AIModel.id.in_(ids))}
+    return [models[model_id] for model_id in ids if model_id in models], next_offset
+
+
+def model_dict(model, fields=DEFAULT_MODEL_FIELDS):
+    values = {}
+    for field in fields:
+        value = getattr(model, field)
+        values[field] = value.isoformat() if field == "created_at" and value is not None else value
+    return values
+
+
+def review_dict(review):
+    return {
+        "id": review.id,
+        "user_id": review.user_id,
+        "rating": review.rating,
+        "review_text": review.review_text,
+        "created_at": review.created_at.isoformat() if review.created_at else None,
+    }
+
+
+def page_limit(name="limit", default=50):
+    return min(max(request.args.get(name, default, type=int), 1), MAX_PAGE_SIZE)
+
+
+def conditional_response(etag, build):
+    """Answer If-None-Match for ``etag`` with a 304 before calling ``build()`` for the body."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    # Cacheable, but revalidated on every use
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _bump_on_catalog_change(session, flush_context):
+    from models import AIModel, ModelReview
+
+    for objects in (session.new, session.dirty, session.deleted):
+        if any(isinstance(obj, (AIModel, ModelReview)) for obj in objects):
+            bump_catalog_version(session.connection())
+            return
+
+
+def _create_search_index(table, connection, **kw):
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, ()):
+        connection.execute(text(statement))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic autogenerate filter: leave the search index alone."""
+    return not (reflected and compare_to is None and _SEARCH_INDEX_OBJECTS.fullmatch(name or ""))
+
+
+def init_app(app):
+    from models import AIModel
+
+    if not event.contains(Session, "after_flush", _bump_on_catalog_change):
+        event.listen(Session, "after_flush", _bump_on_catalog_change)
+    if not event.contains(AIModel.__table__, "after_create", _create_search_index):
+        event.listen(AIModel.__table__, "after_create", _create_search_index)
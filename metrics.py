@@ -0,0 +1,103 @@
+"""Prometheus metrics, aggregated across worker processes.
+
+The series are prometheus_client metrics; generate_latest() renders them in
+the text exposition format, which /metrics serves.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory that is
+cleared when the service is deployed. It must be in the environment before
+prometheus_client is imported, i.e. when gunicorn starts. Every worker then
+writes its values to memory-mapped files there, and a scrape, whichever
+worker serves it, sums them with prometheus_client's MultiProcessCollector:
+  - counters and histograms include workers that have exited, so their
+    totals never go backwards when gunicorn recycles a worker;
+  - gauges only include live workers: gunicorn.conf.py's child_exit hook
+    removes an exited worker's gauge files.
+Without it, values live in process memory and /metrics only reports the
+worker that served it, which is right for a single process.
+"""
+import os
+import time
+
+from flask import g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client import generate_latest as _generate_latest
+from sqlalchemy import event
+
+from extensions import db
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def init_app(app):
+    """Count every request to ``app``."""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        # The rule, not the path, so /api/faq?api_key=... is one series
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            HTTP_REQUEST_DURATION.labels(route, request.method).observe(time.perf_counter() - started)
+        return response
+
+    with app.app_context():
+        watch_pool(db.engine.pool)
+
+
+def watch_pool(pool):
+    """Track ``pool``'s checked-out connections and capacity in the DB_POOL gauges."""
+    counted_in = []  # pids that have added this pool's capacity
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        if os.getpid() not in counted_in:
+            counted_in.append(os.getpid())
+            size = pool.size() if hasattr(pool, "size") else 0
+            DB_POOL_SIZE.inc(size + max(getattr(pool, "_max_overflow", 0), 0))
+        DB_POOL_CHECKED_OUT.inc()
+
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+
+def generate_latest():
+    if not MULTIPROC_DIR:
+        return _generate_latest()
+    # A fresh registry per scrape, as prometheus_client requires in multiprocess mode
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return _generate_latest(registry)
+
+
+HTTP_REQUESTS = Counter("http_requests", "HTTP requests by route, method and status.",
+                        ("route", "method", "status"))
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds",
+                                  "Time to produce the response, not counting a streamed body.",
+                                  ("route", "method"), buckets=DEFAULT_BUCKETS)
+SSE_STREAMS_IN_FLIGHT = Gauge("sse_streams_in_flight", "Chat event streams currently open.", ("endpoint",),
+                              multiprocess_mode="livesum")
+LLM_REQUEST_DURATION = Histogram("llm_request_duration_seconds",
+                                 "LLM call latency; for streams, until the last delta.", ("provider", "call"),
+                                 buckets=DEFAULT_BUCKETS)
+LLM_FIRST_TOKEN = Histogram("llm_first_token_seconds", "LLM stream latency to the first delta.", ("provider",),
+                            buckets=DEFAULT_BUCKETS)
+LLM_ERRORS = Counter("llm_errors", "Failed LLM calls.", ("provider", "call"))
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Database connections checked out of the pool.",
+                            multiprocess_mode="livesum")
+DB_POOL_SIZE = Gauge("db_pool_size", "Database connections the pools may hold, pool size plus overflow.",
+                     multiprocess_mode="livesum")
+CACHE_REQUESTS = Counter("cache_requests", "In-process cache lookups by cache and result (hit or miss).",
+                         ("cache", "result"))
@@ -0,0 +1,40 @@
+"""add crawled_page and crawl_job.pages_crawled for multi-page crawls
+
+Revision ID: 5b8f2d4e6a17
+Revises: e41b9c6a2d75
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8f2d4e6a17'
+down_revision = 'e41b9c6a2d75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'crawled_page',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('api_key_id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.String(length=2048), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('api_key_id', 'url', name='uq_crawled_page_api_key_id_url'),
+    )
+    with op.batch_alter_table('crawl_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pages_crawled', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('crawl_job', schema=None) as batch_op:
+        batch_op.drop_column('pages_crawled')
+    op.drop_table('crawled_page')
@@ -0,0 +1,105 @@
+"""move conversation messages into an append-only conversation_message table
+
+Revision ID: 8a4d6e2f1c93
+Revises: 3f1c2a9d7b01
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6e2f1c93'
+down_revision = '3f1c2a9d7b01'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+conversation = sa.table(
+    'conversation',
+    sa.column('id', sa.Integer),
+    sa.column('messages', sa.JSON),
+    sa.column('created_at', sa.DateTime),
+)
+
+conversation_message = sa.table(
+    'conversation_message',
+    sa.column('conversation_id', sa.Integer),
+    sa.column('role', sa.String),
+    sa.column('content', sa.Text),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def upgrade():
+    op.create_table(
+        'conversation_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_conversation_message_conversation_id_id', 'conversation_message',
+                    ['conversation_id', 'id'], unique=False)
+    op.create_index('ix_conversation_api_key_id_updated_at', 'conversation',
+                    ['api_key_id', 'updated_at'], unique=False)
+
+    # Copy the JSON blobs over in id order so message ids preserve turn order.
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(conversation.c.id, conversation.c.messages, conversation.c.created_at)
+            .where(conversation.c.id > last_id)
+            .order_by(conversation.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        inserts = [
+            {
+                'conversation_id': row.id,
+                'role': message.get('role', 'user'),
+                'content': message.get('content') or '',
+                'created_at': row.created_at,
+            }
+            for row in rows
+            for message in (row.messages or [])
+        ]
+        if inserts:
+            bind.execute(conversation_message.insert(), inserts)
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('conversation', schema=None) as batch_op:
+        batch_op.alter_column('messages', existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    conversation_ids = [row.id for row in bind.execute(sa.select(conversation.c.id))]
+    for conversation_id in conversation_ids:
+        messages = [
+            {'role': row.role, 'content': row.content}
+            for row in bind.execute(
+                sa.select(conversation_message.c.role, conversation_message.c.content)
+                .where(conversation_message.c.conversation_id == conversation_id)
+                .order_by(sa.text('id'))
+            )
+        ]
+        bind.execute(
+            conversation.update()
+            .where(conversation.c.id == conversation_id)
+            .values(messages=messages)
+        )
+
+    with op.batch_alter_table('conversation', schema=None) as batch_op:
+        batch_op.alter_column('messages', existing_type=sa.JSON(), nullable=False)
+
+    op.drop_index('ix_conversation_api_key_id_updated_at', table_name='conversation')
+    op.drop_index('ix_conversation_message_conversation_id_id', table_name='conversation_message')
+    op.drop_table('conversation_message')
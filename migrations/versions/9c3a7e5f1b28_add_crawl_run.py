@@ -0,0 +1,54 @@
+"""add crawl_run and page validators for incremental re-crawls
+
+Revision ID: 9c3a7e5f1b28
+Revises: 5b8f2d4e6a17
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3a7e5f1b28'
+down_revision = '5b8f2d4e6a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('etag', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('last_modified', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('checked_at', sa.DateTime(), nullable=True))
+    # Pages crawled before this revision count as checked when they were fetched.
+    op.execute("UPDATE crawled_page SET checked_at = fetched_at")
+
+    op.create_table(
+        'crawl_run',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('api_key_id', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('pages_checked', sa.Integer(), nullable=False),
+        sa.Column('pages_not_modified', sa.Integer(), nullable=False),
+        sa.Column('pages_unchanged', sa.Integer(), nullable=False),
+        sa.Column('pages_changed', sa.Integer(), nullable=False),
+        sa.Column('pages_removed', sa.Integer(), nullable=False),
+        sa.Column('pages_failed', sa.Integer(), nullable=False),
+        sa.Column('reindexed', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_crawl_run_api_key_id', 'crawl_run', ['api_key_id'])
+
+
+def downgrade():
+    op.drop_index('ix_crawl_run_api_key_id', table_name='crawl_run')
+    op.drop_table('crawl_run')
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.drop_column('checked_at')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('last_modified')
+        batch_op.drop_column('etag')
@@ -0,0 +1,139 @@
+"""store crawled_page text as content blobs and share context_index by text hash
+
+Revision ID: a1d7f4b9e263
+Revises: f2b8d5c1a974
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+import hashlib
+import logging
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d7f4b9e263'
+down_revision = 'f2b8d5c1a974'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 200
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+crawled_page = sa.table(
+    'crawled_page',
+    sa.column('id', sa.Integer),
+    sa.column('text', sa.Text),
+    sa.column('text_hash', sa.String),
+)
+
+content_blob = sa.table(
+    'content_blob',
+    sa.column('hash', sa.String),
+    sa.column('codec', sa.String),
+    sa.column('data', sa.LargeBinary),
+    sa.column('size', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('text_hash', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    logical_bytes = stored_bytes = new_blobs = 0
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(crawled_page.c.id, crawled_page.c.text)
+            .where(crawled_page.c.id > last_id)
+            .order_by(crawled_page.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        digests = {}
+        for row in rows:
+            raw = (row.text or '').encode('utf-8')
+            digests[row.id] = (hashlib.sha256(raw).hexdigest(), raw)
+            logical_bytes += len(raw)
+        existing = {digest for digest, in bind.execute(
+            sa.select(content_blob.c.hash).where(content_blob.c.hash.in_({d for d, _ in digests.values()}))
+        )}
+        blobs = {}
+        for page_id, (digest, raw) in digests.items():
+            if digest not in existing and digest not in blobs:
+                data = zlib.compress(raw, 6)
+                stored_bytes += len(data)
+                blobs[digest] = {'hash': digest, 'codec': 'zlib', 'data': data, 'size': len(raw),
+                                 'created_at': datetime.utcnow()}
+            bind.execute(crawled_page.update().where(crawled_page.c.id == page_id).values(text_hash=digest))
+        if blobs:
+            bind.execute(content_blob.insert(), list(blobs.values()))
+            new_blobs += len(blobs)
+        last_id = rows[-1].id
+
+    logger.info(f"crawled_page: {logical_bytes:,} bytes of page text stored as "
+                f"{new_blobs} new blobs in {stored_bytes:,} bytes")
+
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.alter_column('text_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index('ix_crawled_page_text_hash', ['text_hash'], unique=False)
+        batch_op.create_foreign_key('fk_crawled_page_text_hash_content_blob', 'content_blob', ['text_hash'], ['hash'])
+        batch_op.drop_column('text')
+
+    # Indexes are rebuilt lazily, once per distinct text, on the first chat
+    # that needs one (retrieval._load_index).
+    op.drop_table('context_index')
+    op.create_table(
+        'context_index',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('text_hash', sa.String(length=64), nullable=False),
+        sa.Column('chunk_words', sa.Integer(), nullable=False),
+        sa.Column('chunk_overlap', sa.Integer(), nullable=False),
+        sa.Column('vocabulary', sa.JSON(), nullable=False),
+        sa.Column('idf', sa.JSON(), nullable=False),
+        sa.Column('matrix', sa.LargeBinary(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['text_hash'], ['content_blob.hash']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('text_hash'),
+    )
+
+
+def downgrade():
+    op.drop_table('context_index')
+    op.create_table(
+        'context_index',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('api_key_id', sa.Integer(), nullable=False),
+        sa.Column('chunks', sa.JSON(), nullable=False),
+        sa.Column('vocabulary', sa.JSON(), nullable=False),
+        sa.Column('idf', sa.JSON(), nullable=False),
+        sa.Column('matrix', sa.LargeBinary(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('api_key_id'),
+    )
+
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('text', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    hashes = [row.text_hash for row in bind.execute(sa.select(crawled_page.c.text_hash).distinct())]
+    for digest in hashes:
+        blob = bind.execute(sa.select(content_blob.c.data).where(content_blob.c.hash == digest)).one()
+        text = zlib.decompress(blob.data).decode('utf-8')
+        bind.execute(crawled_page.update().where(crawled_page.c.text_hash == digest).values(text=text))
+
+    with op.batch_alter_table('crawled_page', schema=None) as batch_op:
+        batch_op.alter_column('text', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_constraint('fk_crawled_page_text_hash_content_blob', type_='foreignkey')
+        batch_op.drop_index('ix_crawled_page_text_hash')
+        batch_op.drop_column('text_hash')
@@ -0,0 +1,101 @@
+"""add latency_sketch_bin for per-bucket latency percentiles
+
+Revision ID: a6d2e9f4c158
+Revises: f3a8c5d2b917
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import logging
+import math
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2e9f4c158'
+down_revision = 'f3a8c5d2b917'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Same binning as latency_sketch.py at the time of this revision.
+GAMMA = 1.02 / 0.98
+MIN_VALUE = 1e-6
+ZERO_BIN = -1000000
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+analytics = sa.table(
+    'analytics',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('api_key', sa.String),
+    sa.column('endpoint', sa.String),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('response_time', sa.Float),
+)
+
+latency_sketch_bin = sa.table(
+    'latency_sketch_bin',
+    sa.column('granularity', sa.String),
+    sa.column('user_id', sa.Integer),
+    sa.column('bucket_start', sa.DateTime),
+    sa.column('api_key', sa.String),
+    sa.column('endpoint', sa.String),
+    sa.column('bin', sa.Integer),
+    sa.column('samples', sa.Integer),
+)
+
+
+def upgrade():
+    op.create_table(
+        'latency_sketch_bin',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('api_key', sa.String(length=255), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('bin', sa.Integer(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint', 'bin',
+                            name='uq_latency_sketch_bin'),
+    )
+
+    # Backfill from the raw rows; from here on the recorder keeps them current.
+    bind = op.get_bind()
+    log_gamma = math.log(GAMMA)
+    counts = defaultdict(int)
+    read = 0
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(analytics)
+            .where(analytics.c.id > last_id, analytics.c.timestamp.isnot(None))
+            .order_by(analytics.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            index = ZERO_BIN if row.response_time <= MIN_VALUE else math.ceil(math.log(row.response_time) / log_gamma)
+            hour = row.timestamp.replace(minute=0, second=0, microsecond=0)
+            for granularity, start in (('hour', hour), ('day', hour.replace(hour=0))):
+                counts[(granularity, row.user_id, start, row.api_key, row.endpoint, index)] += 1
+        read += len(rows)
+        last_id = rows[-1].id
+
+    keys = ('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint', 'bin')
+    bins = [dict(zip(keys, key), samples=samples) for key, samples in counts.items()]
+    for offset in range(0, len(bins), BATCH_SIZE):
+        bind.execute(latency_sketch_bin.insert(), bins[offset:offset + BATCH_SIZE])
+    logger.info(f"latency_sketch_bin: {read:,} analytics rows counted into {len(bins):,} bins")
+
+
+def downgrade():
+    op.drop_table('latency_sketch_bin')
@@ -0,0 +1,62 @@
+"""add rating_count and rating_sum to ai_model
+
+Revision ID: b3f9d6a1e827
+Revises: e5c2a8f7b431
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f9d6a1e827'
+down_revision = 'e5c2a8f7b431'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+ai_model = sa.table(
+    'ai_model',
+    sa.column('id', sa.Integer),
+    sa.column('rating_count', sa.Integer),
+    sa.column('rating_sum', sa.Integer),
+)
+
+model_review = sa.table(
+    'model_review',
+    sa.column('model_id', sa.Integer),
+    sa.column('rating', sa.Integer),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('ai_model', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_model_review_model_id', 'model_review', ['model_id'])
+
+    # Backfill in one grouped pass over the reviews, served by the index above;
+    # from here on add_model_review keeps them current.
+    reviews = (sa.select(model_review.c.model_id,
+                         sa.func.count().label('rating_count'),
+                         sa.func.sum(model_review.c.rating).label('rating_sum'))
+               .group_by(model_review.c.model_id)
+               .subquery())
+    bind = op.get_bind()
+    updated = bind.execute(
+        ai_model.update()
+        .where(ai_model.c.id == reviews.c.model_id)
+        .values(rating_count=reviews.c.rating_count, rating_sum=reviews.c.rating_sum)
+    ).rowcount
+    logger.info(f"ai_model: rating aggregates backfilled for {updated:,} models")
+
+
+def downgrade():
+    op.drop_index('ix_model_review_model_id', table_name='model_review')
+    with op.batch_alter_table('ai_model', schema=None) as batch_op:
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
@@ -0,0 +1,114 @@
+"""store api_key.extracted_text once per content hash, zlib-compressed
+
+Revision ID: b7e4d1a9c362
+Revises: 9c3a7e5f1b28
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+import hashlib
+import logging
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d1a9c362'
+down_revision = '9c3a7e5f1b28'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 200
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+api_key = sa.table(
+    'api_key',
+    sa.column('id', sa.Integer),
+    sa.column('extracted_text', sa.Text),
+    sa.column('text_hash', sa.String),
+)
+
+content_blob = sa.table(
+    'content_blob',
+    sa.column('hash', sa.String),
+    sa.column('codec', sa.String),
+    sa.column('data', sa.LargeBinary),
+    sa.column('size', sa.Integer),
+    sa.column('created_at', sa.DateTime),
+)
+
+
+def upgrade():
+    op.create_table(
+        'content_blob',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('codec', sa.String(length=16), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('text_hash', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    stored = set()
+    logical_bytes = stored_bytes = 0
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(api_key.c.id, api_key.c.extracted_text)
+            .where(api_key.c.id > last_id)
+            .order_by(api_key.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        blobs = []
+        for row in rows:
+            if not row.extracted_text:
+                continue
+            raw = row.extracted_text.encode('utf-8')
+            digest = hashlib.sha256(raw).hexdigest()
+            logical_bytes += len(raw)
+            if digest not in stored:
+                stored.add(digest)
+                data = zlib.compress(raw, 6)
+                stored_bytes += len(data)
+                blobs.append({'hash': digest, 'codec': 'zlib', 'data': data, 'size': len(raw),
+                              'created_at': datetime.utcnow()})
+            bind.execute(api_key.update().where(api_key.c.id == row.id).values(text_hash=digest))
+        if blobs:
+            bind.execute(content_blob.insert(), blobs)
+        last_id = rows[-1].id
+
+    logger.info(f"content_blob: {logical_bytes:,} bytes of extracted_text stored as "
+                f"{len(stored)} blobs in {stored_bytes:,} bytes")
+
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.create_index('ix_api_key_text_hash', ['text_hash'], unique=False)
+        batch_op.create_foreign_key('fk_api_key_text_hash_content_blob', 'content_blob', ['text_hash'], ['hash'])
+        batch_op.drop_column('extracted_text')
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('extracted_text', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    hashes = [row.text_hash for row in bind.execute(
+        sa.select(api_key.c.text_hash).where(api_key.c.text_hash.isnot(None)).distinct()
+    )]
+    for digest in hashes:
+        blob = bind.execute(sa.select(content_blob.c.data).where(content_blob.c.hash == digest)).one()
+        text = zlib.decompress(blob.data).decode('utf-8')
+        bind.execute(api_key.update().where(api_key.c.text_hash == digest).values(extracted_text=text))
+
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_api_key_text_hash_content_blob', type_='foreignkey')
+        batch_op.drop_index('ix_api_key_text_hash')
+        batch_op.drop_column('text_hash')
+    op.drop_table('content_blob')
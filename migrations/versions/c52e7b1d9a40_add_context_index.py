@@ -0,0 +1,37 @@
+"""add context_index for chunked retrieval over extracted_text
+
+Revision ID: c52e7b1d9a40
+Revises: 8a4d6e2f1c93
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e7b1d9a40'
+down_revision = '8a4d6e2f1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing keys are indexed lazily on their first chat (retrieval._load_index).
+    op.create_table(
+        'context_index',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('api_key_id', sa.Integer(), nullable=False),
+        sa.Column('chunks', sa.JSON(), nullable=False),
+        sa.Column('vocabulary', sa.JSON(), nullable=False),
+        sa.Column('idf', sa.JSON(), nullable=False),
+        sa.Column('matrix', sa.LargeBinary(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('api_key_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('context_index')
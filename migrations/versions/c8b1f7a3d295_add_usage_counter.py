@@ -0,0 +1,31 @@
+"""add usage_counter, the shared per-second ring behind /api/analytics
+
+Revision ID: c8b1f7a3d295
+Revises: a6d2e9f4c158
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8b1f7a3d295'
+down_revision = 'a6d2e9f4c158'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'usage_counter',
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('second', sa.BigInteger(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('endpoint', 'slot'),
+    )
+
+
+def downgrade():
+    op.drop_table('usage_counter')
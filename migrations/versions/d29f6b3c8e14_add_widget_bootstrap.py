@@ -0,0 +1,29 @@
+"""add precomputed widget bootstrap payload to api_key
+
+Revision ID: d29f6b3c8e14
+Revises: b7e4d1a9c362
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd29f6b3c8e14'
+down_revision = 'b7e4d1a9c362'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing keys get their payload rendered on first request.
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('widget_bootstrap', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('widget_bootstrap_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_column('widget_bootstrap_version')
+        batch_op.drop_column('widget_bootstrap')
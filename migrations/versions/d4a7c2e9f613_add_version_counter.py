@@ -0,0 +1,30 @@
+"""add version_counter for marketplace ETags
+
+Revision ID: d4a7c2e9f613
+Revises: b3f9d6a1e827
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c2e9f613'
+down_revision = 'b3f9d6a1e827'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    version_counter = op.create_table(
+        'version_counter',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(version_counter, [{'name': 'ai_models', 'value': 1}])
+
+
+def downgrade():
+    op.drop_table('version_counter')
@@ -0,0 +1,40 @@
+"""add crawl_job for background site ingestion
+
+Revision ID: e41b9c6a2d75
+Revises: c52e7b1d9a40
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b9c6a2d75'
+down_revision = 'c52e7b1d9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'crawl_job',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('api_key_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['api_key_id'], ['api_key.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_crawl_job_api_key_id', 'crawl_job', ['api_key_id'])
+
+
+def downgrade():
+    op.drop_index('ix_crawl_job_api_key_id', table_name='crawl_job')
+    op.drop_table('crawl_job')
@@ -0,0 +1,50 @@
+"""add per-request chat stage timings and stage_timing_rollup
+
+Revision ID: e5c2a8f7b431
+Revises: c8b1f7a3d295
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c2a8f7b431'
+down_revision = 'c8b1f7a3d295'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nothing to backfill: requests recorded before this revision were not timed.
+    with op.batch_alter_table('analytics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ttft', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('tokens', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('stage_timings', sa.JSON(), nullable=True))
+
+    op.create_table(
+        'stage_timing_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('api_key', sa.String(length=255), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('stage', sa.String(length=32), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('seconds', sa.Float(), nullable=False),
+        sa.Column('tokens', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint', 'stage',
+                            name='uq_stage_timing_rollup'),
+    )
+
+
+def downgrade():
+    op.drop_table('stage_timing_rollup')
+    with op.batch_alter_table('analytics', schema=None) as batch_op:
+        batch_op.drop_column('stage_timings')
+        batch_op.drop_column('tokens')
+        batch_op.drop_column('ttft')
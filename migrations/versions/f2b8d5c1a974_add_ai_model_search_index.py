@@ -0,0 +1,64 @@
+"""add full-text search index over ai_model
+
+Revision ID: f2b8d5c1a974
+Revises: d4a7c2e9f613
+Create Date: 2026-10-19 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d5c1a974'
+down_revision = 'd4a7c2e9f613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE ai_model_fts USING fts5(name, description, provider, "
+            "content='ai_model', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER ai_model_fts_insert AFTER INSERT ON ai_model BEGIN "
+            "INSERT INTO ai_model_fts(rowid, name, description, provider) "
+            "VALUES (new.id, new.name, new.description, new.provider); END"
+        )
+        op.execute(
+            "CREATE TRIGGER ai_model_fts_delete AFTER DELETE ON ai_model BEGIN "
+            "INSERT INTO ai_model_fts(ai_model_fts, rowid, name, description, provider) "
+            "VALUES ('delete', old.id, old.name, old.description, old.provider); END"
+        )
+        op.execute(
+            "CREATE TRIGGER ai_model_fts_update AFTER UPDATE OF name, description, provider ON ai_model BEGIN "
+            "INSERT INTO ai_model_fts(ai_model_fts, rowid, name, description, provider) "
+            "VALUES ('delete', old.id, old.name, old.description, old.provider); "
+            "INSERT INTO ai_model_fts(rowid, name, description, provider) "
+            "VALUES (new.id, new.name, new.description, new.provider); END"
+        )
+        # Index the models that already exist
+        op.execute("INSERT INTO ai_model_fts(ai_model_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        # A stored generated column fills itself in for existing rows
+        op.execute(
+            "ALTER TABLE ai_model ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', name), 'A') || "
+            "setweight(to_tsvector('english', provider), 'B') || "
+            "setweight(to_tsvector('english', description), 'C')) STORED"
+        )
+        op.execute("CREATE INDEX ix_ai_model_search_vector ON ai_model USING gin (search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('ai_model_fts_update', 'ai_model_fts_delete', 'ai_model_fts_insert'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS ai_model_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_ai_model_search_vector")
+        op.execute("ALTER TABLE ai_model DROP COLUMN IF EXISTS search_vector")
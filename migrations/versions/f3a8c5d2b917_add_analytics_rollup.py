@@ -0,0 +1,104 @@
+"""add hourly/daily analytics_rollup and analytics (user_id, id) index
+
+Revision ID: f3a8c5d2b917
+Revises: d29f6b3c8e14
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import logging
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c5d2b917'
+down_revision = 'd29f6b3c8e14'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+analytics = sa.table(
+    'analytics',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('api_key', sa.String),
+    sa.column('endpoint', sa.String),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('response_time', sa.Float),
+    sa.column('status_code', sa.Integer),
+)
+
+analytics_rollup = sa.table(
+    'analytics_rollup',
+    sa.column('granularity', sa.String),
+    sa.column('user_id', sa.Integer),
+    sa.column('bucket_start', sa.DateTime),
+    sa.column('api_key', sa.String),
+    sa.column('endpoint', sa.String),
+    sa.column('calls', sa.Integer),
+    sa.column('errors', sa.Integer),
+    sa.column('latency_sum', sa.Float),
+)
+
+
+def upgrade():
+    op.create_table(
+        'analytics_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('api_key', sa.String(length=255), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('calls', sa.Integer(), nullable=False),
+        sa.Column('errors', sa.Integer(), nullable=False),
+        sa.Column('latency_sum', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint',
+                            name='uq_analytics_rollup_bucket'),
+    )
+    with op.batch_alter_table('analytics', schema=None) as batch_op:
+        batch_op.create_index('ix_analytics_user_id_id', ['user_id', 'id'], unique=False)
+
+    # Backfill from the raw rows; from here on the recorder keeps them current.
+    bind = op.get_bind()
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    read = 0
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(analytics)
+            .where(analytics.c.id > last_id, analytics.c.timestamp.isnot(None))
+            .order_by(analytics.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            hour = row.timestamp.replace(minute=0, second=0, microsecond=0)
+            for granularity, start in (('hour', hour), ('day', hour.replace(hour=0))):
+                total = totals[(granularity, row.user_id, start, row.api_key, row.endpoint)]
+                total[0] += 1
+                total[1] += row.status_code >= 400
+                total[2] += row.response_time
+        read += len(rows)
+        last_id = rows[-1].id
+
+    keys = ('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint')
+    buckets = [dict(zip(keys, key), calls=calls, errors=errors, latency_sum=latency_sum)
+               for key, (calls, errors, latency_sum) in totals.items()]
+    for offset in range(0, len(buckets), BATCH_SIZE):
+        bind.execute(analytics_rollup.insert(), buckets[offset:offset + BATCH_SIZE])
+    logger.info(f"analytics_rollup: {read:,} analytics rows rolled up into {len(buckets):,} buckets")
+
+
+def downgrade():
+    with op.batch_alter_table('analytics', schema=None) as batch_op:
+        batch_op.drop_index('ix_analytics_user_id_id')
+    op.drop_table('analytics_rollup')
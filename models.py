@@ -1,6 +1,9 @@
 from extensions import db
 from datetime import datetime
+import uuid
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from content_store import CODEC, compress_text, decompress_text, hash_text
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,11 +20,156 @@ class APIKey(db.Model):
     key = db.Column(db.String(64), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False, default="Unnamed API")
     llm = db.Column(db.String(50), nullable=False)
-    extracted_text = db.Column(db.Text)
+    # Site text lives in ContentBlob, shared by every key with the same text
+    text_hash = db.Column(db.String(64), db.ForeignKey('content_blob.hash'), index=True)
+    text_blob = db.relationship('ContentBlob')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     design = db.Column(db.String(10), default="0")
+    prompt_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Widget bootstrap JSON (widget_bootstrap.py), rendered at the prompt_version it was built for
+    widget_bootstrap = db.deferred(db.Column(db.Text))
+    widget_bootstrap_version = db.Column(db.Integer)
     conversations = db.relationship('Conversation', backref='api_key', cascade='all, delete-orphan')
     fine_tune_jobs = db.relationship('FineTuneJob', backref='api_key', lazy=True)
+    crawl_jobs = db.relationship('CrawlJob', backref='api_key', cascade='all, delete-orphan')
+    crawled_pages = db.relationship('CrawledPage', backref='api_key', lazy='dynamic', cascade='all, delete-orphan')
+    crawl_runs = db.relationship('CrawlRun', backref='api_key', lazy='dynamic', cascade='all, delete-orphan')
+
+    @property
+    def extracted_text(self):
+        """The key's site text; the blob is only loaded and inflated on access."""
+        blob = self.text_blob
+        return blob.text if blob is not None else ""
+
+    @extracted_text.setter
+    def extracted_text(self, text):
+        self.text_blob = ContentBlob.for_text(text) if text else None
+
+class ContentBlob(db.Model):
+    """A compressed text stored once per content hash (see content_store.py)."""
+    hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(16), nullable=False, default=CODEC)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # uncompressed bytes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def text(self):
+        return decompress_text(self.data, self.codec)
+
+    @classmethod
+    def for_text(cls, text):
+        """Return the blob for ``text``, adding it to the session if it is new."""
+        digest = hash_text(text)
+        blob = db.session.get(cls, digest)
+        if blob is not None:
+            return blob
+        blob = cls(hash=digest, codec=CODEC, data=compress_text(text), size=len(text.encode("utf-8")))
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Stored concurrently by another request.
+            blob = db.session.get(cls, digest)
+        return blob
+
+class ContextIndex(db.Model):
+    """TF-IDF index over the chunks of a site text, shared by every key with that text (see retrieval.py).
+
+    The chunks are not stored: they are cut from the text blob again when the
+    index is loaded, with the chunk settings it was built with.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    text_hash = db.Column(db.String(64), db.ForeignKey('content_blob.hash'), unique=True, nullable=False)
+    chunk_words = db.Column(db.Integer, nullable=False)
+    chunk_overlap = db.Column(db.Integer, nullable=False)
+    vocabulary = db.Column(db.JSON, nullable=False, default=dict)
+    idf = db.Column(db.JSON, nullable=False, default=list)
+    matrix = db.Column(db.LargeBinary, nullable=False, default=b"")
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CrawlJob(db.Model):
+    """Background ingestion of a site into an API key (see crawl_jobs.py)."""
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_key.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    url = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    error = db.Column(db.Text)
+    pages_crawled = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "api_key_id": self.api_key_id,
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "pages_crawled": self.pages_crawled,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class CrawledPage(db.Model):
+    """One page of an API key's site as of its last crawl."""
+    id = db.Column(db.Integer, primary_key=True)
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_key.id'), nullable=False)
+    url = db.Column(db.String(2048), nullable=False)
+    title = db.Column(db.String(255))
+    # Page text lives in ContentBlob, like APIKey.extracted_text
+    text_hash = db.Column(db.String(64), db.ForeignKey('content_blob.hash'), nullable=False, index=True)
+    text_blob = db.relationship('ContentBlob')
+    size = db.Column(db.Integer, nullable=False, default=0)
+    # Validators and body hash from the last 200 response, used by recrawl.py
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    content_hash = db.Column(db.String(64))
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('api_key_id', 'url', name='uq_crawled_page_api_key_id_url'),
+    )
+
+    @property
+    def text(self):
+        return self.text_blob.text
+
+    @text.setter
+    def text(self, text):
+        self.text_blob = ContentBlob.for_text(text)
+
+class CrawlRun(db.Model):
+    """Outcome of one scheduled refresh of an API key's crawled pages."""
+    id = db.Column(db.Integer, primary_key=True)
+    api_key_id = db.Column(db.Integer, db.ForeignKey('api_key.id'), nullable=False, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    pages_checked = db.Column(db.Integer, nullable=False, default=0)
+    pages_not_modified = db.Column(db.Integer, nullable=False, default=0)  # 304, nothing downloaded
+    pages_unchanged = db.Column(db.Integer, nullable=False, default=0)  # 200 with the same content
+    pages_changed = db.Column(db.Integer, nullable=False, default=0)
+    pages_removed = db.Column(db.Integer, nullable=False, default=0)
+    pages_failed = db.Column(db.Integer, nullable=False, default=0)
+    reindexed = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            "api_key_id": self.api_key_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "pages_checked": self.pages_checked,
+            "pages_not_modified": self.pages_not_modified,
+            "pages_unchanged": self.pages_unchanged,
+            "pages_changed": self.pages_changed,
+            "pages_removed": self.pages_removed,
+            "pages_failed": self.pages_failed,
+            "reindexed": self.reindexed,
+        }
 
 class CustomPrompt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,9 +185,81 @@ class Analytics(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     response_time = db.Column(db.Float, nullable=False)
     status_code = db.Column(db.Integer, nullable=False)
+    # Chat requests only (see stage_timer.py): time to first token, streamed
+    # tokens and {stage: seconds}
+    ttft = db.Column(db.Float)
+    tokens = db.Column(db.Integer)
+    stage_timings = db.Column(db.JSON(none_as_null=True))
 
     user = db.relationship('User', backref=db.backref('analytics', lazy=True))
 
+    # Recent-entries pages are keyset-paginated on (user_id, id)
+    __table_args__ = (db.Index('ix_analytics_user_id_id', 'user_id', 'id'),)
+
+class AnalyticsRollup(db.Model):
+    """Calls, errors and latency sum per user, key and endpoint for one UTC hour or day."""
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), nullable=False)  # "hour" or "day"
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    api_key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    latency_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint',
+                            name='uq_analytics_rollup_bucket'),
+    )
+
+class UsageCounter(db.Model):
+    """One per-second slot of the shared sliding-window ring in usage_counters.py."""
+    endpoint = db.Column(db.String(255), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    second = db.Column(db.BigInteger, nullable=False)  # unix time the slot currently counts
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LatencySketchBin(db.Model):
+    """Sample count of one latency_sketch bin in one AnalyticsRollup bucket."""
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    api_key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    bin = db.Column(db.Integer, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint', 'bin',
+                            name='uq_latency_sketch_bin'),
+    )
+
+class StageTimingRollup(db.Model):
+    """Samples and summed seconds of one chat pipeline stage in one AnalyticsRollup bucket."""
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    api_key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    stage = db.Column(db.String(32), nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float, nullable=False, default=0.0)
+    # Streamed tokens, only on the "stream" stage
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'user_id', 'bucket_start', 'api_key', 'endpoint', 'stage',
+                            name='uq_stage_timing_rollup'),
+    )
+
+class VersionCounter(db.Model):
+    """A named counter bumped on every change to what it versions, for ETags (see marketplace.py)."""
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
 class AIModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -48,11 +268,18 @@ class AIModel(db.Model):
     api_endpoint = db.Column(db.String(200), nullable=False)
     documentation_url = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Kept in step with ModelReview by add_model_review, in the same transaction
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
 
 class ModelReview(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    model_id = db.Column(db.Integer, db.ForeignKey("ai_model.id"), nullable=False)
+    model_id = db.Column(db.Integer, db.ForeignKey("ai_model.id"), nullable=False, index=True)
     rating = db.Column(db.Integer, nullable=False)
     review_text = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -80,9 +307,39 @@ class Conversation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     api_key_id = db.Column(db.Integer, db.ForeignKey('api_key.id'), nullable=False)
-    messages = db.Column(db.JSON, nullable=False)
+    # Pre-ConversationMessage JSON blob, kept only so the migration can be rolled back
+    legacy_messages = db.Column('messages', db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    messages = db.relationship('ConversationMessage', backref='conversation', lazy='dynamic',
+                               order_by='ConversationMessage.id', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_conversation_api_key_id_updated_at', 'api_key_id', 'updated_at'),
+    )
+
+    def recent_messages(self, limit=5):
+        """Return the last ``limit`` messages, oldest first, as role/content dicts."""
+        rows = (ConversationMessage.query
+                .filter_by(conversation_id=self.id)
+                .order_by(ConversationMessage.id.desc())
+                .limit(limit)
+                .all())
+        return [row.to_dict() for row in reversed(rows)]
+
+class ConversationMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_conversation_message_conversation_id_id', 'conversation_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
 
 class EcommerceIntegration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
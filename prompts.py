@@ -0,0 +1,100 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import APIKey, CustomPrompt
+from caches import TTLCache
+from api_keys import evict_api_keys
+
+# Compiled system prompts keyed by (api key, prompt_version). Editing anything
+# that feeds the prompt bumps APIKey.prompt_version, so other workers stop
+# using their stale copy the next time they resolve the key.
+compiled_prompts = TTLCache(
+    maxsize=int(os.getenv("PROMPT_CACHE_SIZE", "4096")),
+    ttl=int(os.getenv("PROMPT_CACHE_TTL", "3600")),
+    name="compiled_prompts",
+)
+
+# Site context is retrieved per question (see retrieval.py), so the compiled
+# prompt keeps a slot for it and is stored as the text before and after.
+CONTEXT_SLOT = "\x00context\x00"
+
+def compile_system_prompt(custom_prompts):
+    return f"""You are a concise AI assistant for this website. Provide brief, relevant responses. Context: {CONTEXT_SLOT}
+
+Key guidelines:
+1. Provide friendly, personalized responses based on your deep understanding of the website and company.
+2. Use a conversational tone that reflects the brand's personality.
+3. Enthusiastically share details about products, services, and what makes the company unique.
+4. Suggest complementary items or services when it would benefit the customer.
+5. Anticipate and address potential questions or concerns proactively.
+6. Incorporate industry terms naturally, as an expert would.
+7. Keep responses concise but informative. Elaborate if the customer seems interested.
+8. Engage customers by asking relevant follow-up questions or suggesting next steps.
+9. Draw on the context of the entire conversation to provide cohesive assistance.
+
+For e-commerce inquiries:
+- Access the order tracking system to provide real-time order status updates.
+- Consult the product database for accurate information on names, pricing, and inventory.
+- Share current processing times based on the latest operations reports.
+- If specific e-commerce details are unavailable, offer to personally look into it and get back to the customer.
+
+Key points:
+1. Be friendly and personalized.
+2. Use conversational tone.
+3. Be enthusiastic about products/services.
+4. Keep responses under 50 words.
+5. If unsure, ask for clarification.
+
+Custom information:
+{' '.join([f'- {prompt.prompt}: {prompt.response}' for prompt in custom_prompts])}
+
+Custom info: {' '.join([f'{prompt.prompt}: {prompt.response[:20]}...' for prompt in custom_prompts[:3]])}"""
+
+def get_system_prompt(api_key_data, context):
+    """Return the system prompt for an APIKey or APIKeyInfo with ``context`` filled in."""
+    cache_key = (api_key_data.key, api_key_data.prompt_version)
+    compiled = compiled_prompts.get(cache_key)
+    if compiled is None:
+        custom_prompts = CustomPrompt.query.filter_by(user_id=api_key_data.user_id).all()
+        compiled = tuple(compile_system_prompt(custom_prompts).split(CONTEXT_SLOT, 1))
+        compiled_prompts.set(cache_key, compiled)
+    prefix, suffix = compiled
+    return prefix + context + suffix
+
+# Session.info entry for keys whose local copies go once the session commits
+_PENDING_EVICTIONS = "prompts.pending_evictions"
+
+def invalidate_compiled_prompts(user_id=None, api_key_ids=None):
+    """Bump prompt_version for a user's keys (or the given key ids) and drop local copies.
+
+    The caller commits; the bump rides along with the edit that caused it.
+    Local copies are dropped after that commit: dropped before it, a request
+    in between would cache the old version again until the TTL.
+    """
+    query = APIKey.query
+    if api_key_ids is not None:
+        query = query.filter(APIKey.id.in_(api_key_ids))
+    else:
+        query = query.filter_by(user_id=user_id)
+
+    keys = [key for (key,) in query.with_entities(APIKey.key)]
+    query.update({APIKey.prompt_version: APIKey.prompt_version + 1}, synchronize_session=False)
+    db.session.info.setdefault(_PENDING_EVICTIONS, set()).update(keys)
+
+def _evict_after_commit(session):
+    if session.in_nested_transaction():
+        return
+    keys = session.info.pop(_PENDING_EVICTIONS, None)
+    if keys:
+        compiled_prompts.discard_where(lambda cache_key: cache_key[0] in keys)
+        evict_api_keys(*keys)
+
+def _forget_after_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_EVICTIONS, None)
+
+event.listen(Session, "after_commit", _evict_after_commit)
+event.listen(Session, "after_soft_rollback", _forget_after_rollback)
@@ -0,0 +1,197 @@
+"""Scheduled refresh of crawled sites.
+
+Every stored CrawledPage is re-requested with the ETag / Last-Modified it was
+last served with. A 304 costs one round trip and nothing else; a 200 whose
+body hashes the same as before is not parsed again; only pages whose text
+actually changed are re-extracted, and the key's context index is rebuilt
+only when at least one page changed or disappeared. Each refresh is recorded
+as a CrawlRun.
+
+Refresh covers the pages found by the last full crawl; new pages on the site
+are picked up when the site is submitted again.
+"""
+import atexit
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import click
+import requests
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import func
+
+from content_store import decompress_text, hash_text
+from crawl_jobs import index_site_text
+from crawler import PAGE_MAX_BYTES, CrawlError, content_hash, fetch_page, make_session, parse_page
+from extensions import db
+from models import APIKey, ContentBlob, CrawledPage, CrawlRun
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_site(api_key_id, concurrency=4, timeout=120.0, page_max_bytes=PAGE_MAX_BYTES):
+    """Re-check every crawled page of an API key; returns the committed CrawlRun."""
+    run = CrawlRun(api_key_id=api_key_id, started_at=datetime.utcnow(), pages_checked=0,
+                   pages_not_modified=0, pages_unchanged=0, pages_changed=0, pages_removed=0,
+                   pages_failed=0, reindexed=False)
+    pages = CrawledPage.query.filter_by(api_key_id=api_key_id).order_by(CrawledPage.id).all()
+    deadline = time.monotonic() + timeout
+    now = datetime.utcnow()
+
+    # Only the network calls run on the pool; the session is used from this thread.
+    with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(fetch_page, page.url, deadline, page_max_bytes, session,
+                        etag=page.etag, last_modified=page.last_modified): page
+            for page in pages
+        }
+        for future in as_completed(futures):
+            page = futures[future]
+            page.checked_at = now
+            run.pages_checked += 1
+            try:
+                fetched = future.result()
+            except (requests.RequestException, CrawlError) as e:
+                logger.debug(f"Refreshing {page.url} failed: {str(e)}")
+                run.pages_failed += 1
+                continue
+
+            if fetched.status_code == 304:
+                run.pages_not_modified += 1
+                continue
+            if fetched.status_code in (404, 410):
+                db.session.delete(page)
+                run.pages_removed += 1
+                continue
+            if fetched.status_code >= 400:
+                run.pages_failed += 1
+                continue
+
+            page.etag = fetched.etag
+            page.last_modified = fetched.last_modified
+            digest = content_hash(fetched.body, page_max_bytes)
+            if digest == page.content_hash:
+                run.pages_unchanged += 1
+                continue
+
+            title, text, _ = parse_page(fetched.body, fetched.encoding)
+            page.content_hash = digest
+            page.size = len(fetched.body)
+            page.fetched_at = now
+            if hash_text(text) == page.text_hash:
+                # Markup changed (a nonce, a timestamp) but the words did not.
+                run.pages_unchanged += 1
+                continue
+            page.title = title
+            page.text = text
+            run.pages_changed += 1
+
+    if run.pages_changed or run.pages_removed:
+        db.session.flush()
+        api_key = db.session.get(APIKey, api_key_id)
+        blobs = (db.session.query(ContentBlob.data, ContentBlob.codec)
+                 .join(CrawledPage, CrawledPage.text_hash == ContentBlob.hash)
+                 .filter(CrawledPage.api_key_id == api_key_id)
+                 .order_by(CrawledPage.id)
+                 .all())
+        index_site_text(api_key, "\n\n".join(decompress_text(data, codec) for data, codec in blobs))
+        run.reindexed = True
+
+    run.finished_at = datetime.utcnow()
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+class SiteRefresher:
+    """Runs refresh_site for every key whose pages are older than ``interval``.
+
+    The APScheduler job only starts when RECRAWL_ENABLED is set. Enable it in
+    a single process (e.g. one worker or a separate scheduler process): each
+    process that enables it runs its own schedule.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.scheduler = None
+        self.interval = timedelta(hours=24)
+        self.check_minutes = 15
+        self.batch_size = 20
+        self.concurrency = 4
+        self.site_timeout = 120.0
+        self.page_max_bytes = PAGE_MAX_BYTES
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = timedelta(hours=float(app.config.get("RECRAWL_INTERVAL_HOURS", os.getenv("RECRAWL_INTERVAL_HOURS", 24))))
+        self.check_minutes = float(app.config.get("RECRAWL_CHECK_MINUTES", os.getenv("RECRAWL_CHECK_MINUTES", self.check_minutes)))
+        self.batch_size = int(app.config.get("RECRAWL_BATCH_SIZE", os.getenv("RECRAWL_BATCH_SIZE", self.batch_size)))
+        self.concurrency = int(app.config.get("CRAWL_CONCURRENCY", os.getenv("CRAWL_CONCURRENCY", self.concurrency)))
+        self.site_timeout = float(app.config.get("RECRAWL_SITE_TIMEOUT", os.getenv("RECRAWL_SITE_TIMEOUT", self.site_timeout)))
+        self.page_max_bytes = int(app.config.get("CRAWL_PAGE_MAX_BYTES", os.getenv("CRAWL_PAGE_MAX_BYTES", self.page_max_bytes)))
+        app.extensions["site_refresher"] = self
+
+        @app.cli.command("recrawl")
+        @click.option("--api-key-id", type=int, help="Refresh one key now instead of every due key.")
+        def recrawl_command(api_key_id):
+            """Refresh crawled sites whose pages are due."""
+            runs = [self.refresh(api_key_id)] if api_key_id else self.refresh_due()
+            for run in runs:
+                click.echo(run.to_dict())
+
+        enabled = app.config.get("RECRAWL_ENABLED", os.getenv("RECRAWL_ENABLED", "false"))
+        if str(enabled).lower() == "true":
+            self.start()
+
+    def start(self):
+        self.scheduler = BackgroundScheduler(daemon=True)
+        self.scheduler.add_job(self._scheduled_refresh, "interval", minutes=self.check_minutes,
+                               max_instances=1, coalesce=True, id="recrawl")
+        self.scheduler.start()
+        atexit.register(self.scheduler.shutdown, wait=False)
+        logger.info(f"Recrawl scheduler started; checking every {self.check_minutes} minutes")
+
+    def due_api_key_ids(self):
+        cutoff = datetime.utcnow() - self.interval
+        rows = (db.session.query(CrawledPage.api_key_id)
+                .group_by(CrawledPage.api_key_id)
+                .having(func.min(CrawledPage.checked_at) < cutoff)
+                .order_by(func.min(CrawledPage.checked_at))
+                .limit(self.batch_size)
+                .all())
+        return [api_key_id for api_key_id, in rows]
+
+    def refresh(self, api_key_id):
+        return refresh_site(api_key_id, concurrency=self.concurrency, timeout=self.site_timeout,
+                            page_max_bytes=self.page_max_bytes)
+
+    def refresh_due(self):
+        runs = []
+        for api_key_id in self.due_api_key_ids():
+            try:
+                runs.append(self.refresh(api_key_id))
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Refreshing api_key_id {api_key_id} failed: {str(e)}", exc_info=True)
+        return runs
+
+    def _scheduled_refresh(self):
+        with self.app.app_context():
+            try:
+                runs = [run.to_dict() for run in self.refresh_due()]
+            finally:
+                db.session.remove()
+        if runs:
+            logger.info(
+                f"Refreshed {len(runs)} sites: "
+                f"{sum(run['pages_not_modified'] for run in runs)} not modified, "
+                f"{sum(run['pages_unchanged'] for run in runs)} unchanged, "
+                f"{sum(run['pages_changed'] for run in runs)} changed"
+            )
+
+
+site_refresher = SiteRefresher()
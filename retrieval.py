@@ -0,0 +1,132 @@
+import io
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import APIKey, ContextIndex
+from caches import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CHUNK_WORDS = int(os.getenv("CONTEXT_CHUNK_WORDS", "120"))
+CONTEXT_CHUNK_OVERLAP = int(os.getenv("CONTEXT_CHUNK_OVERLAP", "20"))
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "3"))
+
+# Both the persisted index and the query transform must use the same settings.
+VECTORIZER_OPTIONS = {"sublinear_tf": True, "stop_words": "english"}
+
+LoadedIndex = namedtuple("LoadedIndex", ["chunks", "vectorizer", "matrix"])
+
+# Loaded indexes keyed by (api_key_id, prompt_version); re-ingesting a site
+# bumps prompt_version, so stale copies in other workers are simply not hit.
+loaded_indexes = TTLCache(
+    maxsize=int(os.getenv("CONTEXT_INDEX_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("CONTEXT_INDEX_CACHE_TTL", "3600")),
+    name="context_indexes",
+)
+
+def chunk_text(text, chunk_words=CONTEXT_CHUNK_WORDS, overlap=CONTEXT_CHUNK_OVERLAP):
+    """Split text into overlapping windows of roughly ``chunk_words`` words."""
+    words = (text or "").split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, max(1, len(words) - overlap), step)]
+
+def _serialize_matrix(matrix):
+    buffer = io.BytesIO()
+    sparse.save_npz(buffer, sparse.csr_matrix(matrix))
+    return buffer.getvalue()
+
+def _deserialize_matrix(data):
+    return sparse.load_npz(io.BytesIO(data))
+
+def build_context_index(text_hash, text):
+    """Chunk and TF-IDF index ``text``, stored as blob ``text_hash``, unless it already is.
+
+    Every key with the same site text shares the one index. Adds a new row to
+    the current session; the caller commits.
+    """
+    index = ContextIndex.query.filter_by(text_hash=text_hash).first()
+    if index is not None:
+        return index
+
+    chunks = chunk_text(text)
+    vocabulary, idf, matrix = {}, [], b""
+
+    if chunks:
+        vectorizer = TfidfVectorizer(**VECTORIZER_OPTIONS)
+        try:
+            tfidf = vectorizer.fit_transform(chunks)
+            vocabulary = {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+            idf = vectorizer.idf_.tolist()
+            matrix = _serialize_matrix(tfidf)
+        except ValueError:
+            # Only stop words, nothing to index; the chunks still serve the fallback.
+            pass
+
+    index = ContextIndex(text_hash=text_hash, chunk_words=CONTEXT_CHUNK_WORDS, chunk_overlap=CONTEXT_CHUNK_OVERLAP,
+                         vocabulary=vocabulary, idf=idf, matrix=matrix, built_at=datetime.utcnow())
+    try:
+        with db.session.begin_nested():
+            db.session.add(index)
+    except IntegrityError:
+        # Built concurrently for another key with the same text.
+        index = ContextIndex.query.filter_by(text_hash=text_hash).one()
+    return index
+
+def _load_index(api_key_data):
+    cache_key = (api_key_data.id, api_key_data.prompt_version)
+    loaded = loaded_indexes.get(cache_key)
+    if loaded is not None:
+        return loaded
+
+    blob = db.session.get(APIKey, api_key_data.id).text_blob
+    if blob is None:
+        loaded = LoadedIndex([], None, None)
+        loaded_indexes.set(cache_key, loaded)
+        return loaded
+
+    text = blob.text
+    index = ContextIndex.query.filter_by(text_hash=blob.hash).first()
+    if index is None:
+        # Texts stored before their index existed are indexed once, on first use.
+        index = build_context_index(blob.hash, text)
+        logger.info(f"Built context index for api_key_id {api_key_data.id}")
+
+    # Cut with the settings the matrix was built with, so rows line up with chunks
+    chunks = chunk_text(text, index.chunk_words, index.chunk_overlap)
+    if index.vocabulary:
+        vectorizer = TfidfVectorizer(vocabulary=index.vocabulary, **VECTORIZER_OPTIONS)
+        vectorizer.idf_ = np.array(index.idf)
+        loaded = LoadedIndex(chunks, vectorizer, _deserialize_matrix(index.matrix))
+    else:
+        loaded = LoadedIndex(chunks, None, None)
+
+    loaded_indexes.set(cache_key, loaded)
+    return loaded
+
+def retrieve_context(api_key_data, query, k=CONTEXT_TOP_K):
+    """Return up to ``k`` chunks of the key's site text most relevant to ``query``."""
+    loaded = _load_index(api_key_data)
+    if not loaded.chunks:
+        return []
+    if loaded.vectorizer is None:
+        return loaded.chunks[:k]
+
+    scores = cosine_similarity(loaded.vectorizer.transform([query]), loaded.matrix)[0]
+    if not scores.any():
+        # Nothing in the question matches the site vocabulary; lead with the
+        # start of the site, as the prompt did before retrieval existed.
+        return loaded.chunks[:1]
+
+    top = np.argsort(scores)[::-1][:k]
+    return [loaded.chunks[i] for i in sorted(top) if scores[i] > 0]
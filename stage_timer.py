@@ -0,0 +1,97 @@
+"""Per-stage wall-clock timing of one chat request.
+
+A StageTimer travels with the chat turn. Handlers wrap each stage in
+``timer.span(name)``. For the LLM stream they call stream_started() before
+the request and token() for every delta; TTFT and tokens per second come from those.
+result() turns it all into the fields stored on the request's Analytics row:
+``ttft``, ``tokens`` and ``stage_timings`` ({stage: seconds}).
+
+Stages recorded by /chat and /wp/wp_chat:
+    key_lookup     resolve_api_key
+    conversation   fetch or open the conversation, store the visitor's message
+    answer_cache   near-duplicate answer lookup
+    retrieval      relevant chunks of the crawled site
+    prompt         compiled system prompt, custom prompts included
+    prepare_commit commit of the visitor's message
+    first_token    LLM request sent -> first delta
+    stream         first delta -> last delta
+    suggestions    waiting for the suggested queries after the stream ended
+    complete       answer cache store, assistant message and commits
+    context        (wp_chat) WordPress site info and FAQ
+    generate       (wp_chat) intent routing and the answer itself
+
+Each span is two perf_counter() calls and a dict update, so the timer is
+always on.
+"""
+from time import perf_counter
+
+
+class _Span:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stages = self.timer.stages
+        stages[self.name] = stages.get(self.name, 0.0) + perf_counter() - self.start
+        return False
+
+
+class StageTimer:
+    __slots__ = ("started", "stages", "stream_start", "first_token_at", "last_token_at", "tokens")
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.stages = {}
+        self.stream_start = None
+        self.first_token_at = None
+        self.last_token_at = None
+        self.tokens = 0
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def stream_started(self):
+        self.stream_start = perf_counter()
+
+    def token(self):
+        """Mark one streamed delta (or the replayed answer) as sent."""
+        now = perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.tokens += 1
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def result(self):
+        """{"ttft", "tokens", "stage_timings"} for the Analytics row.
+
+        ttft is request start -> first delta. tokens counts streamed deltas
+        (providers send about one token per delta) and is None when nothing
+        was streamed from the LLM, e.g. for a replayed cached answer.
+        """
+        stages = {name: round(seconds, 6) for name, seconds in self.stages.items()}
+        ttft = tokens = None
+        if self.first_token_at is not None:
+            ttft = round(self.first_token_at - self.started, 6)
+        if self.stream_start is not None and self.first_token_at is not None:
+            stages["first_token"] = round(self.first_token_at - self.stream_start, 6)
+            stages["stream"] = round(self.last_token_at - self.first_token_at, 6)
+            tokens = self.tokens
+        return {"ttft": ttft, "tokens": tokens, "stage_timings": stages or None}
+
+
+def tokens_per_second(tokens, stream_seconds):
+    """Decode rate over the stream stage; None when it cannot be measured."""
+    if not tokens or tokens < 2 or not stream_seconds:
+        return None
+    # The first delta opens the stream stage, so it is not part of the rate
+    return (tokens - 1) / stream_seconds
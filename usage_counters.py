@@ -0,0 +1,213 @@
+"""Fixed-memory sliding-window call counters, shared across workers.
+
+Every process counts calls per endpoint in a ring of per-second buckets
+(SlidingWindowCounter): ``window`` slots per endpoint, reused as time moves
+on, so memory does not grow with traffic. A background thread pushes the
+per-second deltas to the usage_counter table every ``flush_interval``
+seconds. That table is the same ring, one row per (endpoint, slot), shared
+by every worker. counts() sums it, so /api/analytics reports all workers.
+
+The table lives in the app database by default. USAGE_COUNTERS_URL points
+it elsewhere, e.g. ``sqlite:////tmp/usage.db`` as a local stand-in shared by
+the processes on one machine. There the table is created on first use.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import case, create_engine, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowCounter:
+    """Counts per second over the last ``window`` seconds, in a fixed ring."""
+
+    def __init__(self, window=3600):
+        self.window = window
+        self._seconds = [0] * window  # the second each slot currently holds
+        self._counts = [0] * window
+
+    def add(self, second, count=1):
+        slot = second % self.window
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def total(self, now, window=None):
+        oldest = now - min(window or self.window, self.window)
+        return sum(count for second, count in zip(self._seconds, self._counts) if oldest < second <= now)
+
+
+class UsageCounters:
+    def __init__(self, app=None, window=3600, flush_interval=1.0):
+        self.window = window
+        self.flush_interval = flush_interval
+        self.url = None
+        self.app = None
+        self.flushed = 0
+        self.failed = 0
+        self._local = {}
+        self._pending = defaultdict(int)  # (endpoint, second) -> count not yet in the table
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._engine = None
+        self._engine_pid = None
+        self._pid = None
+        self._stopped = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.window = int(app.config.get("USAGE_WINDOW_SECONDS", os.getenv("USAGE_WINDOW_SECONDS", self.window)))
+        self.flush_interval = float(app.config.get("USAGE_FLUSH_INTERVAL", os.getenv("USAGE_FLUSH_INTERVAL", self.flush_interval)))
+        self.url = app.config.get("USAGE_COUNTERS_URL", os.getenv("USAGE_COUNTERS_URL"))
+        app.extensions["usage_counters"] = self
+        atexit.register(self.shutdown)
+
+    def record(self, endpoint, count=1):
+        second = int(time.time())
+        self._ensure_worker()
+        with self._lock:
+            counter = self._local.get(endpoint)
+            if counter is None:
+                counter = self._local[endpoint] = SlidingWindowCounter(self.window)
+            counter.add(second, count)
+            self._pending[(endpoint, second)] += count
+
+    def local_counts(self, window=None):
+        """This process's counts per endpoint over the last ``window`` seconds."""
+        now = int(time.time())
+        with self._lock:
+            return {endpoint: counter.total(now, window) for endpoint, counter in self._local.items()}
+
+    def counts(self, window=None):
+        """Counts per endpoint over the last ``window`` seconds, across all workers."""
+        from models import UsageCounter
+
+        self.flush()
+        oldest = int(time.time()) - min(window or self.window, self.window)
+        table = UsageCounter.__table__
+        with self._connect() as connection:
+            rows = connection.execute(
+                select(table.c.endpoint, func.sum(table.c.count))
+                .where(table.c.second > oldest)
+                .group_by(table.c.endpoint)
+            ).all()
+        return {endpoint: int(count) for endpoint, count in rows}
+
+    def flush(self):
+        """Add this process's pending per-second counts to the shared ring."""
+        from models import UsageCounter
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+            if not pending:
+                return 0
+
+            # Seconds that have left the window would take over a live slot.
+            oldest = int(time.time()) - self.window
+            rows = [{"endpoint": endpoint, "slot": second % self.window, "second": second, "count": count}
+                    for (endpoint, second), count in sorted(pending.items()) if second > oldest]
+            if not rows:
+                return 0
+            table = UsageCounter.__table__
+            try:
+                with self._connect() as connection:
+                    dialect = connection.dialect.name
+                    if dialect in ("postgresql", "sqlite"):
+                        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+                        stmt = insert(table)
+                        # A slot still holding an older second is taken over, not added to.
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=["endpoint", "slot"],
+                            set_={
+                                "count": case((table.c.second == stmt.excluded.second, table.c.count + stmt.excluded.count),
+                                              else_=stmt.excluded.count),
+                                "second": stmt.excluded.second,
+                            },
+                        )
+                        connection.execute(stmt, rows)
+                    else:
+                        for row in rows:
+                            connection.execute(table.delete().where(table.c.endpoint == row["endpoint"],
+                                                                    table.c.slot == row["slot"],
+                                                                    table.c.second != row["second"]))
+                            updated = connection.execute(
+                                table.update()
+                                .where(table.c.endpoint == row["endpoint"], table.c.slot == row["slot"])
+                                .values(count=table.c.count + row["count"])
+                            ).rowcount
+                            if not updated:
+                                connection.execute(table.insert(), [row])
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(rows)
+                logger.error(f"Error flushing {len(rows)} usage counter rows: {str(e)}")
+                return 0
+
+            with self._lock:
+                self.flushed += len(rows)
+            return len(rows)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self.app is not None:
+            self.flush()
+
+    def stats(self):
+        return {"pending": len(self._pending), "flushed": self.flushed, "failed": self.failed}
+
+    def _connect(self):
+        # engine.begin() commits on success; engines do not survive fork either.
+        if self._engine is None or self._engine_pid != os.getpid():
+            self._engine_pid = os.getpid()
+            if self.url:
+                self._engine = create_engine(self.url)
+                from models import UsageCounter
+                UsageCounter.__table__.create(self._engine, checkfirst=True)
+            else:
+                with self.app.app_context():
+                    self._engine = db.engine
+        return self._engine.begin()
+
+    def _ensure_worker(self):
+        # Same fork rule as the analytics recorder: each worker process
+        # starts its own flusher and keeps its own local rings.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent flushes what it counted.
+                self._local = {}
+                self._pending = defaultdict(int)
+            self._pid = os.getpid()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="usage-counters", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+usage_counters = UsageCounters()
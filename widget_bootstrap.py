@@ -0,0 +1,104 @@
+"""One cacheable payload with everything the chat widget needs to start.
+
+Design, website info, FAQ and greeting used to take two extra requests
+(/api/website-info, /api/faq), each resolving the key and querying again.
+The payload is rendered to JSON when any of it is edited and stored on the
+APIKey row, tagged with the key's prompt_version: every edit that changes it
+already bumps that version, and every bump stores it again. Serving it is
+then a resolve_api_key cache hit plus a per-worker memo, or a single-column
+read on a cold worker. Serving never writes.
+"""
+import hashlib
+import json
+import os
+
+from caches import TTLCache
+from extensions import db
+from models import APIKey, FAQ, WebsiteInfo
+
+GREETING = "Hello! How can I assist you today?"
+
+
+def _user_content(user_id):
+    website_info = WebsiteInfo.query.filter_by(user_id=user_id).first()
+    faq_items = FAQ.query.filter_by(user_id=user_id).order_by(FAQ.order).all()
+    return website_info, faq_items
+
+
+def render_bootstrap(key, design, website_info, faq_items):
+    payload = {
+        "api_key": key,
+        "design": design or "0",
+        "greeting": GREETING,
+        "website_info": {
+            "website_name": website_info.name,
+            "description": website_info.description,
+            "features": website_info.features.split(','),
+        } if website_info else None,
+        "faq": [{"question": item.question, "answer": item.answer} for item in faq_items],
+    }
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True)
+
+
+def refresh_bootstraps(user_id=None, api_key_ids=None):
+    """Re-render and store the payload of a user's keys (or the given key ids).
+
+    Call it after invalidate_compiled_prompts, so the stored payload carries
+    the bumped version. The caller commits.
+    """
+    query = APIKey.query
+    if api_key_ids is not None:
+        query = query.filter(APIKey.id.in_(api_key_ids))
+    else:
+        query = query.filter_by(user_id=user_id)
+
+    content = {}
+    rows = query.with_entities(APIKey.id, APIKey.key, APIKey.user_id, APIKey.design, APIKey.prompt_version).all()
+    for row in rows:
+        if row.user_id not in content:
+            content[row.user_id] = _user_content(row.user_id)
+        body = render_bootstrap(row.key, row.design, *content[row.user_id])
+        (APIKey.query.filter_by(id=row.id)
+         .update({APIKey.widget_bootstrap: body, APIKey.widget_bootstrap_version: row.prompt_version},
+                 synchronize_session=False))
+    return len(rows)
+
+
+class WidgetBootstraps:
+    def __init__(self, app=None):
+        self.max_age = 60
+        self.rendered = TTLCache(maxsize=10000, ttl=3600, name="widget_bootstraps")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = int(app.config.get("WIDGET_BOOTSTRAP_MAX_AGE", os.getenv("WIDGET_BOOTSTRAP_MAX_AGE", self.max_age)))
+        app.extensions["widget_bootstraps"] = self
+
+    def cache_control(self):
+        return f"public, max-age={self.max_age}"
+
+    def get(self, info):
+        """Return (JSON body, etag) for a resolved APIKeyInfo."""
+        cache_key = (info.key, info.prompt_version)
+        entry = self.rendered.get(cache_key)
+        if entry is None:
+            body = self._load(info)
+            entry = (body, hashlib.sha256(body.encode("utf-8")).hexdigest()[:32])
+            self.rendered.set(cache_key, entry)
+        return entry
+
+    def _load(self, info):
+        body, version = (db.session.query(APIKey.widget_bootstrap, APIKey.widget_bootstrap_version)
+                         .filter_by(id=info.id)
+                         .one())
+        # The stored copy may be newer than a cached APIKeyInfo, never older
+        # than an edit that has committed.
+        if body is not None and version is not None and version >= info.prompt_version:
+            return body
+        # Keys created or edited before the payload existed: rendered here,
+        # and stored by their next edit.
+        return render_bootstrap(info.key, info.design, *_user_content(info.user_id))
+
+
+widget_bootstraps = WidgetBootstraps()
@@ -1,39 +1,63 @@
+import time
+
 from flask import Blueprint, request, jsonify
 from models import User, WebsiteInfo, FAQ, APIKey, EcommerceIntegration
 from extensions import db
+from api_keys import resolve_api_key
+from analytics_recorder import analytics_recorder
+from stage_timer import StageTimer
 
 wp_blueprint = Blueprint('wp', __name__)
 
 @wp_blueprint.route('/wp_chat', methods=['POST'])
 def wp_chat():
+    start_time = time.time()
+    timer = StageTimer()
     data = request.json
     message = data.get('message')
     user_id = data.get('user_id')
     api_key = data.get('api_key')
 
     # Validate API key
-    api_key_obj = APIKey.query.filter_by(key=api_key).first()
+    with timer.span('key_lookup'):
+        api_key_obj = resolve_api_key(api_key)
     if not api_key_obj:
         return jsonify({'error': 'Invalid API key'}), 401
 
     # Process the message
-    response = process_wp_chatbot_message(message, user_id, api_key)
+    status_code = 500
+    try:
+        response = process_wp_chatbot_message(message, user_id, api_key, timer)
+        status_code = 200
+    finally:
+        analytics_recorder.record(
+            user_id=api_key_obj.user_id,
+            api_key=api_key,
+            endpoint='/wp/wp_chat',
+            response_time=time.time() - start_time,
+            status_code=status_code,
+            **timer.result(),
+        )
 
     return jsonify({'response': response})
 
-def process_wp_chatbot_message(message, user_id, api_key):
+def process_wp_chatbot_message(message, user_id, api_key, timer=None):
+    timer = timer or StageTimer()
+
     # Load WordPress and WooCommerce specific context
-    wp_context = load_wp_context(user_id)
+    with timer.span('context'):
+        wp_context = load_wp_context(user_id)
     
-    # Determine intent
-    intent = determine_wp_intent(message)
-    
-    if intent == 'woocommerce_query':
-        return handle_woocommerce_query(message, user_id, wp_context)
-    elif intent == 'wordpress_query':
-        return handle_wordpress_query(message, user_id, wp_context)
-    else:
-        return generate_wp_ai_response(message, wp_context, api_key)
+    with timer.span('generate'):
+        # Determine intent
+        intent = determine_wp_intent(message)
+
+        if intent == 'woocommerce_query':
+            return handle_woocommerce_query(message, user_id, wp_context)
+        elif intent == 'wordpress_query':
+            return handle_wordpress_query(message, user_id, wp_context)
+        else:
+            return generate_wp_ai_response(message, wp_context, api_key)
 
 def load_wp_context(user_id):
     # Load user-specific WordPress and WooCommerce context